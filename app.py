@@ -12,24 +12,84 @@ import tempfile
 import re
 import uuid
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from werkzeug.exceptions import HTTPException
 from werkzeug.security import generate_password_hash, check_password_hash
 from database import (
-    init_db, get_dashboard_stats, get_servers, get_gmuds,
+    ensure_schema, check_data_generation, has_pending_excel_sync, connection_scope,
+    use_read_connections,
+    get_dashboard_stats, get_servers, get_gmuds,
     get_cmdb_databases, get_filter_options, get_planning_data,
     get_cmdb_full, get_cmdb_full_stats, get_cmdb_full_filters,
     get_pagonxt_databases, search_hostnames,
-    get_gmud_by_id, update_gmud, delete_gmud,
-    get_user_by_id, verify_user, ensure_admin_exists,
-    get_server_details
+    get_gmud_by_id, update_gmud, delete_gmud, create_gmud, get_excel_sync_status,
+    get_user_by_id, verify_user,
+    get_all_users, create_user, update_user_status, reset_user_password,
+    get_server_details, get_gmud_cube, GMUD_CUBE_DIMS
+)
+from passwords import PasswordBusyError
+from metrics import init_metrics, render_prometheus
+import query_profiler
+import storage
+import windows
+from reports import WIDGETS as REPORT_WIDGETS, get_widget
+from psu import get_psu_targets, set_psu_targets
+from vulns import (
+    classify_squad, get_vuln_aging, get_sla_policy, set_sla_policy, get_vuln_stats, get_host_vuln_summary
+)
+from compression import init_compression
+from assets import init_assets
+from config import (
+    SECRET_KEY, DEBUG, HOST, PORT, MAX_CONTENT_LENGTH, QUALYS_PAGONXT_PATH, QUALYS_GETNET_PATH,
+    BATCH_MAX_REQUESTS, BATCH_MAX_WORKERS
 )
-from import_excel import run_import, run_cmdb_full_import
-from import_qualys import import_qualys_scan
-from export_excel import write_gmud_to_excel
-from config import SECRET_KEY, DEBUG, HOST, PORT, MAX_CONTENT_LENGTH, QUALYS_PAGONXT_PATH, QUALYS_GETNET_PATH
 
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+init_metrics(app)
+init_compression(app)
+init_assets(app)
+
+
+@app.before_request
+def read_only_for_reads():
+    """GET/HEAD usam conexões somente leitura; escritas ficam com importações e GMUDs."""
+    use_read_connections(request.method in ("GET", "HEAD"))
+
+
+@app.teardown_request
+def reset_read_only(exc=None):
+    use_read_connections(False)
+
+
+# POSTs that only read (batched GETs, title suggestion) or touch in-process state
+_WRITE_GUARD_EXEMPT = {"login", "api_batch", "api_generate_gmud_title", "api_admin_queries", "api_admin_storage"}
+
+
+@app.before_request
+def refuse_writes_on_stale_copy():
+    """DB_STORAGE_MODE=local: outra instância gravou o volume depois desta cópia ser alterada."""
+    if (request.method in ("POST", "PUT", "PATCH", "DELETE") and request.endpoint not in _WRITE_GUARD_EXEMPT
+            and not storage.writable()):
+        return jsonify({"message": "Cópia local do banco desatualizada em relação ao volume; "
+                                   "alterações bloqueadas nesta instância"}), 503
+
+
+@app.before_request
+def refresh_stale_caches():
+    """Descarta caches locais se outra instância (ou importação) alterou os dados."""
+    check_data_generation()
+
+
+@app.after_request
+def checkpoint_after_write(response):
+    """DB_STORAGE_MODE=local: leva escritas bem-sucedidas ao volume (com debounce)."""
+    if (request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400
+            and request.endpoint != "api_batch"):
+        storage.checkpoint_soon()
+    return response
 
 # Dict global para rastrear status dos uploads assíncronos em memória
 UPLOAD_TASKS = {}
@@ -87,7 +147,10 @@ def login():
     if request.method == "POST":
         username = request.form.get("username", "").strip()
         password = request.form.get("password", "")
-        user_dict = verify_user(username, password)
+        try:
+            user_dict = verify_user(username, password)
+        except PasswordBusyError as e:
+            return render_template("login.html", error=str(e)), 429
         if user_dict:
             if not user_dict.get('is_active', 1):
                 return render_template("login.html", error="Usuário desativado")
@@ -180,6 +243,108 @@ def api_dashboard():
     return jsonify(stats)
 
 
+@app.route("/api/reports/gmud-cube")
+@login_required
+def api_gmud_cube():
+    """
+    Contagem de GMUDs agrupada por ?by=year,month,status,... e filtrada por
+    qualquer dimensão do cubo (?client=GetNet&status=Encerrada&year=2025).
+    """
+    group_by = [d.strip() for d in request.args.get("by", "year,month").split(",") if d.strip()]
+    filters = {name: request.args.get(name) for name in GMUD_CUBE_DIMS if request.args.get(name)}
+    for name in ("year", "month"):
+        value = request.args.get(name, type=int)
+        if value:
+            filters[name] = value
+    user_restriction = getattr(current_user, 'client_restriction', 'none')
+    if user_restriction and user_restriction != 'none':
+        filters["client"] = user_restriction
+    elif filters.get("client") == "Todos":
+        filters.pop("client")
+
+    try:
+        rows = get_gmud_cube(group_by, filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"by": group_by, "filters": filters, "rows": rows})
+
+
+@app.route("/api/reports/<name>")
+@login_required
+def api_report_widget(name):
+    """Dados já formatados de um gráfico/KPI (reports.py), em cache por cliente."""
+    if name not in REPORT_WIDGETS:
+        return jsonify({"error": f"Relatório desconhecido: {name}"}), 404
+    client_param = request.args.get('client', 'Todos')
+    user_restriction = getattr(current_user, 'client_restriction', 'none')
+    if user_restriction and user_restriction != 'none':
+        client_param = user_restriction
+    client = client_param if client_param and client_param != 'Todos' else None
+    return jsonify(get_widget(name, client, request.args))
+
+
+# ── Batch ─────────────────────────────────────────────────
+
+def _run_subrequest(path, user):
+    """
+    One GET sub-request of /api/batch, dispatched straight to its view: the
+    batch request already authenticated the user and ran the request hooks.
+    """
+    with app.test_request_context(path, method="GET"):
+        g._login_user = user
+        if not request.path.startswith("/api/") or request.endpoint == "api_batch":
+            return {"path": path, "status": 400, "error": "Somente rotas /api/ (exceto /api/batch)"}
+        if request.routing_exception is not None:
+            status = getattr(request.routing_exception, "code", 404)
+            return {"path": path, "status": status,
+                    "error": "Somente leituras (GET) são permitidas no lote" if status == 405 else "Rota não encontrada"}
+        try:
+            response = app.make_response(app.view_functions[request.endpoint](**request.view_args))
+        except HTTPException as e:
+            return {"path": path, "status": e.code, "error": e.description}
+        except Exception as e:
+            print(f"❌ /api/batch {path}: {e}")
+            return {"path": path, "status": 500, "error": str(e)}
+        if not response.is_json:
+            return {"path": path, "status": 415, "error": "Resposta não-JSON (use a rota diretamente)"}
+        return {"path": path, "status": response.status_code, "body": response.get_json()}
+
+
+def _run_subrequests(paths, user):
+    """Run sub-requests in order on this thread, sharing one read-only connection."""
+    with connection_scope(read_only=True):
+        return [_run_subrequest(path, user) for path in paths]
+
+
+@app.route("/api/batch", methods=["POST"])
+@login_required
+def api_batch():
+    """
+    Várias leituras numa só chamada: {"requests": ["/api/filters", "/api/servers?page=1", ...],
+    "parallel": false}. Em série, todas usam uma única conexão SQLite; com
+    "parallel", até BATCH_MAX_WORKERS threads, cada uma com a sua conexão.
+    """
+    data = request.get_json(silent=True) or {}
+    paths = [item.get("path") if isinstance(item, dict) else item for item in data.get("requests") or []]
+    if not paths or not all(isinstance(p, str) and p for p in paths):
+        return jsonify({"error": "Informe 'requests' com os caminhos /api/... a consultar"}), 400
+    if len(paths) > BATCH_MAX_REQUESTS:
+        return jsonify({"error": f"Máximo de {BATCH_MAX_REQUESTS} requisições por lote"}), 400
+
+    user = current_user._get_current_object()
+    workers = min(BATCH_MAX_WORKERS, len(paths)) if data.get("parallel") else 1
+    if workers <= 1:
+        return jsonify({"responses": _run_subrequests(paths, user)})
+
+    # round-robin over the workers; each worker thread opens one connection
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        chunks = list(pool.map(lambda i: _run_subrequests(paths[i::workers], user), range(workers)))
+    responses = [None] * len(paths)
+    for i, chunk in enumerate(chunks):
+        responses[i::workers] = chunk
+    return jsonify({"responses": responses})
+
+
 @app.route("/api/servers")
 @login_required
 def api_servers():
@@ -201,34 +366,69 @@ def api_gmuds():
     if user_restriction and user_restriction != 'none':
         client_param = user_restriction
 
-    data = get_gmuds(
-        client=client_param,
-        year=request.args.get("year", type=int),
-        month=request.args.get("month", type=int),
-        status=request.args.get("status"),
-        assigned_to=request.args.get("assigned_to"),
-        search=request.args.get("search"),
-        page=int(request.args.get("page", 1)),
-        per_page=int(request.args.get("per_page", 50)),
-    )
+    try:
+        data = get_gmuds(
+            client=client_param,
+            year=request.args.get("year", type=int),
+            month=request.args.get("month", type=int),
+            status=request.args.get("status"),
+            assigned_to=request.args.get("assigned_to"),
+            search=request.args.get("search"),
+            date_from=request.args.get("from"),
+            date_to=request.args.get("to"),
+            page=int(request.args.get("page", 1)),
+            per_page=int(request.args.get("per_page", 50)),
+        )
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     return jsonify(data)
 
 
 @app.route("/api/gmud/create", methods=["POST"])
 @login_required
 def api_create_gmud():
-    """Recebe dados do formulário e grava na planilha Excel."""
+    """Grava a GMUD no banco e agenda a escrita na planilha Excel (worker em 2º plano)."""
     try:
         data = request.json
-        success, msg = write_gmud_to_excel(data)
-        if success:
-            return jsonify({"message": msg})
-        else:
-            return jsonify({"message": msg}), 500
+        if not data.get("override_conflicts"):
+            conflicts = windows.check_gmud_conflicts(data)
+            if conflicts:
+                return jsonify({"message": "A GMUD conflita com outras janelas de manutenção do mesmo grupo de hosts.",
+                                "conflicts": conflicts}), 409
+        gmud_id = create_gmud(data)
+        from export_excel import notify_excel_sync
+        notify_excel_sync()
+        return jsonify({"message": "GMUD criada com sucesso! A planilha será atualizada em instantes.",
+                        "id": gmud_id}), 201
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         return jsonify({"message": str(e)}), 500
 
 
+@app.route("/api/windows/conflicts")
+@login_required
+def api_window_conflicts():
+    """Conflitos de janela: de uma GMUD (?gmud_id=) ou de todo o mês (?year=&month=)."""
+    gmud_id = request.args.get("gmud_id", type=int)
+    if gmud_id:
+        gmud = get_gmud_by_id(gmud_id)
+        if not gmud:
+            return jsonify({"message": "GMUD não encontrada"}), 404
+        conflicts = windows.check_gmud_conflicts(
+            {"start_date": gmud["start_at"], "end_date": gmud["end_at"], "title": gmud["title"]},
+            exclude_gmud=gmud_id)
+        return jsonify({"gmud_id": gmud_id, "conflicts": conflicts, "total": len(conflicts)})
+
+    today = datetime.now()
+    year = request.args.get("year", today.year, type=int)
+    month = request.args.get("month", today.month, type=int)
+    if not 1 <= month <= 12:
+        return jsonify({"message": "Mês inválido"}), 400
+    conflicts = windows.get_engine(year, month).all_conflicts()
+    return jsonify({"year": year, "month": month, "conflicts": conflicts, "total": len(conflicts)})
+
+
 @app.route("/api/cmdb")
 @login_required
 def api_cmdb():
@@ -273,6 +473,7 @@ def server_details(hostname):
     return render_template("server_details.html", 
                          server=result['server'], 
                          gmuds=result['gmuds'], 
+                         vulns=get_host_vuln_summary(hostname),
                          active="cmdb_full")
 
 
@@ -339,6 +540,7 @@ def background_import_task(task_id, import_func, *args, **kwargs):
         import traceback
         traceback.print_exc()
     finally:
+        storage.checkpoint_soon()
         # Tenta remover o arquivo temp, se existir, para não lotar o disco
         try:
             tmp_path = kwargs.get('excel_path') or kwargs.get('file_path') or (args[0] if args else None)
@@ -362,6 +564,7 @@ def api_task_status(task_id):
 @login_required
 def api_import():
     """Importa planilha Consolidação — Assíncrono."""
+    from import_excel import run_import
     try:
         task_id = str(uuid.uuid4())
         uploaded = request.files.get("file")
@@ -387,6 +590,7 @@ def api_import():
 @login_required
 def api_import_cmdb_full():
     """Importa planilha CMDB Full — Assíncrono."""
+    from import_excel import run_cmdb_full_import
     try:
         task_id = str(uuid.uuid4())
         uploaded = request.files.get("file")
@@ -412,6 +616,7 @@ def api_import_cmdb_full():
 @login_required
 def api_import_qualys():
     """Importa planilhas do Qualys - Assíncrono."""
+    from import_qualys import import_qualys_scan
     source_type = request.form.get('source_type', 'GetNet')
     try:
         task_id = str(uuid.uuid4())
@@ -439,7 +644,6 @@ def api_import_qualys():
 def api_vulnerabilities():
     try:
         from database import get_connection
-        import re
         conn = get_connection()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
@@ -461,6 +665,7 @@ def api_vulnerabilities():
         query = """
             SELECT d.id, d.qid, d.asset_name, d.asset_ip, d.environment, 
                    d.os, d.status, d.first_detected, d.last_detected,
+                   d.age_days, d.sla_due, d.sla_state, d.squad,
                    v.title, v.severity, v.solution
             FROM qualys_detections d
             JOIN qualys_vulnerabilities v ON d.qid = v.qid
@@ -476,24 +681,8 @@ def api_vulnerabilities():
                 row['client'] = cmdb_ref['client']
                 row['db_type'] = cmdb_ref['db_type']
                 row['cmdb_status'] = cmdb_ref['status']
-                
-                # Classificação de Squad Baseada no Título da Vulnerabilidade
-                title = str(row['title'] or '').lower()
-                squad = "SO / Infra" # Default
-                
-                # Regras de Negócio e Regex
-                if re.search(r'\b(oracle|sql server|mysql|postgresql|mongodb|mariadb|db2|sybase)\b', title):
-                    squad = "DBA"
-                elif re.search(r'\b(weblogic|tomcat|apache|nginx|java|iis|jboss|php|nodejs)\b', title):
-                    squad = "Middleware"
-                elif re.search(r'\b(ssh|ssl|tls|cipher|certificate|openssh|ssl/tls)\b', title):
-                    squad = "Segurança / Crypto"
-                elif re.search(r'\b(windows update|kb[0-9]{6,}|kernel|centos|red hat|ubuntu|debian|suse)\b', title):
-                    squad = "Patch Manager"
-                elif re.search(r'\b(custom|application|code|script)\b', title):
-                    squad = "Desenvolvimento"
-                    
-                row['squad'] = squad
+                # Squad classificada pelo título na importação (vulns.classify_squad)
+                row['squad'] = row['squad'] or classify_squad(row['title'])
                 result.append(row)
                 
         def get_sev_order(sev):
@@ -517,92 +706,47 @@ def api_vulnerabilities():
 @login_required
 def api_vulnerabilities_stats():
     try:
-        from database import get_connection
-        import re
-        conn = get_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
         client_param = request.args.get("client")
         user_restriction = getattr(current_user, 'client_restriction', 'none')
         if user_restriction and user_restriction != 'none':
             client_param = user_restriction
-            
-        where_clause = ""
-        params = []
-        if client_param and client_param != 'Todos':
-            where_clause = " WHERE client = ?"
-            params.append(client_param)
-            
-        cmdb_rows = cursor.execute(f"SELECT hostname, client, db_type, environment, status FROM cmdb_full{where_clause}", params).fetchall()
-        cmdb_dict = { (r['hostname'] or '').lower(): r for r in cmdb_rows if r['hostname'] }
-        
-        query = """
-            SELECT d.asset_name, v.severity, v.title
-            FROM qualys_detections d
-            JOIN qualys_vulnerabilities v ON d.qid = v.qid
-        """
-        qualys_rows = cursor.execute(query).fetchall()
-        conn.close()
-        
-        hosts_vuln = set()
-        sev_counts = {}
-        squad_counts = {}
-        host_vuln_counts = {}
-        
-        for q in qualys_rows:
-            host_lower = (q['asset_name'] or '').lower()
-            if host_lower in cmdb_dict:
-                title = str(q['title'] or '').lower()
-                squad = "SO / Infra"
-                if re.search(r'\b(oracle|sql server|mysql|postgresql|mongodb|mariadb|db2|sybase)\b', title):
-                    squad = "DBA"
-                elif re.search(r'\b(weblogic|tomcat|apache|nginx|java|iis|jboss|php|nodejs)\b', title):
-                    squad = "Middleware"
-                elif re.search(r'\b(ssh|ssl|tls|cipher|certificate|openssh|ssl/tls)\b', title):
-                    squad = "Segurança / Crypto"
-                elif re.search(r'\b(windows update|kb[0-9]{6,}|kernel|centos|red hat|ubuntu|debian|suse)\b', title):
-                    squad = "Patch Manager"
-                elif re.search(r'\b(custom|application|code|script)\b', title):
-                    squad = "Desenvolvimento"
-                    
-                squad_param = request.args.get("squad")
-                if squad_param and squad_param != 'Todas' and squad != squad_param:
-                    continue
-
-                hosts_vuln.add(host_lower)
-                sev = str(q['severity'])
-                sev_counts[sev] = sev_counts.get(sev, 0) + 1
-                squad_counts[squad] = squad_counts.get(squad, 0) + 1
-                
-                if sev in ('4', '5'):
-                    if host_lower not in host_vuln_counts:
-                        host_vuln_counts[host_lower] = {
-                            'asset_name': q['asset_name'], 
-                            'db_type': cmdb_dict[host_lower]['db_type'],
-                            'environment': cmdb_dict[host_lower]['environment'],
-                            'squad': squad,
-                            'count': 0
-                        }
-                    host_vuln_counts[host_lower]['count'] += 1
-                    
-        squad_breakdown = [{'squad': k, 'count': v} for k, v in squad_counts.items()]
-        squad_breakdown.sort(key=lambda x: x['count'], reverse=True)
-        sev_breakdown = [{'severity': k, 'count': v} for k, v in sev_counts.items()]
-        sev_breakdown.sort(key=lambda x: x['severity'], reverse=True)
-        
-        top_hosts = list(host_vuln_counts.values())
-        top_hosts.sort(key=lambda x: x['count'], reverse=True)
-        
-        return jsonify({
-            "total_db_hosts_vulnerable": len(hosts_vuln),
-            "severity_breakdown": sev_breakdown,
-            "squad_breakdown": squad_breakdown,
-            "top_vulnerable_hosts": top_hosts[:10]
-        })
+        if client_param == 'Todos':
+            client_param = None
+        squad_param = request.args.get("squad")
+        if squad_param == 'Todas':
+            squad_param = None
+        # Contagens por host vêm de host_vuln_summary (reconstruída na importação)
+        return jsonify(get_vuln_stats(client_param, squad_param))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/vulnerabilities/host/<path:hostname>", methods=["GET"])
+@login_required
+def api_vulnerabilities_host(hostname):
+    """Resumo de vulnerabilidades de um host (contagens por severidade e squad, detecção aberta mais antiga)."""
+    summary = get_host_vuln_summary(hostname)
+    user_restriction = getattr(current_user, 'client_restriction', 'none')
+    if not summary or (user_restriction and user_restriction != 'none' and summary["client"] != user_restriction):
+        return jsonify({"error": "Host sem vulnerabilidades registradas"}), 404
+    return jsonify(summary)
+
+@app.route("/api/vulnerabilities/aging", methods=["GET"])
+@login_required
+def api_vulnerabilities_aging():
+    """Histogramas de idade e estados de SLA por squad e por cliente (filtros client e squad)."""
+    client_param = request.args.get("client")
+    user_restriction = getattr(current_user, 'client_restriction', 'none')
+    if user_restriction and user_restriction != 'none':
+        client_param = user_restriction
+    if client_param == 'Todos':
+        client_param = None
+    squad_param = request.args.get("squad")
+    if squad_param == 'Todas':
+        squad_param = None
+    data = get_vuln_aging(client_param, squad_param)
+    data["policy"] = get_sla_policy()
+    return jsonify(data)
+
 @app.route("/gmud/edit/<int:gmud_id>")
 @login_required
 def gmud_edit(gmud_id):
@@ -619,6 +763,16 @@ def api_get_gmud(gmud_id):
     return jsonify(gmud)
 
 
+@app.route("/api/gmud/<int:gmud_id>/excel-status")
+@login_required
+def api_gmud_excel_status(gmud_id):
+    """Confirmação da gravação da GMUD na planilha (pending / synced / error)."""
+    status = get_excel_sync_status(gmud_id)
+    if not status:
+        return jsonify({"message": "GMUD sem gravação pendente na planilha"}), 404
+    return jsonify(status)
+
+
 @app.route("/api/gmud/<int:gmud_id>", methods=["PUT"])
 @login_required
 @admin_required
@@ -643,6 +797,64 @@ def api_delete_gmud(gmud_id):
     return jsonify({"status": "error", "message": "Falha ao excluir GMUD"})
 
 
+@app.route("/api/admin/metrics")
+@login_required
+@admin_required
+def api_admin_metrics():
+    """Request metrics in Prometheus text format."""
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/admin/queries", methods=["GET", "DELETE"])
+@login_required
+@admin_required
+def api_admin_queries():
+    """SQL profiler report (DELETE resets the collected stats)."""
+    if request.method == "DELETE":
+        query_profiler.reset()
+        return jsonify({"status": "success"})
+    return jsonify(query_profiler.get_report(limit=request.args.get("limit", 50, type=int)))
+
+
+@app.route("/api/admin/storage", methods=["GET", "POST"])
+@login_required
+@admin_required
+def api_admin_storage():
+    """Estado da cópia local do banco (POST força um checkpoint no volume)."""
+    if request.method == "POST":
+        written = storage.checkpoint(force=True)
+        return jsonify({"status": "success" if written else "skipped", **storage.get_status()})
+    return jsonify(storage.get_status())
+
+
+@app.route("/api/admin/psu-targets", methods=["GET", "PUT"])
+@login_required
+@admin_required
+def api_admin_psu_targets():
+    """Versões PSU alvo por major (PUT substitui a tabela e recalcula a conformidade)."""
+    if request.method == "PUT":
+        data = request.get_json() or {}
+        try:
+            set_psu_targets(data.get("targets") or [])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify({"targets": get_psu_targets()})
+
+
+@app.route("/api/admin/vuln-sla", methods=["GET", "PUT"])
+@login_required
+@admin_required
+def api_admin_vuln_sla():
+    """Prazos de SLA por severidade Qualys (PUT substitui a tabela e recalcula os estados)."""
+    if request.method == "PUT":
+        data = request.get_json() or {}
+        try:
+            set_sla_policy(data.get("policy") or [])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify({"policy": get_sla_policy()})
+
+
 @app.route("/api/users", methods=["GET"])
 @login_required
 @admin_required
@@ -667,6 +879,8 @@ def api_create_user():
         return jsonify({"status": "success", "user_id": user_id})
     except sqlite3.IntegrityError:
         return jsonify({"status": "error", "message": "Usuário já existe"}), 400
+    except PasswordBusyError as e:
+        return jsonify({"status": "error", "message": str(e)}), 429
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -691,6 +905,8 @@ def api_reset_password(user_id):
     try:
         reset_user_password(user_id, data.get('new_password'))
         return jsonify({"status": "success"})
+    except PasswordBusyError as e:
+        return jsonify({"status": "error", "message": str(e)}), 429
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -773,6 +989,8 @@ def api_gmuds_export():
         status=request.args.get("status"),
         assigned_to=request.args.get("assigned_to"),
         search=request.args.get("search"),
+        date_from=request.args.get("from"),
+        date_to=request.args.get("to"),
         page=1, per_page=99999
     )
     fields = ["change_number", "title", "status", "environment", "db_type",
@@ -810,10 +1028,19 @@ def api_cmdb_full_export():
 #  INICIALIZAÇÃO (Startup)
 # ══════════════════════════════════════════════════════════
 
-# Inicializar DB sempre que o módulo for importado
-# (necessário para gunicorn, que não roda via __main__)
-init_db()
-ensure_admin_exists()
+def _start_excel_writer():
+    from export_excel import start_excel_sync_worker
+    start_excel_sync_worker()
+
+
+# Verificar o schema sempre que o módulo for importado (necessário para gunicorn,
+# que não roda via __main__). Com o banco atualizado é só uma leitura de PRAGMA.
+ensure_schema()
+
+# openpyxl/export_excel só são carregados quando há GMUD pendente de escrita na
+# planilha; senão o escritor sobe na primeira GMUD criada (notify_excel_sync)
+if has_pending_excel_sync():
+    threading.Thread(target=_start_excel_writer, daemon=True).start()
 
 if __name__ == "__main__":
     print(f"\n ORAEX PSU Manager")
@@ -0,0 +1,90 @@
+"""
+ORAEX PSU Manager — Static Asset Fingerprinting
+Content-hashed URLs for static files, served with long-lived immutable caching.
+
+    {{ asset_url('css/styles.css') }}  ->  /assets/css/styles.3f9a1c0b2d4e.css
+"""
+import os
+import re
+import hashlib
+import threading
+from flask import url_for, abort
+from compression import send_static_compressed
+
+HASH_LENGTH = 12
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600  # 1 ano
+
+_HASHED_NAME = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)$" % HASH_LENGTH)
+
+# Manifest: {relative_path: (mtime_ns, size, hash)}
+_MANIFEST = {}
+_manifest_lock = threading.Lock()
+
+
+def _hash_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()[:HASH_LENGTH]
+
+
+def _fingerprint(static_folder, filename):
+    """Hash a single static file and store it in the manifest."""
+    path = os.path.join(static_folder, filename)
+    st = os.stat(path)
+    entry = (st.st_mtime_ns, st.st_size, _hash_file(path))
+    with _manifest_lock:
+        _MANIFEST[filename] = entry
+    return entry
+
+
+def build_manifest(static_folder):
+    """Fingerprint every file under the static folder. Returns the number of assets."""
+    for root, _dirs, files in os.walk(static_folder):
+        for name in files:
+            rel = os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, "/")
+            _fingerprint(static_folder, rel)
+    return len(_MANIFEST)
+
+
+def _current_hash(app, filename):
+    """Hash for filename; in debug mode re-fingerprint files edited since startup."""
+    entry = _MANIFEST.get(filename)
+    if app.debug:
+        path = os.path.join(app.static_folder, filename)
+        if not os.path.isfile(path):
+            return None
+        st = os.stat(path)
+        if not entry or entry[0] != st.st_mtime_ns or entry[1] != st.st_size:
+            entry = _fingerprint(app.static_folder, filename)
+    return entry[2] if entry else None
+
+
+def init_assets(app):
+    """Build the manifest, register the /assets route and the asset_url() template helper."""
+    build_manifest(app.static_folder)
+
+    def asset_url(filename):
+        digest = _current_hash(app, filename)
+        if not digest:
+            return url_for("static", filename=filename)
+        stem, ext = os.path.splitext(filename)
+        return url_for("asset", filename=f"{stem}.{digest}{ext}")
+
+    @app.route("/assets/<path:filename>", endpoint="asset")
+    def asset(filename):
+        m = _HASHED_NAME.match(filename)
+        if not m:
+            abort(404)
+        original = m.group("stem") + m.group("ext")
+        if _current_hash(app, original) != m.group("hash"):
+            # Hash antigo (deploy novo): serve o conteúdo atual sem cache longo
+            return send_static_compressed(app, original)
+
+        response = send_static_compressed(app, original, max_age=IMMUTABLE_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.jinja_env.globals["asset_url"] = asset_url
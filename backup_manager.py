@@ -0,0 +1,249 @@
+"""
+ORAEX PSU Manager — Workbook Backups
+Content-addressed backups of the Excel workbook with retention policies.
+
+Layout in BACKUP_DIR:
+    objects/<sha256>.bak[.gz|.zst]   one file per distinct content
+    index.json                       list of snapshots pointing to objects
+
+Timestamped <workbook>_<YYYYmmdd_HHMMSS>.bak copies left by older versions are
+imported into the store (and removed) the first time the index is touched.
+"""
+import os
+import re
+import sys
+import json
+import gzip
+import shutil
+import hashlib
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from config import (
+    BACKUP_DIR, BACKUP_KEEP_LAST, BACKUP_KEEP_HOURLY, BACKUP_KEEP_DAILY, BACKUP_COMPRESSION
+)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+OBJECTS_DIR = os.path.join(BACKUP_DIR, "objects")
+INDEX_PATH = os.path.join(BACKUP_DIR, "index.json")
+CHUNK_SIZE = 1024 * 1024
+_LEGACY_NAME = re.compile(r"^(?P<source>.+)_(?P<stamp>\d{8}_\d{6})\.bak$")
+
+_index_lock = threading.Lock()
+
+
+def _compression():
+    """Resolve the configured compression, falling back to gzip if zstandard is missing."""
+    method = (BACKUP_COMPRESSION or "none").lower()
+    if method == "zstd" and zstandard is None:
+        return "gzip"
+    return method if method in ("gzip", "zstd") else "none"
+
+
+def _object_name(digest, method):
+    suffix = {"gzip": ".bak.gz", "zstd": ".bak.zst"}.get(method, ".bak")
+    return digest + suffix
+
+
+def _file_sha256(file_path):
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _find_object(digest):
+    """Return the stored object for this content hash, whatever its compression."""
+    for method in ("none", "gzip", "zstd"):
+        name = _object_name(digest, method)
+        if os.path.exists(os.path.join(OBJECTS_DIR, name)):
+            return name
+    return None
+
+
+def _store_object(file_path, digest):
+    """Copy file_path into the object store (atomic rename), compressing if configured."""
+    method = _compression()
+    name = _object_name(digest, method)
+    fd, tmp_path = tempfile.mkstemp(dir=OBJECTS_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out, open(file_path, "rb") as src:
+            if method == "gzip":
+                with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6) as gz:
+                    shutil.copyfileobj(src, gz, CHUNK_SIZE)
+            elif method == "zstd":
+                zstandard.ZstdCompressor(level=3).copy_stream(src, out)
+            else:
+                shutil.copyfileobj(src, out, CHUNK_SIZE)
+        os.replace(tmp_path, os.path.join(OBJECTS_DIR, name))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return name
+
+
+def load_index():
+    """Read the snapshot index (empty list if there are no backups yet)."""
+    if not os.path.exists(INDEX_PATH):
+        return []
+    with open(INDEX_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _import_legacy_backups(entries):
+    """
+    Move the old timestamped copies in BACKUP_DIR into the object store so the
+    retention policy covers them. Returns entries plus the imported snapshots,
+    oldest first.
+    """
+    try:
+        names = os.listdir(BACKUP_DIR)
+    except FileNotFoundError:
+        return entries
+    imported = []
+    for file_name in names:
+        match = _LEGACY_NAME.match(file_name)
+        path = os.path.join(BACKUP_DIR, file_name)
+        if not match or not os.path.isfile(path):
+            continue
+        os.makedirs(OBJECTS_DIR, exist_ok=True)
+        digest = _file_sha256(path)
+        name = _find_object(digest) or _store_object(path, digest)
+        imported.append({
+            "source": match["source"],
+            "created_at": datetime.strptime(match["stamp"], "%Y%m%d_%H%M%S").strftime("%Y-%m-%d %H:%M:%S"),
+            "sha256": digest,
+            "object": name,
+            "size": os.path.getsize(path),
+        })
+        os.unlink(path)
+    if not imported:
+        return entries
+    print(f"📦 {len(imported)} backups antigos importados para {OBJECTS_DIR}")
+    return sorted(entries + imported, key=lambda e: e["created_at"])
+
+
+def _save_index(entries):
+    fd, tmp_path = tempfile.mkstemp(dir=BACKUP_DIR, suffix=".json.tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=1, ensure_ascii=False)
+    os.replace(tmp_path, INDEX_PATH)
+
+
+def create_backup(file_path):
+    """
+    Snapshot file_path into the backup store.
+
+    Identical content is stored only once; if the latest snapshot of the same
+    file already has this content, no new snapshot is recorded either.
+
+    Returns:
+        dict: the snapshot entry (source, created_at, sha256, object, size, deduplicated).
+    """
+    os.makedirs(OBJECTS_DIR, exist_ok=True)
+    source = os.path.basename(file_path)
+    digest = _file_sha256(file_path)
+
+    with _index_lock:
+        entries = _import_legacy_backups(load_index())
+        same_source = [e for e in entries if e["source"] == source]
+        if same_source and same_source[-1]["sha256"] == digest:
+            return dict(same_source[-1], deduplicated=True)
+
+        name = _find_object(digest)
+        deduplicated = name is not None
+        if not deduplicated:
+            name = _store_object(file_path, digest)
+
+        entry = {
+            "source": source,
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "sha256": digest,
+            "object": name,
+            "size": os.path.getsize(file_path),
+        }
+        entries.append(entry)
+        _save_index(_apply_retention(entries))
+
+    return dict(entry, deduplicated=deduplicated)
+
+
+def _apply_retention(entries, now=None):
+    """
+    Keep, per source file: the KEEP_LAST newest snapshots, the newest snapshot of
+    each of the last KEEP_HOURLY hours and of each of the last KEEP_DAILY days.
+    Objects no longer referenced are deleted from disk.
+    """
+    now = now or datetime.now()
+    keep = set()
+    by_source = {}
+    for i, e in enumerate(entries):
+        by_source.setdefault(e["source"], []).append(i)
+
+    for indexes in by_source.values():
+        newest_first = sorted(indexes, key=lambda i: entries[i]["created_at"], reverse=True)
+        keep.update(newest_first[:BACKUP_KEEP_LAST])
+
+        seen_hours, seen_days = set(), set()
+        for i in newest_first:
+            ts = datetime.strptime(entries[i]["created_at"], "%Y-%m-%d %H:%M:%S")
+            hour, day = ts.strftime("%Y%m%d%H"), ts.strftime("%Y%m%d")
+            if now - ts <= timedelta(hours=BACKUP_KEEP_HOURLY) and hour not in seen_hours:
+                seen_hours.add(hour)
+                keep.add(i)
+            if now - ts <= timedelta(days=BACKUP_KEEP_DAILY) and day not in seen_days:
+                seen_days.add(day)
+                keep.add(i)
+
+    kept = [e for i, e in enumerate(entries) if i in keep]
+
+    referenced = {e["object"] for e in kept}
+    for e in entries:
+        if e["object"] not in referenced:
+            path = os.path.join(OBJECTS_DIR, e["object"])
+            if os.path.exists(path):
+                os.unlink(path)
+            referenced.add(e["object"])
+    return kept
+
+
+def prune_backups():
+    """Apply the retention policy now. Returns how many snapshots were removed."""
+    with _index_lock:
+        loaded = load_index()
+        entries = _import_legacy_backups(loaded)
+        kept = _apply_retention(entries)
+        if kept != loaded:
+            _save_index(kept)
+    return len(entries) - len(kept)
+
+
+def restore_backup(entry, dest_path):
+    """Write the content of a snapshot entry back to dest_path (decompressing if needed)."""
+    src_path = os.path.join(OBJECTS_DIR, entry["object"])
+    with open(dest_path, "wb") as out:
+        if src_path.endswith(".gz"):
+            with gzip.open(src_path, "rb") as src:
+                shutil.copyfileobj(src, out, CHUNK_SIZE)
+        elif src_path.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError("Pacote 'zstandard' necessário para restaurar este backup")
+            with open(src_path, "rb") as src:
+                zstandard.ZstdDecompressor().copy_stream(src, out)
+        else:
+            with open(src_path, "rb") as src:
+                shutil.copyfileobj(src, out, CHUNK_SIZE)
+    return dest_path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--prune":
+        print(f"🧹 {prune_backups()} backups removidos")
+    for e in load_index():
+        print(f"{e['created_at']}  {e['source']}  {e['sha256'][:12]}  {e['size']:>12,} bytes  {e['object']}")
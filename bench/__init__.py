@@ -0,0 +1 @@
+"""ORAEX PSU Manager — benchmark harness (python -m bench.run)."""
@@ -0,0 +1,241 @@
+"""
+ORAEX PSU Manager — Synthetic Benchmark Data
+Generates Consolidação, CMDB Full and Qualys workbooks in the exact layouts the
+importers read, at a configurable scale. The same hostname pool is used in every
+workbook so the CMDB ↔ Qualys ↔ inventory joins have realistic hit rates.
+
+    python -m bench.generate --hosts 10000 --detections 100000 --out /tmp/bench
+"""
+import os
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+import openpyxl
+
+SCALES = {
+    "1k": (1_000, 10_000),
+    "10k": (10_000, 100_000),
+    "100k": (100_000, 1_000_000),
+}
+
+ENVIRONMENTS = ["Produção", "Homologação", "Desenvolvimento", "DR"]
+PSU_VERSIONS = ["19.18.0.0.0", "19.19.0.0.0", "19.21.0.0.0", "19.22.0.0.0", "19.23.0.0.0",
+                "12.2.0.1.220118", "12.1.0.2.210420", "Descontinuado", ""]
+DB_TYPES = ["Oracle", "Oracle", "Oracle", "SQL Server", "MongoDB", "PostgreSQL", "MySQL", "mongodb (p)", "sqlserver"]
+CMDB_STATUS = ["Ativo", "ativo", "Descontinuado", "Sendo Descontinuado", "Stopped", "Em Implantação"]
+GMUD_STATUS = ["ENCERRADA", "PROGRAMADA", "NOVO", "AVALIAR", "AUTORIZAR", "✅", "\U0001f504", "CANCELAR", "FREEZING"]
+TEAMS = ["DBA Oracle", "DBA SQL", "Infra Linux", "Infra Windows", "Middleware", "Cloud"]
+PEOPLE = ["Ana Souza", "Bruno Lima", "Carla Dias", "Diego Alves", "Elisa Rocha", "Fábio Nunes"]
+PRODUCTS = ["Adquirência", "Conciliação", "Portal Lojista", "Antifraude", "Pix", "Boleto", "Cartões"]
+WEEKDAYS = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+OS_NAMES = [("Oracle Linux", "7.9"), ("Red Hat Enterprise Linux", "8.6"), ("Windows Server", "2019"),
+            ("SUSE Linux", "15"), ("CentOS", "7")]
+VULN_WORDS = ["Oracle Database", "SQL Server", "Apache Tomcat", "OpenSSH", "SSL/TLS Weak Cipher",
+              "Red Hat kernel", "Java SE", "Windows Update KB5034441", "MongoDB", "Custom application script",
+              "PostgreSQL", "nginx", "Ubuntu"]
+
+
+def _hostnames(n):
+    return [f"{'srvora' if i % 3 else 'srvdb'}{i:06d}" for i in range(n)]
+
+
+def _ip(rng):
+    return f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+
+def _write_sheet(wb, title, header, rows):
+    ws = wb.create_sheet(title)
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+
+
+def generate_consolidacao(path, hosts, rng):
+    """Consolidação workbook: Oracle servers, CMDB, monthly GMUD sheets, planning, PagoNxt."""
+    # Imported here: bench.run must set the environment before config is loaded
+    from config import MONTH_SHEETS
+
+    wb = openpyxl.Workbook(write_only=True)
+    names = _hostnames(hosts)
+
+    def servers():
+        for h in names[: max(10, hosts // 5)]:
+            standby = f"{h}-stb" if rng.random() < 0.6 else "N/A"
+            if rng.random() < 0.05:
+                h += " (G)"
+            yield [rng.choice(ENVIRONMENTS), h, standby, rng.choice(PSU_VERSIONS), rng.choice(["Sim", "Não"]),
+                   rng.choice(["Alinhado", "Pendente"]), rng.choice(["19.1.0.0.4", "21.3", ""]),
+                   rng.choice(PEOPLE), rng.choice(TEAMS), rng.choice(PRODUCTS), rng.choice(WEEKDAYS),
+                   "22:00", "02:00", rng.choice(["", "Janela fixa", "Validar com negócio"])]
+
+    def cmdb():
+        for h in names[: max(10, hosts // 5)]:
+            yield [rng.choice(ENVIRONMENTS), h, f"{h}-ctg", rng.choice(DB_TYPES), "19c",
+                   rng.choice(PSU_VERSIONS), rng.choice(CMDB_STATUS), rng.choice(WEEKDAYS), "2ª semana",
+                   "22:00", "02:00", rng.choice(PRODUCTS), rng.choice(PRODUCTS), "Banco de Dados",
+                   rng.choice(OS_NAMES)[0], rng.choice(PEOPLE), "Principal", f"Base {h}", "Linux",
+                   rng.choice(TEAMS), rng.choice(PEOPLE), "time@example.com", rng.choice(PEOPLE), _ip(rng)]
+
+    _write_sheet(wb, "GetNet - Oracle Databases",
+                 ["ENVIROMENT", "PRIMARY HOSTNAME", "STANDBY HOSTNAME", "GRID/PSU VERSION"] + [f"C{i}" for i in range(10)],
+                 servers())
+    _write_sheet(wb, "GetNet CMDB - Databases", ["Entorno", "Nome"] + [f"C{i}" for i in range(22)], cmdb())
+
+    extended = {"JULHO-25", "AGOSTO-25", "OUTUBRO-25", "NOVEMBRO-25"}
+    per_month = max(50, hosts // 2 // len(MONTH_SHEETS))
+    for sheet_name, (year, month) in MONTH_SHEETS.items():
+        rows = []
+        for i in range(per_month):
+            start = datetime(year, month, rng.randint(1, 28), rng.choice([20, 21, 22, 23]), 0)
+            end = start + timedelta(hours=rng.choice([2, 3, 4]))
+            row = [rng.choice(["GetNet", "PagoNxt"]), rng.choice(DB_TYPES), rng.choice(ENVIRONMENTS),
+                   rng.choice(GMUD_STATUS), WEEKDAYS[start.weekday()], start, end,
+                   f"CHG{year % 100:02d}{month:02d}{i:05d}", f"Aplicação PSU {rng.choice(PSU_VERSIONS)} - {rng.choice(names)}",
+                   rng.choice(PEOPLE), rng.choice(["", "Sem impacto", "Rollback executado"])]
+            if sheet_name in extended:
+                row += [rng.randint(0, 40), rng.randint(0, 10), rng.choice(["OK", "NOK"]), rng.choice(["Sim", "Não"]),
+                        start + timedelta(days=7), end + timedelta(days=7), f"CHG{i:07d}"]
+            else:
+                row += [rng.choice(["", "CVE-2024-21000", "QID 105943"]), rng.choice(PEOPLE)]
+            rows.append(row)
+        _write_sheet(wb, sheet_name, ["Cliente", "Tipo BD", "Entorno", "Status"] + [f"C{i}" for i in range(14)], rows)
+
+    _write_sheet(wb, "Planejamento oracle", ["Nome"] + [f"C{i}" for i in range(15)], (
+        [h, f"{h}-ctg", rng.choice(WEEKDAYS), "1ª semana", "22:00", "02:00", rng.choice(PEOPLE), "19c",
+         rng.choice(PSU_VERSIONS), rng.choice(PRODUCTS), rng.choice(PRODUCTS), rng.choice(OS_NAMES)[0],
+         "Principal", f"Base {h}", rng.choice(TEAMS), rng.choice(PEOPLE)]
+        for h in names[: max(10, hosts // 10)]
+    ))
+    _write_sheet(wb, "PagoNxt - Databases", ["ENVIROLMENT", "NAME"] + [f"C{i}" for i in range(13)], (
+        [rng.choice(ENVIRONMENTS), h, rng.choice(["Sim", "Não"]), rng.choice(PSU_VERSIONS), rng.choice(PEOPLE),
+         rng.choice(["Zona A", "Zona B"]), rng.choice(PRODUCTS), f"Base {h}", "Online", "Pagamentos", "",
+         _ip(rng), "ORCL1", rng.choice(["Ativo", "Inativo"]), rng.choice(OS_NAMES)[0]]
+        for h in names[-max(10, hosts // 20):]
+    ))
+    wb.save(path)
+
+
+def generate_cmdb_full(path, hosts, rng):
+    """CMDB Full workbook: 'CMDB Geral GETNET Brasil' (70% of hosts) and 'CMDB Geral LATAM'."""
+    wb = openpyxl.Workbook(write_only=True)
+    names = _hostnames(hosts)
+    split = int(hosts * 0.7)
+
+    def rows(hostnames, width, status_col):
+        for h in hostnames:
+            row = [""] * width
+            row[8], row[9] = h, f"{h}-ctg"
+            # ~10% of CMDB rows are not databases and are skipped by the importer
+            row[11] = rng.choice(DB_TYPES) if rng.random() > 0.1 else ""
+            row[12] = rng.choice(PSU_VERSIONS)
+            row[status_col] = rng.choice(CMDB_STATUS)
+            for offset, value in enumerate([
+                    "Servidor", rng.choice(ENVIRONMENTS), rng.choice(OS_NAMES)[0], rng.choice(TEAMS),
+                    rng.choice(PEOPLE), rng.choice(PEOPLE), rng.choice(PRODUCTS), "Principal", f"Base {h}"], 1):
+                row[status_col + offset] = value
+            row[width - 3:] = [_ip(rng), _ip(rng), _ip(rng)]
+            yield row
+
+    _write_sheet(wb, "CMDB Geral GETNET Brasil", [f"Col{i}" for i in range(56)], rows(names[:split], 56, 18))
+    latam = list(rows(names[split:], 58, 20))
+    for row in latam:
+        row[18], row[19] = rng.choice(["Zona A", "Zona B"]), rng.choice(["Brasil", "México", "Chile"])
+    _write_sheet(wb, "CMDB Geral LATAM", [f"Col{i}" for i in range(58)], latam)
+    wb.save(path)
+
+
+def _qid_catalog(rng, size):
+    catalog = []
+    for i in range(size):
+        word = rng.choice(VULN_WORDS)
+        catalog.append((100000 + i, f"{word} Multiple Vulnerabilities ({i})", str(rng.choice([1, 2, 3, 3, 4, 4, 5])),
+                        f"Update {word} to the latest version."))
+    return catalog
+
+
+def generate_qualys(path_pagonxt, path_getnet, hosts, detections, rng):
+    """Qualys scans: PagoNxt ('DEMANDAS PM') and GetNet ('PROCV'), detections split 30/70."""
+    names = _hostnames(hosts)
+    catalog = _qid_catalog(rng, min(5000, max(200, detections // 50)))
+    scan_date = datetime(2026, 2, 19)
+
+    def detection(host):
+        qid, title, severity, solution = rng.choice(catalog)
+        age = rng.randint(0, 400)
+        os_name, os_version = rng.choice(OS_NAMES)
+        return {
+            "asset": host, "title": title, "results": "Vulnerable version detected", "age": age,
+            "first": scan_date - timedelta(days=age), "team": rng.choice(TEAMS), "env": rng.choice(ENVIRONMENTS),
+            "os": os_name, "os_version": os_version, "severity": severity,
+            "last": scan_date - timedelta(days=rng.randint(0, 7)), "ip": _ip(rng), "solution": solution,
+            "qid": qid, "overdue": rng.choice(["Sim", "Não"]),
+        }
+
+    n_pagonxt = int(detections * 0.3)
+    wb = openpyxl.Workbook(write_only=True)
+    _write_sheet(wb, "DEMANDAS PM",
+                 ["Asset Name", "Title", "Results", "Detection AGE", "First Detected", "Equipe Responsável",
+                  "Ambiente", "Sistema Operacional", "Versão de SO", "EOL de SO", "EOL de Vulnerabilidade",
+                  "Data Scan", "Severity", "Last Detected", "Asset IPV4", "Solution", "QID", "Overdue", "0"],
+                 ([d["asset"], d["title"], d["results"], d["age"], d["first"], d["team"], d["env"], d["os"],
+                   d["os_version"], "", "", scan_date, d["severity"], d["last"], d["ip"], d["solution"],
+                   d["qid"], d["overdue"], ""]
+                  for d in (detection(rng.choice(names)) for _ in range(n_pagonxt))))
+    wb.save(path_pagonxt)
+
+    wb = openpyxl.Workbook(write_only=True)
+    _write_sheet(wb, "PROCV",
+                 ["PROCV", "Asset Name", "Title", "Results", "Detection AGE", "First Detected", "Equipe Responsável",
+                  "Tipo", "Ambiente", "Sistema Operacional", "Versão de SO", "EOL de SO", "EOL de Vulnerabilidade",
+                  "Data Scan", "Severity", "Last Detected", "Asset IPV4", "Solution", "QID", "Overdue"],
+                 (["PROCV", d["asset"], d["title"], d["results"], d["age"], d["first"], d["team"], "Servidor",
+                   d["env"], d["os"], d["os_version"], "", "", scan_date, d["severity"], d["last"], d["ip"],
+                   d["solution"], d["qid"], d["overdue"]]
+                  for d in (detection(rng.choice(names)) for _ in range(detections - n_pagonxt))))
+    wb.save(path_getnet)
+
+
+def workbook_paths(out_dir):
+    """Where generate_all() writes each workbook."""
+    return {
+        "consolidacao": os.path.join(out_dir, "Consolidacao_bench.xlsx"),
+        "cmdb_full": os.path.join(out_dir, "CMDB_Full_bench.xlsx"),
+        "qualys_pagonxt": os.path.join(out_dir, "Qualys_PagoNxt_bench.xlsx"),
+        "qualys_getnet": os.path.join(out_dir, "Qualys_GetNet_bench.xlsx"),
+    }
+
+
+def generate_all(out_dir, hosts, detections, seed=42):
+    """
+    Write every workbook into out_dir. Returns {"paths": {...}, "seconds": {...}}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    paths = workbook_paths(out_dir)
+    seconds = {}
+    steps = [
+        ("consolidacao", lambda: generate_consolidacao(paths["consolidacao"], hosts, rng)),
+        ("cmdb_full", lambda: generate_cmdb_full(paths["cmdb_full"], hosts, rng)),
+        ("qualys", lambda: generate_qualys(paths["qualys_pagonxt"], paths["qualys_getnet"], hosts, detections, rng)),
+    ]
+    for name, step in steps:
+        start = time.perf_counter()
+        step()
+        seconds[name] = round(time.perf_counter() - start, 3)
+        print(f"  ✅ {name}: {seconds[name]:.1f}s")
+    return {"paths": paths, "seconds": seconds}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera planilhas sintéticas para benchmark")
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument("--hosts", type=int)
+    parser.add_argument("--detections", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=os.path.join("bench", "data"))
+    args = parser.parse_args()
+
+    hosts, detections = SCALES[args.scale]
+    print(f"🧪 Gerando dados: {args.hosts or hosts:,} hosts, {args.detections or detections:,} detecções → {args.out}")
+    generate_all(args.out, args.hosts or hosts, args.detections or detections, args.seed)
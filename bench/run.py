@@ -0,0 +1,285 @@
+"""
+ORAEX PSU Manager — Benchmark Runner
+Generates synthetic workbooks, times the importers, every GET /api/* endpoint
+(via the Flask test client) and the CSV exports, and writes the results as JSON
+so runs can be compared across commits.
+
+    python -m bench.run --scale 10k
+    python -m bench.run --scale 1k --detections 50000 --repeat 10
+    python -m bench.run --compare bench/results/a.json bench/results/b.json
+
+Everything runs in a scratch directory (--workdir) with its own database; the
+environment is set before config.py is imported, so the real data is untouched.
+"""
+import io
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import platform
+import subprocess
+import statistics
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from bench.generate import SCALES, generate_all, workbook_paths
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _configure_env(workdir, paths):
+    """Point every data path in config.py at the scratch directory."""
+    os.environ.update({
+        "DATABASE_PATH": os.path.join(workdir, "bench.db"),
+        "EXCEL_PATH": paths["consolidacao"],
+        "CMDB_FULL_PATH": paths["cmdb_full"],
+        "QUALYS_PAGONXT_PATH": paths["qualys_pagonxt"],
+        "QUALYS_GETNET_PATH": paths["qualys_getnet"],
+        "BACKUP_DIR": os.path.join(workdir, "backups"),
+    })
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _timed(fn, verbose=False):
+    """Run fn, returning (seconds, result). Importer chatter is swallowed unless verbose."""
+    out = sys.stdout if verbose else io.StringIO()
+    start = time.perf_counter()
+    with redirect_stdout(out):
+        result = fn()
+    return time.perf_counter() - start, result
+
+
+def _summary(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        "min": round(ordered[0], 2),
+        "median": round(statistics.median(ordered), 2),
+        "p95": round(ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def _server_timing_db(response):
+    """DB milliseconds from the Server-Timing header (see metrics.py)."""
+    for part in response.headers.get("Server-Timing", "").split(","):
+        part = part.strip()
+        if part.startswith("db;"):
+            for field in part.split(";"):
+                if field.startswith("dur="):
+                    return float(field[4:])
+    return None
+
+
+def run_imports(paths, verbose=False):
+    from import_excel import run_import, run_cmdb_full_import
+    from import_qualys import import_qualys_scan
+
+    steps = [
+        ("consolidacao", lambda: run_import(paths["consolidacao"])),
+        ("cmdb_full", lambda: run_cmdb_full_import(paths["cmdb_full"])),
+        ("qualys_pagonxt", lambda: import_qualys_scan(paths["qualys_pagonxt"], "PagoNxt")),
+        ("qualys_getnet", lambda: import_qualys_scan(paths["qualys_getnet"], "GetNet")),
+    ]
+    results = {}
+    for name, step in steps:
+        seconds, _ = _timed(step, verbose)
+        results[name] = {"seconds": round(seconds, 3)}
+        print(f"  ⏱️  import {name:<16} {seconds:8.2f}s")
+    return results
+
+
+def _table_counts():
+    from database import get_connection
+    conn = get_connection()
+    tables = ["servers", "cmdb_databases", "gmuds", "planning", "pagonxt_databases",
+              "cmdb_full", "qualys_vulnerabilities", "qualys_detections"]
+    counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in tables}
+    conn.close()
+    return counts
+
+
+def _api_targets(app):
+    """
+    Every GET /api/* rule, with URL parameters filled from the data, plus a few
+    filtered variants of the list endpoints.
+    """
+    from database import get_connection
+    conn = get_connection()
+    row = conn.execute("SELECT id FROM gmuds ORDER BY id LIMIT 1").fetchone()
+    host = conn.execute("SELECT asset_name FROM host_vuln_summary ORDER BY sev5 DESC LIMIT 1").fetchone()
+    conn.close()
+    samples = {"gmud_id": row[0] if row else 1, "hostname": host[0] if host else "none"}
+
+    targets = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if not rule.rule.startswith("/api/") or "GET" not in rule.methods:
+            continue
+        if any(arg not in samples for arg in rule.arguments):
+            continue  # e.g. /api/task-status/<task_id>: no meaningful value to benchmark
+        url = rule.rule
+        for arg in rule.arguments:
+            url = (url.replace(f"<int:{arg}>", str(samples[arg])).replace(f"<path:{arg}>", str(samples[arg]))
+                   .replace(f"<{arg}>", str(samples[arg])))
+        targets.append(url)
+
+    from reports import WIDGETS
+    targets += [f"/api/reports/{name}" for name in sorted(WIDGETS)]
+    targets += [
+        "/api/gmuds?client=GetNet&per_page=100",
+        "/api/gmuds?search=PSU&page=3",
+        "/api/gmuds?from=2025-06-01&to=2025-06-30",
+        "/api/reports/gmud-cube?by=year,month,status&client=GetNet",
+        "/api/cmdb-full?client=PagoNxt&db_type=Oracle",
+        "/api/cmdb-full?search=srvora",
+        "/api/servers?search=srvdb",
+        "/api/vulnerabilities?client=GetNet",
+        "/api/vulnerabilities/aging?client=GetNet&squad=DBA",
+        "/api/vulnerabilities/stats?client=GetNet&squad=DBA",
+        "/api/hostnames?search=srvora00",
+        "/api/dashboard?client=PagoNxt",
+    ]
+    return targets
+
+
+def run_endpoints(repeat=5):
+    from app import app
+
+    client = app.test_client()
+    response = client.post("/login", data={"username": "admin", "password": "oraex2025"})
+    if response.status_code != 302:
+        raise RuntimeError("Login do admin falhou no benchmark")
+
+    endpoints, exports = {}, {}
+    for url in _api_targets(app):
+        client.get(url)  # warm-up (first hit pays for lazy imports and SQLite page cache)
+        samples, db_samples = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(url)
+            body = response.get_data()
+            samples.append((time.perf_counter() - start) * 1000)
+            db_ms = _server_timing_db(response)
+            if db_ms is not None:
+                db_samples.append(db_ms)
+
+        entry = {
+            "status": response.status_code,
+            "bytes": len(body),
+            "ms": _summary(samples),
+            "db_ms_median": round(statistics.median(db_samples), 2) if db_samples else None,
+        }
+        (exports if "/export" in url else endpoints)[url] = entry
+        print(f"  ⏱️  {url:<48} {entry['ms']['median']:9.2f} ms  {entry['status']}  {entry['bytes']:>10,} B")
+    return endpoints, exports
+
+
+def run_benchmark(args):
+    hosts, detections = SCALES[args.scale]
+    hosts = args.hosts or hosts
+    detections = args.detections or detections
+    workdir = os.path.abspath(args.workdir or os.path.join("bench", "work", f"{hosts}h-{detections}d"))
+
+    print(f"🧪 Benchmark: {hosts:,} hosts, {detections:,} detecções (workdir {workdir})")
+    paths = workbook_paths(workdir)
+    _configure_env(workdir, paths)
+
+    generated = {}
+    if not (args.reuse and all(os.path.exists(p) for p in paths.values())):
+        print("📝 Gerando planilhas...")
+        generated = generate_all(workdir, hosts, detections, args.seed)["seconds"]
+
+    # Always start from an empty database: the Qualys importer appends detections
+    if os.path.exists(os.environ["DATABASE_PATH"]):
+        os.remove(os.environ["DATABASE_PATH"])
+
+    print("📥 Importadores...")
+    imports = run_imports(paths, args.verbose)
+    counts = _table_counts()
+    print("🌐 Endpoints...")
+    endpoints, exports = run_endpoints(args.repeat)
+
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "hosts": hosts,
+            "detections": detections,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "generate_seconds": generated,
+        "rows": counts,
+        "imports": imports,
+        "endpoints": endpoints,
+        "exports": exports,
+    }
+
+
+def compare(old_path, new_path):
+    """Print median deltas between two result files."""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+
+    def line(name, a, b, unit):
+        if a is None or b is None:
+            print(f"  {name:<52} {'-':>10} {'-':>10}")
+            return
+        delta = (b - a) / a * 100 if a else 0
+        mark = "🔴" if delta > 10 else "🟢" if delta < -10 else "  "
+        print(f"  {name:<52} {a:9.2f}{unit} {b:9.2f}{unit} {delta:+7.1f}% {mark}")
+
+    print(f"📊 {old['meta'].get('revision')} → {new['meta'].get('revision')}")
+    for name in sorted(set(old["imports"]) | set(new["imports"])):
+        line(f"import {name}", old["imports"].get(name, {}).get("seconds"),
+             new["imports"].get(name, {}).get("seconds"), "s")
+    for section in ("endpoints", "exports"):
+        for url in sorted(set(old[section]) | set(new[section])):
+            line(url, old[section].get(url, {}).get("ms", {}).get("median"),
+                 new[section].get(url, {}).get("ms", {}).get("median"), "ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de importação e API do ORAEX PSU Manager")
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument("--hosts", type=int, help="sobrescreve o número de hosts da escala")
+    parser.add_argument("--detections", type=int, help="sobrescreve o número de detecções Qualys")
+    parser.add_argument("--repeat", type=int, default=5, help="requisições por endpoint")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", help="diretório de trabalho (planilhas e banco)")
+    parser.add_argument("--reuse", action="store_true", help="reaproveita planilhas já geradas no workdir")
+    parser.add_argument("--out", help="arquivo JSON de saída (padrão: bench/results/<data>-<rev>-<escala>.json)")
+    parser.add_argument("--verbose", action="store_true", help="mostra a saída dos importadores")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compara dois resultados")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = run_benchmark(args)
+    out = args.out
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        out = os.path.join(RESULTS_DIR, f"{stamp}-{results['meta']['revision'] or 'norev'}-{args.scale}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=1, ensure_ascii=False)
+    print(f"💾 Resultados: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+ORAEX PSU Manager — Response Compression
+gzip/brotli for JSON/CSV responses and precompressed variants of static files.
+"""
+import os
+import gzip
+import mimetypes
+import threading
+from flask import request, Response
+from werkzeug.security import safe_join
+from config import COMPRESSION_MIN_SIZE, COMPRESSION_LEVEL
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json", "text/html", "text/css", "text/csv", "text/plain",
+    "text/javascript", "application/javascript", "image/svg+xml",
+}
+
+# Precompressed static files: {(path, encoding): (mtime_ns, size, data)}
+_STATIC_CACHE = {}
+_static_lock = threading.Lock()
+
+
+def _negotiate_encoding():
+    """Pick the best encoding the client accepts (br > gzip), or None."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted.quality("br") > 0:
+        return "br"
+    if accepted.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+
+def _compress(data, encoding, level=COMPRESSION_LEVEL):
+    if encoding == "br":
+        # Brotli quality 0-11; map gzip-like levels (1-9) to a fast dynamic range
+        return brotli.compress(data, quality=min(11, max(1, level - 1)))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_response(response):
+    """after_request hook: compress dynamic responses above the size threshold."""
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = _negotiate_encoding()
+    if not encoding:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+
+    response.set_data(_compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def _precompressed(path, encoding):
+    """Return (stat, data) for a static file, compressing once per mtime."""
+    st = os.stat(path)
+    key = (path, encoding)
+    cached = _STATIC_CACHE.get(key)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return st, cached[2]
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    # Static variants are built once, so use the maximum compression level
+    data = brotli.compress(raw, quality=11) if encoding == "br" else gzip.compress(raw, 9, mtime=0)
+    with _static_lock:
+        _STATIC_CACHE[key] = (st.st_mtime_ns, st.st_size, data)
+    return st, data
+
+
+def send_static_compressed(app, filename, max_age=None):
+    """
+    Serve a static file, using a cached gzip/brotli variant when the client
+    accepts it and the file is compressible. Falls back to Flask's send_static_file.
+    """
+    path = safe_join(app.static_folder, filename)
+    mimetype = mimetypes.guess_type(filename)[0]
+    encoding = _negotiate_encoding()
+
+    if (not path or not encoding or mimetype not in COMPRESSIBLE_MIMETYPES
+            or not os.path.isfile(path) or os.path.getsize(path) < COMPRESSION_MIN_SIZE):
+        response = app.send_static_file(filename)
+        if mimetype in COMPRESSIBLE_MIMETYPES:
+            response.vary.add("Accept-Encoding")
+        if max_age is not None:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+        return response
+
+    st, data = _precompressed(path, encoding)
+    response = Response(data, mimetype=mimetype)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.last_modified = int(st.st_mtime)
+    response.set_etag(f"{st.st_mtime_ns:x}-{st.st_size:x}-{encoding}")
+    if max_age is None:
+        max_age = app.get_send_file_max_age(filename)
+    if max_age is None:
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+
+def init_compression(app):
+    """Register the compression hook and serve /static through the precompressed cache."""
+    app.after_request(compress_response)
+    app.view_functions["static"] = lambda filename: send_static_compressed(app, filename)
@@ -8,6 +8,19 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Database — in Cloud Run, DATABASE_PATH points to mounted GCS volume
 DATABASE_PATH = os.environ.get("DATABASE_PATH", os.path.join(BASE_DIR, "oraex.db"))
 
+# Storage mode (storage.py). "direct": SQLite works on DATABASE_PATH itself.
+# "local": the database is copied to LOCAL_DATABASE_PATH (tmpfs on Cloud Run,
+# counts against the memory limit) at startup, served from there, and
+# snapshots are checkpointed back to DATABASE_PATH after writes and every
+# DB_CHECKPOINT_INTERVAL seconds.
+DB_STORAGE_MODE = os.environ.get("DB_STORAGE_MODE", "direct").lower()
+LOCAL_DATABASE_PATH = os.environ.get("LOCAL_DATABASE_PATH", "/tmp/oraex.db")
+DB_CHECKPOINT_INTERVAL = int(os.environ.get("DB_CHECKPOINT_INTERVAL", 60))
+DB_CHECKPOINT_DELAY = float(os.environ.get("DB_CHECKPOINT_DELAY", 2))  # debounce for write bursts
+DURABLE_DATABASE_PATH = DATABASE_PATH
+if DB_STORAGE_MODE == "local":
+    DATABASE_PATH = LOCAL_DATABASE_PATH
+
 # Excel sources (fallback for local usage; in prod, files come via upload)
 EXCEL_PATH = os.environ.get("EXCEL_PATH",
     os.path.join(BASE_DIR, "ORAEX - Consolidação GetTech 2025 (7).xlsm"))
@@ -27,6 +40,64 @@ DEBUG = os.environ.get("FLASK_DEBUG", "false").lower() in ("1", "true", "yes")
 HOST = "0.0.0.0"
 PORT = int(os.environ.get("PORT", 5000))
 
+# GMUD → Excel sync worker (GMUDs are saved in SQLite first, then written to GMUD_PATH in batches)
+EXCEL_SYNC_INTERVAL = int(os.environ.get("EXCEL_SYNC_INTERVAL", 30))
+EXCEL_SYNC_BATCH_SIZE = int(os.environ.get("EXCEL_SYNC_BATCH_SIZE", 200))
+EXCEL_SYNC_MAX_ATTEMPTS = int(os.environ.get("EXCEL_SYNC_MAX_ATTEMPTS", 5))
+EXCEL_LOCK_TIMEOUT = int(os.environ.get("EXCEL_LOCK_TIMEOUT", 60))
+
+# Workbook backups (content-addressed, thinned by retention policy)
+BACKUP_DIR = os.environ.get("BACKUP_DIR", os.path.join(BASE_DIR, "backups"))
+BACKUP_KEEP_LAST = int(os.environ.get("BACKUP_KEEP_LAST", 10))
+BACKUP_KEEP_HOURLY = int(os.environ.get("BACKUP_KEEP_HOURLY", 24))
+BACKUP_KEEP_DAILY = int(os.environ.get("BACKUP_KEEP_DAILY", 30))
+BACKUP_COMPRESSION = os.environ.get("BACKUP_COMPRESSION", "none")  # none | gzip | zstd
+
+# Response compression (gzip, or brotli if the 'brotli' package is installed)
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_LEVEL = int(os.environ.get("COMPRESSION_LEVEL", 6))
+
+# Authenticated-user cache for Flask-Login's user_loader
+USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 60))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 1000))
+
+# Password hashing: werkzeug method string (benchmark with `python passwords.py`),
+# worker threads and how many extra requests may wait; anything beyond is refused
+# at once (429). Keep WORKERS + QUEUE below gunicorn's --threads (4)
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 1))
+PASSWORD_HASH_QUEUE = int(os.environ.get("PASSWORD_HASH_QUEUE", 1))
+
+# Request metrics: latencies kept per endpoint for the p50/p95/p99 estimates, and
+# who gets the Server-Timing header: "admin" (default), "all" or "off"
+METRICS_RESERVOIR_SIZE = int(os.environ.get("METRICS_RESERVOIR_SIZE", 1024))
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "admin").lower()
+
+# SQL profiler: per-statement stats; statements slower than SLOW_QUERY_MS get
+# their EXPLAIN QUERY PLAN captured and go to the slow-query log
+SQL_PROFILER_ENABLED = os.environ.get("SQL_PROFILER_ENABLED", "true").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 100))
+SLOW_QUERY_LOG_SIZE = int(os.environ.get("SLOW_QUERY_LOG_SIZE", 200))
+
+# Schema migrations (migrations.py): one instance holds a lease while migrating,
+# renewed between batches; the others wait up to MIGRATION_LOCK_WAIT seconds
+MIGRATION_LOCK_LEASE = int(os.environ.get("MIGRATION_LOCK_LEASE", 60))
+MIGRATION_LOCK_WAIT = int(os.environ.get("MIGRATION_LOCK_WAIT", 600))
+MIGRATION_BATCH_SIZE = int(os.environ.get("MIGRATION_BATCH_SIZE", 5000))
+
+# Cross-instance cache coherence: how often (seconds) each instance re-reads the
+# data_generation stamp bumped by imports and GMUD/user writes
+DATA_GENERATION_TTL = float(os.environ.get("DATA_GENERATION_TTL", 1.0))
+
+# Read-only connections used by GET requests: mmap sized to the database file
+# (capped at READ_MMAP_MAX_MB, 0 disables) and the page cache of each connection
+READ_MMAP_MAX_MB = int(os.environ.get("READ_MMAP_MAX_MB", 256))
+READ_CACHE_SIZE_KB = int(os.environ.get("READ_CACHE_SIZE_KB", 16384))
+
+# /api/batch: sub-requests per call, and worker threads when "parallel" is set
+BATCH_MAX_REQUESTS = int(os.environ.get("BATCH_MAX_REQUESTS", 20))
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", 4))
+
 # Max upload size (50MB)
 MAX_CONTENT_LENGTH = int(os.environ.get("MAX_CONTENT_LENGTH", 50 * 1024 * 1024))
 
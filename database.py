@@ -3,21 +3,204 @@ ORAEX PSU Manager — Database Models & Queries (SQLite)
 """
 import sqlite3
 import os
-from config import DATABASE_PATH
-from werkzeug.security import generate_password_hash, check_password_hash
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from urllib.parse import quote
+from config import (
+    DATABASE_PATH, USER_CACHE_TTL, USER_CACHE_SIZE, SQL_PROFILER_ENABLED, DATA_GENERATION_TTL,
+    READ_MMAP_MAX_MB, READ_CACHE_SIZE_KB
+)
+import query_profiler
+from passwords import hash_password, verify_password, needs_rehash
 
 
-def get_connection():
-    """Get a SQLite connection with row_factory."""
-    conn = sqlite3.connect(DATABASE_PATH)
+# ── Instrumented connections ──────────────────────────────
+# Every statement run through get_connection() is timed and added to a
+# per-thread accumulator, read by the request metrics (Server-Timing),
+# and aggregated by the SQL profiler (query_profiler.py).
+
+_db_timing = threading.local()
+
+
+def reset_db_timing():
+    """Start a new DB-time measurement for the current thread (e.g. per request)."""
+    _db_timing.queries = 0
+    _db_timing.seconds = 0.0
+
+
+def get_db_timing():
+    """Return (queries, seconds) spent in SQLite by the current thread since the last reset."""
+    return getattr(_db_timing, "queries", 0), getattr(_db_timing, "seconds", 0.0)
+
+
+def _record_db_time(elapsed, new_query):
+    _db_timing.seconds = getattr(_db_timing, "seconds", 0.0) + elapsed
+    if new_query:
+        _db_timing.queries = getattr(_db_timing, "queries", 0) + 1
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that times statement execution and row fetching (and feeds the SQL profiler)."""
+
+    _sql = None
+
+    def _timed(self, fn, args, sql=None, params=None):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            _record_db_time(elapsed, sql is not None)
+            if SQL_PROFILER_ENABLED:
+                if sql is not None:
+                    self._sql, self._params, self._elapsed = sql, params, 0.0
+                if self._sql is not None:
+                    self._elapsed += elapsed
+                    query_profiler.record(self.connection, self._sql, self._params,
+                                          elapsed, self._elapsed, sql is not None)
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, (sql, parameters), sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, (sql, seq_of_parameters), sql)
+
+    def executescript(self, script):
+        return self._timed(super().executescript, (script,), script)
+
+    def fetchone(self):
+        return self._timed(super().fetchone, ())
+
+    def fetchmany(self, size=None):
+        return self._timed(super().fetchmany, (size or self.arraysize,))
+
+    def fetchall(self):
+        return self._timed(super().fetchall, ())
+
+    def __next__(self):
+        # `for row in cursor` / list(cursor) fetch rows without calling fetch*().
+        # Per-row, so only accumulate the time; skip the profiler call.
+        start = time.perf_counter()
+        try:
+            return super().__next__()
+        finally:
+            elapsed = time.perf_counter() - start
+            _record_db_time(elapsed, False)
+            if self._sql is not None:
+                self._elapsed += elapsed
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors (including conn.execute shortcuts) are TimedCursor."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+class ScopedConnection(TimedConnection):
+    """Connection shared by every get_connection() inside a connection_scope(): close() is deferred."""
+
+    def close(self):
+        pass
+
+    def close_scope(self):
+        super().close()
+
+
+_scope = threading.local()
+
+
+def get_connection(path=None):
+    """
+    Get a SQLite connection with row_factory (DATABASE_PATH unless another file
+    is given). Inside use_read_connections() it is a read-only one.
+    """
+    if path is None:
+        shared = getattr(_scope, "conn", None)
+        if shared is not None:
+            return shared
+        if getattr(_scope, "read_only", False):
+            return get_read_connection()
+    return _connect(path or DATABASE_PATH)
+
+
+def _connect(path, factory=TimedConnection):
+    conn = sqlite3.connect(path, factory=factory)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA foreign_keys=ON")
     return conn
 
 
+def _read_mmap_size():
+    """Database size rounded up to the next 16 MB, capped at READ_MMAP_MAX_MB."""
+    try:
+        size = os.path.getsize(DATABASE_PATH)
+    except OSError:
+        return 0
+    step = 16 * 1024 * 1024
+    return min((size // step + 1) * step, READ_MMAP_MAX_MB * 1024 * 1024)
+
+
+def get_read_connection(factory=TimedConnection):
+    """
+    Read-only connection for the GET paths: opened with mode=ro (falls back to
+    a normal open when SQLite can't open the WAL database read-only, e.g. no
+    -shm file yet), always query_only, with mmap and a larger page cache.
+    """
+    try:
+        conn = sqlite3.connect(f"file:{quote(DATABASE_PATH)}?mode=ro", uri=True, factory=factory)
+        conn.execute("PRAGMA schema_version")  # the file is only opened on first use
+    except sqlite3.OperationalError:
+        conn = sqlite3.connect(DATABASE_PATH, factory=factory)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only=ON")
+    conn.execute(f"PRAGMA mmap_size={_read_mmap_size()}")
+    conn.execute(f"PRAGMA cache_size=-{READ_CACHE_SIZE_KB}")
+    return conn
+
+
+def use_read_connections(enabled):
+    """Route this thread's get_connection() calls to read-only connections (set per GET request)."""
+    _scope.read_only = enabled
+
+
+@contextmanager
+def connection_scope(read_only=False):
+    """
+    Make every get_connection() on this thread return one shared connection
+    until the block ends (e.g. the sub-requests of /api/batch). Functions that
+    commit still do; an open transaction is rolled back when the scope closes.
+    """
+    if getattr(_scope, "conn", None) is not None:
+        yield _scope.conn
+        return
+    conn = get_read_connection(ScopedConnection) if read_only else _connect(DATABASE_PATH, ScopedConnection)
+    _scope.conn = conn
+    try:
+        yield conn
+    finally:
+        _scope.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        conn.close_scope()
+
+
 def init_db():
-    """Create all tables if they don't exist."""
+    """Create all tables if they don't exist, then apply pending schema migrations."""
+    from migrations import run_migrations, target_version
     conn = get_connection()
     cursor = conn.cursor()
 
@@ -261,28 +444,467 @@ def init_db():
     """)
     cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username)")
 
+    # ── GMUD → Excel outbox (GMUDs criadas no app aguardando escrita na planilha) ──
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS gmud_excel_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            gmud_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            sheet_name TEXT,
+            row_idx INTEGER,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            synced_at TIMESTAMP,
+            FOREIGN KEY (gmud_id) REFERENCES gmuds_data(id) ON DELETE CASCADE
+        )
+    """)
+
+    # ── Filter dropdown values (kept up to date by the importers and GMUD edits) ──
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS filter_values (
+            table_name TEXT NOT NULL,
+            column_name TEXT NOT NULL,
+            value NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (table_name, column_name, value)
+        ) WITHOUT ROWID
+    """)
+
     # ── Indexes for common queries ──
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_servers_env ON servers(environment)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_servers_psu ON servers(psu_version)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_gmuds_status ON gmuds(status)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_gmuds_month ON gmuds(year, month)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_gmuds_assigned ON gmuds(assigned_to)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_cmdb_env ON cmdb_databases(environment)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_cmdb_type ON cmdb_databases(db_type)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cmdb_full_client ON cmdb_full(client)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cmdb_full_db ON cmdb_full(db_type)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cmdb_full_status ON cmdb_full(status)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cmdb_full_env ON cmdb_full(environment)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cmdb_full_host ON cmdb_full(hostname)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_qualys_det_qid ON qualys_detections(qid)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_qualys_det_asset ON qualys_detections(asset_name)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_qualys_det_source ON qualys_detections(source)")
+    conn.commit()
 
+    # Versioned changes to existing databases (see migrations.py): dictionary
+    # encoding of servers/gmuds/cmdb_full/qualys_detections, filter_values backfill...
+    run_migrations()
+
+    for table, indexes in DIMENSION_INDEXES.items():
+        for name, columns in indexes:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}_data({columns})")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_gmud_outbox_status ON gmud_excel_outbox(status, id)")
+
+    # Stamp checked by ensure_schema(): schema changes ship as migrations, so a
+    # database at the latest migration needs none of the DDL above
+    cursor.execute(f"PRAGMA user_version = {int(target_version())}")
     conn.commit()
     conn.close()
     print("[OK] Database initialized successfully!")
 
 
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_schema():
+    """
+    Make sure the database schema is current, once per process. Warm starts
+    cost one PRAGMA read; init_db() and the admin bootstrap only run when the
+    user_version stamp is behind the latest migration.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        from migrations import target_version
+        from storage import restore
+        restore()  # DB_STORAGE_MODE=local: working copy must exist before the first connection
+        conn = get_connection()
+        stamp = conn.execute("PRAGMA user_version").fetchone()[0]
+        conn.close()
+        if stamp != target_version():
+            init_db()
+            ensure_admin_exists()
+        _schema_ready = True
+
+
+# ══════════════════════════════════════════════════════════
+#  DATA GENERATION (cross-instance cache coherence)
+# ══════════════════════════════════════════════════════════
+# Imports and GMUD/user writes bump data_generation in the same transaction as
+# the data. Each instance re-reads it at most every DATA_GENERATION_TTL seconds
+# (check_data_generation runs before every request) and empties all registered
+# in-process caches when it moved, whichever instance did the write.
+
+_CACHE_CLEARERS = []
+_generation_lock = threading.Lock()
+_generation_seen = None
+_generation_checked_at = 0.0
+
+
+def register_cache(clear_fn):
+    """Register a no-argument function that empties an in-process cache."""
+    _CACHE_CLEARERS.append(clear_fn)
+    return clear_fn
+
+
+def bump_data_generation(conn):
+    """Bump the data generation inside the caller's transaction (the caller commits)."""
+    global _generation_checked_at
+    _generation_checked_at = 0.0  # this instance re-checks on its next request, no TTL wait
+    conn.execute("UPDATE data_generation SET generation = generation + 1, "
+                 "updated_at = CURRENT_TIMESTAMP WHERE id = 1")
+
+
+def check_data_generation(force=False):
+    """
+    Clear the registered caches if the data generation changed since the last
+    check. Costs one single-row read per DATA_GENERATION_TTL. Returns the generation.
+    """
+    global _generation_seen, _generation_checked_at
+    if not force and time.monotonic() - _generation_checked_at < DATA_GENERATION_TTL:
+        return _generation_seen
+    with _generation_lock:
+        now = time.monotonic()
+        if not force and now - _generation_checked_at < DATA_GENERATION_TTL:
+            return _generation_seen
+        conn = get_connection()
+        row = conn.execute("SELECT generation FROM data_generation WHERE id = 1").fetchone()
+        conn.close()
+        generation = row[0] if row else 0
+        if _generation_seen is not None and generation != _generation_seen:
+            for clear in _CACHE_CLEARERS:
+                clear()
+        _generation_seen = generation
+        _generation_checked_at = now
+    return generation
+
+
+# ══════════════════════════════════════════════════════════
+#  DICTIONARY-ENCODED DIMENSIONS
+# ══════════════════════════════════════════════════════════
+# Low-cardinality text columns are stored as integer ids into dim_<name>
+# tables. Rows live in <table>_data; a view with the original table name
+# decodes the ids back, so every read keeps using the old column names.
+# Writers (importers, GMUD CRUD) insert into <table>_data via DimensionEncoder.
+
+DIMENSION_COLUMNS = {
+    "servers": ("environment", "psu_version", "responsible_team"),
+    "gmuds": ("client", "db_type", "environment", "status", "assigned_to"),
+    "cmdb_full": ("client", "db_type", "status", "environment", "os", "responsible_team"),
+    "qualys_detections": ("environment", "os", "status"),
+}
+DIMENSIONS = sorted({dim for columns in DIMENSION_COLUMNS.values() for dim in columns})
+
+# Indexes on the encoded tables: (name, columns of <table>_data)
+DIMENSION_INDEXES = {
+    "servers": [("idx_servers_env", "environment_id"), ("idx_servers_psu", "psu_version_id"),
+                ("idx_servers_psu_tier", "psu_tier"), ("idx_servers_psu_sort", "psu_major, psu_ru, psu_revision")],
+    "gmuds": [("idx_gmuds_status", "status_id"), ("idx_gmuds_month", "year, month"),
+              ("idx_gmuds_assigned", "assigned_to_id"),
+              ("idx_gmuds_client_start", "client_id, start_at"), ("idx_gmuds_start", "start_at")],
+    "cmdb_full": [("idx_cmdb_full_client", "client_id"), ("idx_cmdb_full_db", "db_type_id"),
+                  ("idx_cmdb_full_status", "status_id"), ("idx_cmdb_full_env", "environment_id"),
+                  ("idx_cmdb_full_host", "hostname"), ("idx_cmdb_full_psu_tier", "psu_tier"),
+                  ("idx_cmdb_full_psu_sort", "psu_major, psu_ru, psu_revision")],
+    "qualys_detections": [("idx_qualys_det_qid", "qid"), ("idx_qualys_det_asset", "asset_name"),
+                          ("idx_qualys_det_source", "source"),
+                          ("idx_qualys_det_sla", "sla_state, squad, age_days, asset_name"),
+                          ("idx_qualys_det_host", "lower(asset_name), squad, sla_state, age_days, asset_name")],
+}
+
+
+class DimensionEncoder:
+    """Maps dimension values to their ids, adding new values on the fly (one instance per import)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._cache = {}
+
+    def __call__(self, dim, value):
+        if value is None:
+            return None
+        cache = self._cache.get(dim)
+        if cache is None:
+            cache = self._cache[dim] = {r[1]: r[0] for r in self.conn.execute(f"SELECT id, value FROM dim_{dim}")}
+        value = str(value)
+        dim_id = cache.get(value)
+        if dim_id is None:
+            self.conn.execute(f"INSERT OR IGNORE INTO dim_{dim} (value) VALUES (?)", (value,))
+            dim_id = self.conn.execute(f"SELECT id FROM dim_{dim} WHERE value = ?", (value,)).fetchone()[0]
+            cache[value] = dim_id
+        return dim_id
+
+
+def _object_type(conn, name):
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def _encoded_table_ddl(conn, table):
+    """CREATE TABLE for <table>_data, derived from the plain table's columns and foreign keys."""
+    dims = DIMENSION_COLUMNS[table]
+    original_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (table,)).fetchone()[0]
+    columns = []
+    for col in conn.execute(f"PRAGMA table_info({table})"):
+        name, col_type, notnull, default, pk = col[1], col[2], col[3], col[4], col[5]
+        if name in dims:
+            columns.append(f"{name}_id INTEGER REFERENCES dim_{name}(id)")
+        elif pk:
+            autoincrement = " AUTOINCREMENT" if "AUTOINCREMENT" in original_sql.upper() else ""
+            columns.append(f"{name} INTEGER PRIMARY KEY{autoincrement}")
+        else:
+            columns.append(f"{name} {col_type}" + (" NOT NULL" if notnull else "")
+                           + (f" DEFAULT {default}" if default is not None else ""))
+    for fk in conn.execute(f"PRAGMA foreign_key_list({table})"):
+        columns.append(f"FOREIGN KEY ({fk[3]}) REFERENCES {fk[2]}({fk[4]})")
+    return f"CREATE TABLE {table}_data (\n    " + ",\n    ".join(columns) + "\n)"
+
+
+def create_dimension_view(conn, table):
+    """(Re)create the decoding view <table> over <table>_data, in the data table's column order."""
+    dims = DIMENSION_COLUMNS[table]
+    select, joins = [], []
+    for col in conn.execute(f"PRAGMA table_info({table}_data)"):
+        name = col[1]
+        dim = name[:-3] if name.endswith("_id") else None
+        if dim in dims:
+            select.append(f"{dim}_dim.value AS {dim}")
+            joins.append(f"LEFT JOIN dim_{dim} {dim}_dim ON {dim}_dim.id = d.{name}")
+        else:
+            select.append(f"d.{name}")
+    conn.execute(f"DROP VIEW IF EXISTS {table}")
+    conn.execute(f"CREATE VIEW {table} AS SELECT " + ", ".join(select)
+                 + f" FROM {table}_data d " + " ".join(joins))
+
+
+def migrate_dictionary_encoding(conn, batch_size=5000, on_batch=None):
+    """
+    Move plain tables to the encoded layout (idempotent; a no-op once migrated).
+    Rows are copied in rowid batches, committing and calling on_batch() (the
+    migration lease heartbeat) after each; the plain table is swapped for the
+    decoding view in one final transaction. Returns the list of tables converted.
+    """
+    for dim in DIMENSIONS:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS dim_{dim} (id INTEGER PRIMARY KEY, value TEXT NOT NULL UNIQUE)")
+    conn.commit()
+
+    migrated = []
+    # Dropping the plain gmuds table must not cascade into gmud_excel_outbox
+    conn.execute("PRAGMA foreign_keys=OFF")
+    try:
+        for table, dims in DIMENSION_COLUMNS.items():
+            if _object_type(conn, table) != "table":
+                continue
+            # A <table>_data next to the plain table is a copy left by an interrupted run
+            conn.execute(f"DROP TABLE IF EXISTS {table}_data")
+            conn.execute(_encoded_table_ddl(conn, table))
+            plain = [c[1] for c in conn.execute(f"PRAGMA table_info({table})")]
+            targets, sources = [], []
+            for name in plain:
+                if name in dims:
+                    conn.execute(f"INSERT OR IGNORE INTO dim_{name} (value) "
+                                 f"SELECT DISTINCT {name} FROM {table} WHERE {name} IS NOT NULL")
+                    targets.append(f"{name}_id")
+                    sources.append(f"(SELECT id FROM dim_{name} WHERE value = t.{name})")
+                else:
+                    targets.append(name)
+                    sources.append(f"t.{name}")
+            conn.commit()
+
+            max_rowid = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+            for start in range(0, max_rowid, batch_size):
+                conn.execute(f"INSERT INTO {table}_data ({', '.join(targets)}) "
+                             f"SELECT {', '.join(sources)} FROM {table} t "
+                             f"WHERE t.rowid > ? AND t.rowid <= ?", (start, start + batch_size))
+                conn.commit()
+                if on_batch:
+                    on_batch()
+
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(f"DROP TABLE {table}")
+            create_dimension_view(conn, table)
+            conn.commit()
+            migrated.append(table)
+
+        # Outbox created before the migration still points at the plain gmuds table
+        if any(fk[2] == "gmuds" for fk in conn.execute("PRAGMA foreign_key_list(gmud_excel_outbox)")):
+            ddl = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'gmud_excel_outbox'").fetchone()[0]
+            conn.execute(ddl.replace("gmud_excel_outbox", "gmud_excel_outbox_new", 1)
+                            .replace("REFERENCES gmuds(id)", "REFERENCES gmuds_data(id)"))
+            conn.execute("INSERT INTO gmud_excel_outbox_new SELECT * FROM gmud_excel_outbox")
+            conn.execute("DROP TABLE gmud_excel_outbox")
+            conn.execute("ALTER TABLE gmud_excel_outbox_new RENAME TO gmud_excel_outbox")
+        conn.commit()
+    finally:
+        conn.execute("PRAGMA foreign_keys=ON")
+
+    if migrated:
+        print(f"[OK] Dictionary encoding applied to: {', '.join(migrated)}")
+    return migrated
+
+
+# ══════════════════════════════════════════════════════════
+#  FILTER VALUES (dropdown options with row counts)
+# ══════════════════════════════════════════════════════════
+
+# Columns offered as filter dropdowns, per table
+FILTER_COLUMNS = {
+    "servers": ("environment", "psu_version"),
+    "gmuds": ("status", "assigned_to", "year"),
+    "cmdb_databases": ("environment", "db_type"),
+    "cmdb_full": ("client", "db_type", "status", "environment"),
+}
+
+# get_filter_options() keys -> (table, column)
+FILTER_OPTION_KEYS = {
+    "server_environments": ("servers", "environment"),
+    "psu_versions": ("servers", "psu_version"),
+    "gmud_statuses": ("gmuds", "status"),
+    "gmud_assignees": ("gmuds", "assigned_to"),
+    "gmud_years": ("gmuds", "year"),
+    "cmdb_environments": ("cmdb_databases", "environment"),
+    "cmdb_db_types": ("cmdb_databases", "db_type"),
+}
+
+# get_cmdb_full_filters() keys -> (table, column)
+CMDB_FULL_FILTER_KEYS = {
+    "clients": ("cmdb_full", "client"),
+    "db_types": ("cmdb_full", "db_type"),
+    "statuses": ("cmdb_full", "status"),
+    "environments": ("cmdb_full", "environment"),
+}
+
+
+def refresh_filter_values(conn, table):
+    """Rebuild the filter values of one table from its rows (called by the importers, no commit)."""
+    conn.execute("DELETE FROM filter_values WHERE table_name = ?", (table,))
+    for column in FILTER_COLUMNS[table]:
+        conn.execute(f"""
+            INSERT INTO filter_values (table_name, column_name, value, row_count)
+            SELECT ?, ?, {column}, COUNT(*) FROM {table}
+            WHERE {column} IS NOT NULL AND {column} != ''
+            GROUP BY {column}
+        """, (table, column))
+
+
+def _adjust_filter_values(conn, table, old_row=None, new_row=None):
+    """Incrementally move filter counts from old_row's values to new_row's (insert/update/delete)."""
+    for column in FILTER_COLUMNS[table]:
+        old = old_row[column] if old_row else None
+        new = new_row.get(column) if new_row else None
+        if old == new:
+            continue
+        if old not in (None, ""):
+            conn.execute("""
+                UPDATE filter_values SET row_count = row_count - 1
+                WHERE table_name = ? AND column_name = ? AND value = ?
+            """, (table, column, old))
+            conn.execute("""
+                DELETE FROM filter_values
+                WHERE table_name = ? AND column_name = ? AND value = ? AND row_count <= 0
+            """, (table, column, old))
+        if new not in (None, ""):
+            conn.execute("""
+                INSERT INTO filter_values (table_name, column_name, value, row_count) VALUES (?, ?, ?, 1)
+                ON CONFLICT (table_name, column_name, value) DO UPDATE SET row_count = row_count + 1
+            """, (table, column, new))
+
+
+def _read_filter_values(keys):
+    """Load the dropdown lists for keys ({key: (table, column)}) in one query, plus per-value counts."""
+    tables = sorted({table for table, _ in keys.values()})
+    conn = get_connection()
+    rows = conn.execute(f"""
+        SELECT table_name, column_name, value, row_count FROM filter_values
+        WHERE table_name IN ({",".join("?" * len(tables))})
+        ORDER BY table_name, column_name, value
+    """, tables).fetchall()
+    conn.close()
+
+    by_column = {}
+    for r in rows:
+        by_column.setdefault((r["table_name"], r["column_name"]), []).append((r["value"], r["row_count"]))
+
+    options = {"counts": {}}
+    for key, target in keys.items():
+        values = by_column.get(target, [])
+        options[key] = [v for v, _ in values]
+        options["counts"][key] = {str(v): n for v, n in values}
+    return options
+
+
+# ══════════════════════════════════════════════════════════
+#  GMUD CUBE (pre-aggregated counts for reports)
+# ══════════════════════════════════════════════════════════
+
+# gmud_cube holds one count per (year, month, client, db_type, environment,
+# status, assigned_to) combination, keyed by the dimension ids (0 = empty).
+GMUD_CUBE_DIMS = ("client", "db_type", "environment", "status", "assigned_to")
+GMUD_CUBE_KEY = ("year", "month") + tuple(f"{dim}_id" for dim in GMUD_CUBE_DIMS)
+_CUBE_SELECT = ", ".join(f"IFNULL({col}, 0)" for col in GMUD_CUBE_KEY)
+
+
+def rebuild_gmud_cube(conn):
+    """Recompute the whole cube from gmuds_data (called by import_gmuds, no commit)."""
+    conn.execute("DELETE FROM gmud_cube")
+    conn.execute(f"""
+        INSERT INTO gmud_cube ({", ".join(GMUD_CUBE_KEY)}, gmud_count)
+        SELECT {_CUBE_SELECT}, COUNT(*) FROM gmuds_data
+        GROUP BY {_CUBE_SELECT}
+    """)
+
+
+def _adjust_gmud_cube(conn, gmud_id, delta):
+    """Add delta (+1 / -1) to the cube cell of one GMUD's current row."""
+    conn.execute(f"""
+        INSERT INTO gmud_cube ({", ".join(GMUD_CUBE_KEY)}, gmud_count)
+        SELECT {_CUBE_SELECT}, ? FROM gmuds_data WHERE id = ?
+        ON CONFLICT ({", ".join(GMUD_CUBE_KEY)}) DO UPDATE SET gmud_count = gmud_count + excluded.gmud_count
+    """, (delta, gmud_id))
+    if delta < 0:
+        conn.execute("DELETE FROM gmud_cube WHERE gmud_count <= 0")
+
+
+def query_gmud_cube(conn, group_by, filters=None, order_by_count=False):
+    """
+    SUM(gmud_count) grouped by group_by (year/month and/or GMUD_CUBE_DIMS names),
+    restricted by filters {name: value}. Dimension filters are resolved to ids,
+    so the query only touches gmud_cube and the dimension tables.
+    """
+    valid = ("year", "month") + GMUD_CUBE_DIMS
+    unknown = [name for name in list(group_by) + list(filters or {}) if name not in valid]
+    if unknown:
+        raise ValueError(f"Dimensão inválida: {', '.join(unknown)}")
+
+    select, joins, where, params = [], [], [], []
+    for name in group_by:
+        if name in GMUD_CUBE_DIMS:
+            joins.append(f"LEFT JOIN dim_{name} d_{name} ON d_{name}.id = c.{name}_id")
+            select.append(f"d_{name}.value AS {name}")
+        else:
+            select.append(f"NULLIF(c.{name}, 0) AS {name}")
+    for name, value in (filters or {}).items():
+        if name in GMUD_CUBE_DIMS:
+            where.append(f"c.{name}_id = IFNULL((SELECT id FROM dim_{name} WHERE value = ?), -1)")
+        else:
+            where.append(f"c.{name} = ?")
+        params.append(value)
+
+    group = ", ".join(group_by)
+    order = "cnt DESC" if order_by_count else (group or "cnt DESC")
+    query = f"""
+        SELECT {", ".join(select + ["SUM(c.gmud_count) AS cnt"])}
+        FROM gmud_cube c {" ".join(joins)}
+        {"WHERE " + " AND ".join(where) if where else ""}
+        {"GROUP BY " + group if group else ""}
+        ORDER BY {order}
+    """
+    return [dict(r) for r in conn.execute(query, params)]
+
+
+def get_gmud_cube(group_by, filters=None):
+    """Slice/dice the GMUD cube (/api/reports/gmud-cube). Raises ValueError for unknown dimensions."""
+    conn = get_connection()
+    try:
+        return query_gmud_cube(conn, group_by, filters)
+    finally:
+        conn.close()
+
+
 # ══════════════════════════════════════════════════════════
 #  QUERY FUNCTIONS
 # ══════════════════════════════════════════════════════════
@@ -295,7 +917,6 @@ def get_dashboard_stats(client=None):
     stats = {}
     
     # Prepara restrições de cliente com base no sistema que o usuário preencheu ou solicitou
-    gmuds_client_filter = " AND client = ?" if client and client != 'none' else ""
     cmdb_client_filter = " WHERE client = ?" if client and client != 'none' else ""
     client_param = [client] if client and client != 'none' else []
 
@@ -329,15 +950,34 @@ def get_dashboard_stats(client=None):
     stats["servers_by_env"] = [dict(r) for r in c.fetchall()]
 
     # By PSU version (using SUM for real server count)
+    # ordered by the parsed (major, RU, revision), not by text
     c.execute("""
-        SELECT psu_version, SUM(total_servers) as cnt
+        SELECT psu_version, psu_tier, SUM(total_servers) as cnt
         FROM servers
         WHERE psu_version IS NOT NULL AND psu_version != ''
         GROUP BY psu_version
-        ORDER BY psu_version
+        ORDER BY MAX(psu_major), MAX(psu_ru), MAX(psu_revision), psu_version
     """)
     stats["servers_by_psu"] = [dict(r) for r in c.fetchall()]
 
+    # PSU compliance tiers (psu.py / psu_targets)
+    c.execute("""
+        SELECT psu_tier, SUM(total_servers) as cnt
+        FROM servers
+        WHERE psu_tier IS NOT NULL
+        GROUP BY psu_tier
+    """)
+    stats["psu_compliance"] = {r["psu_tier"]: r["cnt"] for r in c.fetchall()}
+    c.execute(f"""
+        SELECT psu_tier, COUNT(*) as cnt
+        FROM cmdb_full
+        WHERE psu_tier IS NOT NULL {cmdb_client_filter.replace('WHERE', 'AND')}
+        GROUP BY psu_tier
+    """, client_param)
+    stats["cmdb_psu_compliance"] = {r["psu_tier"]: r["cnt"] for r in c.fetchall()}
+    c.execute("SELECT major, target_ru, min_ru, label FROM psu_targets ORDER BY major DESC")
+    stats["psu_targets"] = [dict(r) for r in c.fetchall()]
+
     # Total CMDB databases
     c.execute("SELECT COUNT(*) FROM cmdb_databases")
     stats["total_cmdb"] = c.fetchone()[0]
@@ -358,37 +998,19 @@ def get_dashboard_stats(client=None):
     stats["cmdb_by_type"] = [dict(r) for r in c.fetchall()]
 
     # GMUDs stats
-    c.execute(f"SELECT COUNT(*) FROM gmuds WHERE 1=1 {gmuds_client_filter}", client_param)
-    stats["total_gmuds"] = c.fetchone()[0]
+    # GMUD counts come from the pre-aggregated cube, not from gmuds
+    cube_filter = {"client": client} if client and client != 'none' else {}
+    stats["total_gmuds"] = query_gmud_cube(conn, [], cube_filter)[0]["cnt"] or 0
 
-    c.execute(f"""
-        SELECT status, COUNT(*) as cnt
-        FROM gmuds
-        WHERE status IS NOT NULL AND status != '' {gmuds_client_filter}
-        GROUP BY status
-        ORDER BY cnt DESC
-    """, client_param)
-    stats["gmuds_by_status"] = [dict(r) for r in c.fetchall()]
+    stats["gmuds_by_status"] = [r for r in query_gmud_cube(conn, ["status"], cube_filter, order_by_count=True)
+                                if r["status"]]
 
     # GMUDs by month
-    c.execute(f"""
-        SELECT year, month, COUNT(*) as cnt
-        FROM gmuds
-        WHERE 1=1 {gmuds_client_filter}
-        GROUP BY year, month
-        ORDER BY year, month
-    """, client_param)
-    stats["gmuds_by_month"] = [dict(r) for r in c.fetchall()]
+    stats["gmuds_by_month"] = query_gmud_cube(conn, ["year", "month"], cube_filter)
 
     # GMUDs by assigned person
-    c.execute(f"""
-        SELECT assigned_to, COUNT(*) as cnt
-        FROM gmuds
-        WHERE assigned_to IS NOT NULL AND assigned_to != '' {gmuds_client_filter}
-        GROUP BY assigned_to
-        ORDER BY cnt DESC
-    """, client_param)
-    stats["gmuds_by_person"] = [dict(r) for r in c.fetchall()]
+    stats["gmuds_by_person"] = [r for r in query_gmud_cube(conn, ["assigned_to"], cube_filter, order_by_count=True)
+                                if r["assigned_to"]]
 
     # CMDB by environment (using cmdb_full)
     c.execute(f"""
@@ -457,8 +1079,12 @@ def get_servers(environment=None, psu_version=None, search=None, page=1, per_pag
     return {"servers": servers, "total": total, "page": page, "per_page": per_page, "pages": (total + per_page - 1) // per_page}
 
 
-def get_gmuds(client=None, year=None, month=None, status=None, assigned_to=None, search=None, page=1, per_page=50):
-    """Get GMUDs with optional filters and pagination."""
+def get_gmuds(client=None, year=None, month=None, status=None, assigned_to=None, search=None,
+              date_from=None, date_to=None, page=1, per_page=50):
+    """
+    Get GMUDs with optional filters and pagination. date_from/date_to bound
+    start_at ('YYYY-MM-DD' or a full timestamp; a bare date_to includes that day).
+    """
     conn = get_connection()
     c = conn.cursor()
 
@@ -491,11 +1117,25 @@ def get_gmuds(client=None, year=None, month=None, status=None, assigned_to=None,
         count_query += " AND (change_number LIKE ? OR title LIKE ? OR assigned_to LIKE ?)"
         search_param = f"%{search}%"
         params.extend([search_param] * 3)
+    if date_from:
+        query += " AND start_at >= ?"
+        count_query += " AND start_at >= ?"
+        params.append(parse_gmud_datetime(date_from).strftime("%Y-%m-%d %H:%M:%S"))
+    if date_to:
+        end = parse_gmud_datetime(date_to)
+        if len(str(date_to).strip()) <= 10:
+            end += timedelta(days=1)
+            query += " AND start_at < ?"
+            count_query += " AND start_at < ?"
+        else:
+            query += " AND start_at <= ?"
+            count_query += " AND start_at <= ?"
+        params.append(end.strftime("%Y-%m-%d %H:%M:%S"))
 
     c.execute(count_query, params)
     total = c.fetchone()[0]
 
-    query += " ORDER BY start_date DESC"
+    query += " ORDER BY start_at DESC"
     query += f" LIMIT {per_page} OFFSET {(page - 1) * per_page}"
 
     c.execute(query, params)
@@ -546,35 +1186,8 @@ def get_cmdb_databases(environment=None, db_type=None, status=None, search=None,
 
 
 def get_filter_options():
-    """Get unique values for filter dropdowns."""
-    conn = get_connection()
-    c = conn.cursor()
-
-    options = {}
-
-    c.execute("SELECT DISTINCT environment FROM servers WHERE environment IS NOT NULL AND environment != '' ORDER BY environment")
-    options["server_environments"] = [r[0] for r in c.fetchall()]
-
-    c.execute("SELECT DISTINCT psu_version FROM servers WHERE psu_version IS NOT NULL AND psu_version != '' ORDER BY psu_version")
-    options["psu_versions"] = [r[0] for r in c.fetchall()]
-
-    c.execute("SELECT DISTINCT status FROM gmuds WHERE status IS NOT NULL AND status != '' ORDER BY status")
-    options["gmud_statuses"] = [r[0] for r in c.fetchall()]
-
-    c.execute("SELECT DISTINCT assigned_to FROM gmuds WHERE assigned_to IS NOT NULL AND assigned_to != '' ORDER BY assigned_to")
-    options["gmud_assignees"] = [r[0] for r in c.fetchall()]
-
-    c.execute("SELECT DISTINCT year FROM gmuds ORDER BY year")
-    options["gmud_years"] = [r[0] for r in c.fetchall()]
-
-    c.execute("SELECT DISTINCT environment FROM cmdb_databases WHERE environment IS NOT NULL AND environment != '' ORDER BY environment")
-    options["cmdb_environments"] = [r[0] for r in c.fetchall()]
-
-    c.execute("SELECT DISTINCT db_type FROM cmdb_databases WHERE db_type IS NOT NULL AND db_type != '' ORDER BY db_type")
-    options["cmdb_db_types"] = [r[0] for r in c.fetchall()]
-
-    conn.close()
-    return options
+    """Get unique values for filter dropdowns (with row counts under "counts")."""
+    return _read_filter_values(FILTER_OPTION_KEYS)
 
 
 def get_planning_data():
@@ -777,35 +1390,49 @@ def get_cmdb_full_stats(client=None):
 
 
 def get_cmdb_full_filters():
-    """Get unique filter values for CMDB Full page."""
-    conn = get_connection()
-    c = conn.cursor()
-    options = {}
-
-    c.execute("SELECT DISTINCT client FROM cmdb_full WHERE client IS NOT NULL ORDER BY client")
-    options["clients"] = [r[0] for r in c.fetchall()]
+    """Get unique filter values for CMDB Full page (with row counts under "counts")."""
+    return _read_filter_values(CMDB_FULL_FILTER_KEYS)
 
-    c.execute("SELECT DISTINCT db_type FROM cmdb_full WHERE db_type IS NOT NULL AND db_type != '' ORDER BY db_type")
-    options["db_types"] = [r[0] for r in c.fetchall()]
 
-    c.execute("SELECT DISTINCT status FROM cmdb_full WHERE status IS NOT NULL AND status != '' ORDER BY status")
-    options["statuses"] = [r[0] for r in c.fetchall()]
+# ── Authenticated-user cache: Flask-Login calls get_user_by_id on every request ──
+_USER_CACHE = OrderedDict()  # user_id -> (expires_at, user_dict), LRU order
+_user_cache_lock = threading.Lock()
 
-    c.execute("SELECT DISTINCT environment FROM cmdb_full WHERE environment IS NOT NULL AND environment != '' ORDER BY environment")
-    options["environments"] = [r[0] for r in c.fetchall()]
 
-    conn.close()
-    return options
+@register_cache
+def invalidate_user_cache(user_id=None):
+    """Drop one user (or all users) from the user cache."""
+    with _user_cache_lock:
+        if user_id is None:
+            _USER_CACHE.clear()
+        else:
+            _USER_CACHE.pop(user_id, None)
 
 
 def get_user_by_id(user_id):
-    """Get user by ID for Flask-Login."""
+    """Get user by ID for Flask-Login (served from a TTL/LRU cache when possible)."""
+    now = time.monotonic()
+    with _user_cache_lock:
+        hit = _USER_CACHE.get(user_id)
+        if hit and hit[0] > now:
+            _USER_CACHE.move_to_end(user_id)
+            return dict(hit[1])
+
     conn = get_connection()
     c = conn.cursor()
     c.execute("SELECT * FROM users WHERE id = ?", (user_id,))
     row = c.fetchone()
     conn.close()
-    return dict(row) if row else None
+    if not row:
+        return None
+
+    user = dict(row)
+    with _user_cache_lock:
+        _USER_CACHE[user_id] = (now + USER_CACHE_TTL, user)
+        _USER_CACHE.move_to_end(user_id)
+        while len(_USER_CACHE) > USER_CACHE_SIZE:
+            _USER_CACHE.popitem(last=False)
+    return dict(user)
 
 
 def get_user_by_username(username):
@@ -822,21 +1449,29 @@ def create_user(username, password, display_name=None, role='viewer', client_res
     """Create a new user with hashed password."""
     conn = get_connection()
     c = conn.cursor()
-    pw_hash = generate_password_hash(password)
+    pw_hash = hash_password(password)
     c.execute("""
         INSERT INTO users (username, password_hash, display_name, role, client_restriction)
         VALUES (?, ?, ?, ?, ?)
     """, (username, pw_hash, display_name or username, role, client_restriction))
+    bump_data_generation(conn)
     conn.commit()
     user_id = c.lastrowid
     conn.close()
+    invalidate_user_cache(user_id)
     return user_id
 
 
 def verify_user(username, password):
-    """Verify username and password. Returns user dict or None."""
+    """
+    Verify username and password. Returns user dict or None.
+    Hashes made with an outdated method/cost are upgraded transparently on success.
+    Raises passwords.PasswordBusyError when the password executor is saturated.
+    """
     user = get_user_by_username(username)
-    if user and check_password_hash(user['password_hash'], password):
+    if user and verify_password(user['password_hash'], password):
+        if needs_rehash(user['password_hash']):
+            _set_password_hash(user['id'], hash_password(password))
         return user
     return None
 
@@ -856,18 +1491,25 @@ def update_user_status(user_id, is_active):
     conn = get_connection()
     c = conn.cursor()
     c.execute("UPDATE users SET is_active = ? WHERE id = ?", (1 if is_active else 0, user_id))
+    bump_data_generation(conn)
     conn.commit()
     conn.close()
+    invalidate_user_cache(user_id)
 
 
 def reset_user_password(user_id, new_password):
     """Reset a user's password."""
+    _set_password_hash(user_id, hash_password(new_password))
+
+
+def _set_password_hash(user_id, pw_hash):
     conn = get_connection()
     c = conn.cursor()
-    pw_hash = generate_password_hash(new_password)
     c.execute("UPDATE users SET password_hash = ? WHERE id = ?", (pw_hash, user_id))
+    bump_data_generation(conn)
     conn.commit()
     conn.close()
+    invalidate_user_cache(user_id)
 
 
 def ensure_admin_exists():
@@ -896,21 +1538,38 @@ def update_gmud(gmud_id, data):
     """Update an existing GMUD."""
     conn = get_connection()
     c = conn.cursor()
+    old_row = c.execute("SELECT * FROM gmuds WHERE id = ?", (gmud_id,)).fetchone()
+    encode = DimensionEncoder(conn)
+    start_at, end_at, date_error = normalize_gmud_dates(data.get('start_date'), data.get('end_date'))
+    # year/month/day_of_week key the cube and the year filter: follow a start date that parses
+    start = parse_gmud_datetime(start_at) if start_at else None
+    _adjust_gmud_cube(conn, gmud_id, -1)
     c.execute("""
-        UPDATE gmuds SET
-            client=?, db_type=?, environment=?, status=?,
-            start_date=?, end_date=?, change_number=?, title=?,
-            assigned_to=?, observation=?, vulnerability=?, opened_by=?
+        UPDATE gmuds_data SET
+            client_id=?, db_type_id=?, environment_id=?, status_id=?,
+            start_date=?, end_date=?, start_at=?, end_at=?, date_parse_error=?,
+            year=COALESCE(?, year), month=COALESCE(?, month), day_of_week=COALESCE(?, day_of_week),
+            change_number=?, title=?,
+            assigned_to_id=?, observation=?, vulnerability=?, opened_by=?
         WHERE id = ?
     """, (
-        data.get('client'), data.get('db_type'), data.get('environment'),
-        data.get('status'), data.get('start_date'), data.get('end_date'),
-        data.get('change_number'), data.get('title'), data.get('assigned_to'),
+        encode("client", data.get('client')), encode("db_type", data.get('db_type')),
+        encode("environment", data.get('environment')), encode("status", data.get('status')),
+        data.get('start_date'), data.get('end_date'), start_at, end_at, date_error,
+        start.year if start else None, start.month if start else None,
+        WEEKDAYS_PT[start.weekday()] if start else None,
+        data.get('change_number'), data.get('title'), encode("assigned_to", data.get('assigned_to')),
         data.get('observation'), data.get('vulnerability'), data.get('opened_by'),
         gmud_id
     ))
-    conn.commit()
     affected = c.rowcount
+    if affected:
+        new_row = dict(old_row, status=data.get('status'), assigned_to=data.get('assigned_to'),
+                       year=start.year if start else old_row['year'])
+        _adjust_filter_values(conn, "gmuds", old_row, new_row)
+        _adjust_gmud_cube(conn, gmud_id, +1)
+        bump_data_generation(conn)
+    conn.commit()
     conn.close()
     return affected > 0
 
@@ -919,13 +1578,181 @@ def delete_gmud(gmud_id):
     """Delete a GMUD by ID."""
     conn = get_connection()
     c = conn.cursor()
-    c.execute("DELETE FROM gmuds WHERE id = ?", (gmud_id,))
-    conn.commit()
+    old_row = c.execute("SELECT * FROM gmuds WHERE id = ?", (gmud_id,)).fetchone()
+    _adjust_gmud_cube(conn, gmud_id, -1)
+    c.execute("DELETE FROM gmuds_data WHERE id = ?", (gmud_id,))
     affected = c.rowcount
+    if affected:
+        _adjust_filter_values(conn, "gmuds", old_row=old_row)
+        bump_data_generation(conn)
+    conn.commit()
     conn.close()
     return affected > 0
 
 
+# ══════════════════════════════════════════════════════════
+#  GMUD CREATION (SQLite first, Excel via outbox)
+# ══════════════════════════════════════════════════════════
+
+WEEKDAYS_PT = ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira",
+               "Sexta-feira", "Sábado", "Domingo"]
+
+
+# Form input, the DB format, and what the Consolidação workbook holds as text
+GMUD_DATE_FORMATS = (
+    "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d",
+    "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y",
+)
+
+
+def parse_gmud_datetime(value):
+    """Parse a GMUD date from the form ('YYYY-MM-DDTHH:MM'), the DB format or workbook text."""
+    if isinstance(value, datetime):
+        return value
+    if not value:
+        return None
+    value = str(value).strip()
+    for fmt in GMUD_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida: {value}")
+
+
+def normalize_gmud_dates(start, end):
+    """
+    (start_at, end_at, date_parse_error) for the typed GMUD date columns:
+    ISO 'YYYY-MM-DD HH:MM:SS' strings (None when empty or unparseable) and 1
+    if either non-empty value could not be parsed.
+    """
+    result, error = [], 0
+    for value in (start, end):
+        try:
+            parsed = parse_gmud_datetime(value)
+        except ValueError:
+            parsed, error = None, 1
+        result.append(parsed.strftime("%Y-%m-%d %H:%M:%S") if parsed else None)
+    return result[0], result[1], error
+
+
+def create_gmud(data):
+    """Insert a new GMUD and queue it for the Excel sync worker.
+
+    The GMUD row and its outbox entry are written in the same transaction,
+    so the request never waits for the workbook to be loaded or saved.
+    """
+    start_date = parse_gmud_datetime(data.get('start_date'))
+    end_date = parse_gmud_datetime(data.get('end_date'))
+    if not start_date:
+        raise ValueError("Data de início é obrigatória")
+
+    conn = get_connection()
+    c = conn.cursor()
+    encode = DimensionEncoder(conn)
+    try:
+        c.execute("""
+            INSERT INTO gmuds_data (year, month, client_id, db_type_id, environment_id, status_id,
+                day_of_week, start_date, end_date, start_at, end_at, change_number, title,
+                assigned_to_id, observation, vulnerability, opened_by)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            start_date.year,
+            start_date.month,
+            encode("client", data.get('client') or 'Getnet'),
+            encode("db_type", data.get('db_type') or 'Oracle'),
+            encode("environment", data.get('environment') or 'PROD'),
+            encode("status", data.get('status') or 'Planejada'),
+            WEEKDAYS_PT[start_date.weekday()],
+            start_date.strftime("%Y-%m-%d %H:%M:%S"),
+            end_date.strftime("%Y-%m-%d %H:%M:%S") if end_date else "",
+            start_date.strftime("%Y-%m-%d %H:%M:%S"),
+            end_date.strftime("%Y-%m-%d %H:%M:%S") if end_date else None,
+            data.get('change_number') or 'N/A',
+            data.get('title') or '',
+            encode("assigned_to", data.get('assigned_to') or ''),
+            data.get('observation') or '',
+            data.get('vulnerability') or '',
+            data.get('opened_by') or '',
+        ))
+        gmud_id = c.lastrowid
+        _adjust_filter_values(conn, "gmuds", new_row=dict(c.execute(
+            "SELECT * FROM gmuds WHERE id = ?", (gmud_id,)).fetchone()))
+        _adjust_gmud_cube(conn, gmud_id, +1)
+        c.execute("INSERT INTO gmud_excel_outbox (gmud_id) VALUES (?)", (gmud_id,))
+        bump_data_generation(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    return gmud_id
+
+
+def get_pending_excel_sync(limit=200):
+    """Get GMUDs waiting to be written to the Excel workbook (oldest first)."""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        SELECT o.id AS outbox_id, o.attempts, g.*
+        FROM gmud_excel_outbox o
+        JOIN gmuds g ON g.id = o.gmud_id
+        WHERE o.status = 'pending'
+        ORDER BY o.id
+        LIMIT ?
+    """, (limit,))
+    rows = [dict(r) for r in c.fetchall()]
+    conn.close()
+    return rows
+
+
+def has_pending_excel_sync():
+    """True if any GMUD is still waiting to be written to the workbook."""
+    conn = get_connection()
+    row = conn.execute("SELECT 1 FROM gmud_excel_outbox WHERE status = 'pending' LIMIT 1").fetchone()
+    conn.close()
+    return row is not None
+
+
+def get_excel_sync_status(gmud_id):
+    """Get the Excel write-back acknowledgement for a GMUD (None for imported GMUDs)."""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""
+        SELECT status, attempts, sheet_name, row_idx, error, created_at, synced_at
+        FROM gmud_excel_outbox WHERE gmud_id = ?
+        ORDER BY id DESC LIMIT 1
+    """, (gmud_id,))
+    row = c.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def mark_excel_sync_results(results, max_attempts=5):
+    """Record the outcome of an Excel sync batch.
+
+    results: list of dicts with outbox_id, ok, and sheet_name/row_idx or error.
+    Failed entries stay 'pending' until max_attempts, then move to 'error'.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    for r in results:
+        if r['ok']:
+            c.execute("""
+                UPDATE gmud_excel_outbox
+                SET status = 'synced', sheet_name = ?, row_idx = ?, error = NULL,
+                    attempts = attempts + 1, synced_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (r.get('sheet_name'), r.get('row_idx'), r['outbox_id']))
+        else:
+            c.execute("""
+                UPDATE gmud_excel_outbox
+                SET attempts = attempts + 1, error = ?,
+                    status = CASE WHEN ? OR attempts + 1 >= ? THEN 'error' ELSE 'pending' END
+                WHERE id = ?
+            """, (r.get('error'), 1 if r.get('permanent') else 0, max_attempts, r['outbox_id']))
+    conn.commit()
+    conn.close()
+
+
 def search_hostnames(query, limit=15):
     """Search hostnames across servers, cmdb_full, and cmdb_databases tables."""
     conn = get_connection()
@@ -1028,7 +1855,7 @@ def get_server_details(hostname):
     gmud_query = """
         SELECT * FROM gmuds 
         WHERE (title LIKE ? OR observation LIKE ?)
-        ORDER BY start_date DESC
+        ORDER BY start_at DESC
     """
     search_term = f"%{hostname}%"
     c.execute(gmud_query, (search_term, search_term))
@@ -1,9 +1,21 @@
-import shutil
 import os
+import time
+import threading
+from contextlib import contextmanager
 import openpyxl
-from datetime import datetime
 import locale
-from config import GMUD_PATH
+from config import (
+    GMUD_PATH, EXCEL_SYNC_INTERVAL, EXCEL_SYNC_BATCH_SIZE, EXCEL_SYNC_MAX_ATTEMPTS,
+    EXCEL_LOCK_TIMEOUT
+)
+from database import parse_gmud_datetime, get_pending_excel_sync, mark_excel_sync_results
+from backup_manager import create_backup
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 # Tentar configurar locale para PT-BR para nomes de dias da semana
 try:
@@ -14,28 +26,26 @@ except:
     except:
         pass
 
-# Diretório para backups automáticos antes de cada escrita
-BACKUP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backups')
-
-if not os.path.exists(BACKUP_DIR):
-    os.makedirs(BACKUP_DIR)
+# Cache da última linha usada por aba: {sheet_name: row_idx}
+# Válido apenas enquanto o arquivo não for alterado por fora (ver _file_stamp).
+_LAST_ROW_CACHE = {}
+_LAST_ROW_STAMP = None
 
 def backup_workbook(file_path):
     """
     Cria uma cópia de segurança do arquivo Excel antes de qualquer modificação.
-    Salva em ./backups/ com timestamp.
+    Salva em ./backups/ (deduplicado por conteúdo, com rotação — ver backup_manager).
     """
     try:
         if not os.path.exists(file_path):
             return False, "Arquivo original não encontrado para backup."
 
-        filename = os.path.basename(file_path)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = os.path.join(BACKUP_DIR, f"{filename}_{timestamp}.bak")
-        
-        shutil.copy2(file_path, backup_path)
-        print(f"📦 Backup criado em: {backup_path}")
-        return True, backup_path
+        entry = create_backup(file_path)
+        if entry["deduplicated"]:
+            print(f"📦 Backup reaproveitado (conteúdo idêntico): {entry['object']}")
+        else:
+            print(f"📦 Backup criado em: {entry['object']}")
+        return True, entry["object"]
     except Exception as e:
         return False, str(e)
 
@@ -47,104 +57,236 @@ def get_sheet_name_for_date(date_obj):
     from config import MONTH_SHEETS
     target_year = date_obj.year
     target_month = date_obj.month
-    
+
     for sheet_name, (year, month) in MONTH_SHEETS.items():
         if year == target_year and month == target_month:
             return sheet_name
-            
+
     return None
 
-def write_gmud_to_excel(gmud_data):
+def _file_stamp(file_path):
+    """Identifica a versão do arquivo em disco (mtime + tamanho)."""
+    st = os.stat(file_path)
+    return (st.st_mtime_ns, st.st_size)
+
+def _next_empty_row(ws, sheet_name):
     """
-    Escreve os dados do GMUD na planilha Excel original.
-    
-    Args:
-        gmud_data (dict): Dicionário contendo os dados do formulário.
-    
+    Encontra a próxima linha vazia da aba, partindo da última linha conhecida.
+    Verifica coluna I (Título) e H (GMUD) para saber se a linha está ocupada.
+    """
+    # Começa da linha 2 (assumindo cabeçalho na linha 1)
+    row_idx = _LAST_ROW_CACHE.get(sheet_name, 1) + 1
+    while ws.cell(row=row_idx, column=9).value or ws.cell(row=row_idx, column=8).value:
+        row_idx += 1
+    return row_idx
+
+def _write_gmud_row(ws, row_idx, gmud_data, start_date, end_date):
+    """
+    Escreve os dados do GMUD nas colunas (mapeamento baseado em import_excel.py):
+    A (1): Cliente | B (2): Tipo BD | C (3): Entorno | D (4): Status | E (5): Dia
+    F (6): Data Início | G (7): Data Término | H (8): GMUD / Change Number
+    I (9): Título | J (10): Designado a | K (11): Observação
+    L (12): Vulnerabilidade | M (13): Aberto Por
+    """
+    ws.cell(row=row_idx, column=1, value=gmud_data.get('client', 'Getnet'))
+    ws.cell(row=row_idx, column=2, value=gmud_data.get('db_type', 'Oracle'))
+    ws.cell(row=row_idx, column=3, value=gmud_data.get('environment', 'PROD'))
+    ws.cell(row=row_idx, column=4, value=gmud_data.get('status', 'Planejada'))
+
+    # Dia da semana: usa o valor já gravado no banco, senão o locale (PT-BR se disponível)
+    day_name = gmud_data.get('day_of_week') or start_date.strftime('%A').capitalize()
+    ws.cell(row=row_idx, column=5, value=day_name)
+
+    ws.cell(row=row_idx, column=6, value=start_date)
+    ws.cell(row=row_idx, column=7, value=end_date)
+
+    ws.cell(row=row_idx, column=8, value=gmud_data.get('change_number', 'N/A'))
+    ws.cell(row=row_idx, column=9, value=gmud_data.get('title'))
+    ws.cell(row=row_idx, column=10, value=gmud_data.get('assigned_to'))
+    ws.cell(row=row_idx, column=11, value=gmud_data.get('observation', ''))
+    ws.cell(row=row_idx, column=12, value=gmud_data.get('vulnerability', ''))
+    ws.cell(row=row_idx, column=13, value=gmud_data.get('opened_by', ''))
+
+def _append_gmuds(file_path, gmuds):
+    """
+    Abre o workbook uma única vez, acrescenta todas as GMUDs e salva uma única vez.
+
     Returns:
-        tuple: (sucesso: bool, mensagem: str)
+        list: um dict por GMUD com ok, sheet_name/row_idx ou error/permanent.
     """
-    file_path = GMUD_PATH
-    
-    # 1. Realizar Backup
-    ok, msg = backup_workbook(file_path)
-    if not ok:
-        return False, f"Falha ao criar backup: {msg}"
+    global _LAST_ROW_STAMP
 
-    try:
-        # 2. Carregar Workbook (keep_vba=True para preservar macros)
-        # data_only=False para manter fórmulas, keep_vba=True para macros
-        wb = openpyxl.load_workbook(file_path, keep_vba=True)
-        
-        # 3. Identificar a Aba Correta
-        start_date_str = gmud_data.get('start_date')
-        if isinstance(start_date_str, str):
-            # Formato esperado do frontend: YYYY-MM-DDTHH:MM
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%dT%H:%M')
-        else:
-            start_date = start_date_str
+    # O cache de linhas só vale se ninguém alterou o arquivo desde o nosso último save
+    if _LAST_ROW_STAMP != _file_stamp(file_path):
+        _LAST_ROW_CACHE.clear()
+
+    # keep_vba=True para preservar macros, data_only=False para manter fórmulas
+    wb = openpyxl.load_workbook(file_path, keep_vba=True)
+
+    results = []
+    written = 0
+    for gmud_data in gmuds:
+        try:
+            start_date = parse_gmud_datetime(gmud_data.get('start_date'))
+            end_date = parse_gmud_datetime(gmud_data.get('end_date'))
+        except ValueError as e:
+            results.append({"ok": False, "error": str(e), "permanent": True})
+            continue
 
-        end_date_str = gmud_data.get('end_date')
-        if isinstance(end_date_str, str):
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%dT%H:%M')
-        else:
-            end_date = end_date_str
-            
         sheet_name = get_sheet_name_for_date(start_date)
         if not sheet_name or sheet_name not in wb.sheetnames:
             possible_sheets = ", ".join(wb.sheetnames)
-            return False, f"Aba para a data {start_date} não encontrada. Abas disponíveis: {possible_sheets}"
-        
+            results.append({
+                "ok": False, "permanent": True,
+                "error": f"Aba para a data {start_date} não encontrada. Abas disponíveis: {possible_sheets}",
+            })
+            continue
+
         ws = wb[sheet_name]
-        
-        # 4. Encontrar a próxima linha vazia
-        # Começa da linha 2 (assumindo cabeçalho na linha 1)
-        row_idx = 2
-        # Verifica coluna I (Título - índice 9) ou coluna H (GMUD - índice 8) para saber se a linha está ocupada
-        while ws.cell(row=row_idx, column=9).value or ws.cell(row=row_idx, column=8).value:
-            row_idx += 1
-            
-        # 5. Escrever Dados nas Colunas (Mapeamento baseado em import_excel.py)
-        # A (1): Cliente
-        # B (2): Tipo BD
-        # C (3): Entorno
-        # D (4): Status
-        # E (5): Dia
-        # F (6): Data Início
-        # G (7): Data Término
-        # H (8): GMUD / Change Number
-        # I (9): Título
-        # J (10): Designado a
-        # K (11): Observação
-        # L (12): Vulnerabilidade
-        # M (13): Aberto Por
-        
-        ws.cell(row=row_idx, column=1, value=gmud_data.get('client', 'Getnet'))
-        ws.cell(row=row_idx, column=2, value=gmud_data.get('db_type', 'Oracle'))
-        ws.cell(row=row_idx, column=3, value=gmud_data.get('environment', 'PROD'))
-        ws.cell(row=row_idx, column=4, value=gmud_data.get('status', 'Planejada'))
-        
-        # Dia da semana (em português se locale funcionar, senão inglês)
-        day_name = start_date.strftime('%A').capitalize()
-        ws.cell(row=row_idx, column=5, value=day_name)
-        
-        ws.cell(row=row_idx, column=6, value=start_date)
-        ws.cell(row=row_idx, column=7, value=end_date)
-        
-        ws.cell(row=row_idx, column=8, value=gmud_data.get('change_number', 'N/A'))
-        ws.cell(row=row_idx, column=9, value=gmud_data.get('title'))
-        ws.cell(row=row_idx, column=10, value=gmud_data.get('assigned_to'))
-        ws.cell(row=row_idx, column=11, value=gmud_data.get('observation', ''))
-        ws.cell(row=row_idx, column=12, value=gmud_data.get('vulnerability', ''))
-        ws.cell(row=row_idx, column=13, value=gmud_data.get('opened_by', ''))
-
-        # 6. Salvar Arquivo
-        wb.save(file_path)
-        print(f"✅ GMUD gravada com sucesso na linha {row_idx} da aba {sheet_name}")
-        
-        return True, f"GMUD criada com sucesso na linha {row_idx}!"
+        row_idx = _next_empty_row(ws, sheet_name)
+        _write_gmud_row(ws, row_idx, gmud_data, start_date, end_date)
+        _LAST_ROW_CACHE[sheet_name] = row_idx
+        written += 1
+        results.append({"ok": True, "sheet_name": sheet_name, "row_idx": row_idx})
+
+    if written:
+        try:
+            wb.save(file_path)
+        except Exception:
+            _LAST_ROW_CACHE.clear()
+            raise
+        _LAST_ROW_STAMP = _file_stamp(file_path)
+    wb.close()
+    return results
+
+def write_gmud_batch(gmuds):
+    """
+    Grava um lote de GMUDs na planilha em um único ciclo backup/load/append/save.
+    Quem chama deve segurar workbook_lock(GMUD_PATH) durante todo o ciclo.
 
+    Returns:
+        list: um resultado (dict com ok, sheet_name/row_idx ou error) por GMUD, na mesma ordem.
+    """
+    file_path = GMUD_PATH
+    try:
+        # 1. Realizar Backup (um por lote)
+        ok, msg = backup_workbook(file_path)
+        if not ok:
+            return [{"ok": False, "error": f"Falha ao criar backup: {msg}"}] * len(gmuds)
+
+        # 2. Carregar, localizar abas/linhas, escrever e salvar
+        return _append_gmuds(file_path, gmuds)
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return False, f"Erro ao escrever no Excel: {str(e)}"
+        return [{"ok": False, "error": f"Erro ao escrever no Excel: {str(e)}"}] * len(gmuds)
+
+
+# ══════════════════════════════════════════════════════════
+#  LOCK DE ARQUIVO (entre processos / instâncias)
+# ══════════════════════════════════════════════════════════
+
+@contextmanager
+def workbook_lock(file_path, timeout=EXCEL_LOCK_TIMEOUT):
+    """
+    Lock exclusivo do SO sobre '<planilha>.lock' (flock no Linux, msvcrt no Windows).
+    Garante que apenas um processo carrega/salva a planilha por vez.
+    """
+    fd = os.open(file_path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Planilha bloqueada por outro processo: {file_path}")
+                time.sleep(0.2)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
+
+
+# ══════════════════════════════════════════════════════════
+#  ESCRITOR ÚNICO (fila em memória + outbox SQLite → Excel)
+# ══════════════════════════════════════════════════════════
+
+class ExcelWriter(threading.Thread):
+    """
+    Thread única que grava na planilha o outbox do SQLite, um save por lote.
+    Leitura do outbox, gravação e marcação dos resultados acontecem com o lock
+    de arquivo seguro, para que duas instâncias nunca gravem a mesma GMUD.
+    """
+
+    def __init__(self, interval=EXCEL_SYNC_INTERVAL, batch_size=EXCEL_SYNC_BATCH_SIZE):
+        super().__init__(name="excel-writer", daemon=True)
+        self.interval = interval
+        self.batch_size = batch_size
+        self._wakeup = threading.Event()
+
+    def notify(self):
+        """Acorda o escritor para gravar imediatamente o outbox pendente."""
+        self._wakeup.set()
+
+    def run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                while self._flush_batch():
+                    pass
+            except Exception:
+                import traceback
+                traceback.print_exc()
+
+    def _flush_batch(self):
+        """Grava um lote. Retorna True se ainda pode haver trabalho pendente."""
+        # Sem planilha disponível (ex.: Cloud Run sem upload): as GMUDs ficam no banco
+        if not os.path.exists(GMUD_PATH):
+            return False
+
+        try:
+            with workbook_lock(GMUD_PATH):
+                pending = get_pending_excel_sync(limit=self.batch_size)
+                if not pending:
+                    return False
+                results = write_gmud_batch(pending)
+                acks = [dict(r, outbox_id=g['outbox_id']) for g, r in zip(pending, results)]
+                mark_excel_sync_results(acks, max_attempts=EXCEL_SYNC_MAX_ATTEMPTS)
+        except TimeoutError as e:
+            print(f"⚠️ Sync Excel adiado: {e}")
+            return False
+
+        synced = sum(1 for r in results if r["ok"])
+        print(f"✅ Sync Excel: {synced}/{len(results)} GMUDs gravadas na planilha (1 save)")
+
+        # Continua enquanto o lote veio cheio; falhas esperam o próximo intervalo
+        return len(results) >= self.batch_size and synced > 0
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def start_excel_sync_worker():
+    """Inicia o escritor único da planilha (idempotente) e o retorna."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ExcelWriter()
+            _writer.start()
+    return _writer
+
+def notify_excel_sync():
+    """Acorda o escritor para gravar imediatamente as GMUDs pendentes."""
+    start_excel_sync_worker().notify()
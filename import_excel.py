@@ -8,7 +8,12 @@ import os
 import sys
 from datetime import datetime
 from config import DATABASE_PATH, EXCEL_PATH, MONTH_SHEETS
-from database import init_db, get_connection
+from database import (
+    ensure_schema, get_connection, refresh_filter_values, bump_data_generation,
+    normalize_gmud_dates, rebuild_gmud_cube, DimensionEncoder
+)
+from psu import psu_columns, update_psu_compliance
+from vulns import rebuild_host_vuln_summary
 
 
 def safe_str(value):
@@ -79,7 +84,8 @@ def import_servers(wb, conn):
 
     ws = wb[sheet_name]
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM servers")
+    encode = DimensionEncoder(conn)
+    cursor.execute("DELETE FROM servers_data")
     count = 0
     total_server_count = 0
 
@@ -105,21 +111,21 @@ def import_servers(wb, conn):
             psu_version = ""
 
         cursor.execute("""
-            INSERT INTO servers (environment, primary_hostname, standby_hostname, psu_version,
-                email_sent, alignment, ggs_version, primary_contact, responsible_team,
+            INSERT INTO servers_data (environment_id, primary_hostname, standby_hostname, psu_version_id,
+                email_sent, alignment, ggs_version, primary_contact, responsible_team_id,
                 system_product, application_day, start_time, end_time, observation,
-                total_servers, has_standby, has_ggs)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                total_servers, has_standby, has_ggs, psu_major, psu_ru, psu_revision)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
-            safe_str(vals[0]),   # A: ENVIROMENT
+            encode("environment", safe_str(vals[0])),   # A: ENVIROMENT
             primary,             # B: PRIMARY HOSTNAME
             standby,             # C: STANDBY HOSTNAME
-            psu_version,         # D: GRID/PSU VERSION (cleaned)
+            encode("psu_version", psu_version),         # D: GRID/PSU VERSION (cleaned)
             safe_str(vals[4]),   # E: Email Enviado
             safe_str(vals[5]),   # F: Alinhamento
             safe_str(vals[6]),   # G: GGS VERSION
             safe_str(vals[7]),   # H: Contato Primário
-            safe_str(vals[8]),   # I: Equipe Responsável
+            encode("responsible_team", safe_str(vals[8])),   # I: Equipe Responsável
             safe_str(vals[9]),   # J: Sistema/Serviço/Produto
             safe_str(vals[10]),  # K: Dia para aplicação
             safe_str(vals[11]),  # L: Horário de Início
@@ -128,10 +134,14 @@ def import_servers(wb, conn):
             num_servers,         # Total Servers (1 standalone, 2 with standby)
             has_standby,         # Has standby flag
             has_ggs,             # Has GGS flag
+            *psu_columns(psu_version),   # PSU (major, RU, revision)
         ))
         count += 1
         total_server_count += num_servers
 
+    refresh_filter_values(conn, "servers")
+    update_psu_compliance(conn, "servers")
+    bump_data_generation(conn)
     conn.commit()
     print(f"  ✅ Servers: {count} rows imported ({total_server_count} total servers, including standby)")
     return count
@@ -188,6 +198,8 @@ def import_cmdb(wb, conn):
         ))
         count += 1
 
+    refresh_filter_values(conn, "cmdb_databases")
+    bump_data_generation(conn)
     conn.commit()
     print(f"  ✅ CMDB Databases: {count} records imported")
     return count
@@ -196,7 +208,16 @@ def import_cmdb(wb, conn):
 def import_gmuds(wb, conn):
     """Import from monthly sheets (FEVEREIRO-25 through FEVEREIRO-26)."""
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM gmuds")
+    encode = DimensionEncoder(conn)
+    # GMUDs created in the app that aren't in the workbook yet (outbox not
+    # synced) survive the re-import; deleting them would cascade to the outbox
+    cursor.execute("""
+        DELETE FROM gmuds_data
+        WHERE id NOT IN (SELECT gmud_id FROM gmud_excel_outbox WHERE status != 'synced')
+    """)
+    kept = cursor.execute("SELECT COUNT(*) FROM gmuds_data").fetchone()[0]
+    if kept:
+        print(f"  ⚠️  {kept} GMUDs criadas no app ainda não gravadas na planilha foram mantidas")
     total_count = 0
 
     for sheet_name, (year, month) in MONTH_SHEETS.items():
@@ -254,26 +275,31 @@ def import_gmuds(wb, conn):
                 new_end = ""
                 new_gmud = ""
 
+            start_date = safe_datetime(vals[5])  # F: Data Início
+            end_date = safe_datetime(vals[6])    # G: Data Término
+
             cursor.execute("""
-                INSERT INTO gmuds (year, month, client, db_type, environment, status,
-                    day_of_week, start_date, end_date, change_number, title,
-                    assigned_to, observation, vulnerability, opened_by,
+                INSERT INTO gmuds_data (year, month, client_id, db_type_id, environment_id, status_id,
+                    day_of_week, start_date, end_date, start_at, end_at, date_parse_error,
+                    change_number, title,
+                    assigned_to_id, observation, vulnerability, opened_by,
                     vulnerability_before, vulnerability_after, closing_code,
                     needs_replan, new_start_date, new_end_date, new_gmud)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 year,
                 month,
-                safe_str(vals[0]),   # A: Cliente
-                safe_str(vals[1]),   # B: Tipo BD
-                safe_str(vals[2]),   # C: Entorno
-                normalize_gmud_status(safe_str(vals[3])),   # D: Status (normalized)
+                encode("client", safe_str(vals[0])),   # A: Cliente
+                encode("db_type", safe_str(vals[1])),   # B: Tipo BD
+                encode("environment", safe_str(vals[2])),   # C: Entorno
+                encode("status", normalize_gmud_status(safe_str(vals[3]))),   # D: Status (normalized)
                 safe_str(vals[4]),   # E: Dia
-                safe_datetime(vals[5]),  # F: Data Início
-                safe_datetime(vals[6]),  # G: Data Término
+                start_date,
+                end_date,
+                *normalize_gmud_dates(start_date, end_date),
                 safe_str(vals[7]),   # H: GMUD
                 safe_str(vals[8]),   # I: Título
-                safe_str(vals[9]),   # J: Designado a
+                encode("assigned_to", safe_str(vals[9])),   # J: Designado a
                 safe_str(vals[10]) if num_cols > 10 else "",  # K: Observação
                 vulnerability,
                 opened_by,
@@ -290,6 +316,9 @@ def import_gmuds(wb, conn):
         total_count += count
         print(f"  ✅ {sheet_name}: {count} GMUDs imported")
 
+    refresh_filter_values(conn, "gmuds")
+    rebuild_gmud_cube(conn)
+    bump_data_generation(conn)
     conn.commit()
     print(f"  ✅ Total GMUDs: {total_count} records imported")
     return total_count
@@ -338,6 +367,7 @@ def import_planning(wb, conn):
         ))
         count += 1
 
+    bump_data_generation(conn)
     conn.commit()
     print(f"  ✅ Planning: {count} records imported")
     return count
@@ -363,8 +393,8 @@ def import_pagonxt(wb, conn):
         cursor.execute("""
             INSERT INTO pagonxt_databases (environment, name, contingent, psu_version,
                 contact, zone, product, description, channel, service, observation,
-                ip, instance, status, os)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ip, instance, status, os, psu_major, psu_ru, psu_revision)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             safe_str(vals[0]),   # A: ENVIROLMENT
             safe_str(vals[1]),   # B: NAME
@@ -381,9 +411,12 @@ def import_pagonxt(wb, conn):
             safe_str(vals[12]) if len(vals) > 12 else "",  # M: INSTANCE
             safe_str(vals[13]) if len(vals) > 13 else "",  # N: STATUS
             safe_str(vals[14]) if len(vals) > 14 else "",  # O: OS
+            *psu_columns(safe_str(vals[3])),   # PSU (major, RU, revision)
         ))
         count += 1
 
+    update_psu_compliance(conn, "pagonxt_databases")
+    bump_data_generation(conn)
     conn.commit()
     print(f"  ✅ PagoNxt Databases: {count} records imported")
     return count
@@ -404,7 +437,7 @@ def run_import(excel_path=None):
     print(f"✅ Loaded {len(wb.sheetnames)} sheets")
 
     # Initialize DB
-    init_db()
+    ensure_schema()
     conn = get_connection()
 
     total = 0
@@ -493,6 +526,7 @@ def import_cmdb_full_getnet(wb, conn):
 
     ws = wb[sheet_name]
     cursor = conn.cursor()
+    encode = DimensionEncoder(conn)
     count = 0
 
     for row in ws.iter_rows(min_row=2, max_row=ws.max_row, values_only=True):
@@ -506,25 +540,25 @@ def import_cmdb_full_getnet(wb, conn):
             continue
 
         cursor.execute("""
-            INSERT INTO cmdb_full (client, hostname, contingency, db_type, db_version,
-                status, server_type, environment, os, responsible_team, manager,
+            INSERT INTO cmdb_full_data (client_id, hostname, contingency, db_type_id, db_version,
+                status_id, server_type, environment_id, os_id, responsible_team_id, manager,
                 primary_contact, system_product, function, description,
                 validation_contact, team_email, shutdown_procedure, affinity,
                 week_month, application_day, start_time, end_time,
                 importance_level, criticality, scope_pci, scope_sox, scope_pagonxt,
-                ip_service, ip_backup, ip_branca, source_sheet)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ip_service, ip_backup, ip_branca, source_sheet, psu_major, psu_ru, psu_revision)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
-            "GetNet",
+            encode("client", "GetNet"),
             safe_str(row[8]),    # Nome
             safe_str(row[9]),    # Contingência
-            db_type,             # Banco de Dados (normalized)
+            encode("db_type", db_type),             # Banco de Dados (normalized)
             safe_str(row[12]),   # DB Version
-            normalize_cmdb_status(safe_str(row[18])),   # Situação (normalized)
+            encode("status", normalize_cmdb_status(safe_str(row[18]))),   # Situação (normalized)
             safe_str(row[19]),   # Tipo
-            safe_str(row[20]),   # Ambiente
-            safe_str(row[21]),   # Sistema Operacional
-            safe_str(row[22]),   # Equipe Responsável
+            encode("environment", safe_str(row[20])),   # Ambiente
+            encode("os", safe_str(row[21])),   # Sistema Operacional
+            encode("responsible_team", safe_str(row[22])),   # Equipe Responsável
             safe_str(row[23]),   # Gerente
             safe_str(row[24]),   # Contato Primário
             safe_str(row[25]),   # Sistema/Serviço/Produto
@@ -547,9 +581,13 @@ def import_cmdb_full_getnet(wb, conn):
             safe_str(row[54]) if len(row) > 54 else "",  # IP Backup
             safe_str(row[55]) if len(row) > 55 else "",  # IP Branca
             sheet_name,
+            *psu_columns(safe_str(row[12])),   # DB Version (major, RU, revision)
         ))
         count += 1
 
+    update_psu_compliance(conn, "cmdb_full")
+    rebuild_host_vuln_summary(conn)  # client/db_type/environment of each host come from cmdb_full
+    bump_data_generation(conn)
     conn.commit()
     print(f"  ✅ CMDB GetNet Brasil: {count} DB servers imported")
     return count
@@ -566,6 +604,7 @@ def import_cmdb_full_latam(wb, conn):
 
     ws = wb[sheet_name]
     cursor = conn.cursor()
+    encode = DimensionEncoder(conn)
     count = 0
 
     for row in ws.iter_rows(min_row=2, max_row=ws.max_row, values_only=True):
@@ -578,25 +617,25 @@ def import_cmdb_full_latam(wb, conn):
             continue
 
         cursor.execute("""
-            INSERT INTO cmdb_full (client, hostname, contingency, db_type, db_version,
-                status, server_type, environment, os, responsible_team, manager,
+            INSERT INTO cmdb_full_data (client_id, hostname, contingency, db_type_id, db_version,
+                status_id, server_type, environment_id, os_id, responsible_team_id, manager,
                 primary_contact, system_product, function, description,
                 validation_contact, team_email, shutdown_procedure, affinity,
                 week_month, application_day, start_time, end_time,
                 importance_level, criticality, scope_pci, scope_sox, scope_pagonxt,
-                ip_service, ip_backup, ip_branca, zone, country, source_sheet)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ip_service, ip_backup, ip_branca, zone, country, source_sheet, psu_major, psu_ru, psu_revision)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
-            "PagoNxt",
+            encode("client", "PagoNxt"),
             safe_str(row[8]),    # Nome
             safe_str(row[9]),    # Contingência
-            db_type,             # Banco de Dados
+            encode("db_type", db_type),             # Banco de Dados
             safe_str(row[12]),   # DB Version
-            normalize_cmdb_status(safe_str(row[20])),   # Situação (normalized)
+            encode("status", normalize_cmdb_status(safe_str(row[20]))),   # Situação (normalized)
             safe_str(row[21]),   # Tipo
-            safe_str(row[22]),   # Ambiente
-            safe_str(row[23]),   # Sistema Operacional
-            safe_str(row[24]),   # Equipe Responsável
+            encode("environment", safe_str(row[22])),   # Ambiente
+            encode("os", safe_str(row[23])),   # Sistema Operacional
+            encode("responsible_team", safe_str(row[24])),   # Equipe Responsável
             safe_str(row[25]),   # Gerente
             safe_str(row[26]),   # Contato Primário
             safe_str(row[27]),   # Sistema/Serviço/Produto
@@ -621,9 +660,13 @@ def import_cmdb_full_latam(wb, conn):
             safe_str(row[18]) if len(row) > 18 else "",  # Zona
             safe_str(row[19]) if len(row) > 19 else "",  # País
             sheet_name,
+            *psu_columns(safe_str(row[12])),   # DB Version (major, RU, revision)
         ))
         count += 1
 
+    update_psu_compliance(conn, "cmdb_full")
+    rebuild_host_vuln_summary(conn)  # client/db_type/environment of each host come from cmdb_full
+    bump_data_generation(conn)
     conn.commit()
     print(f"  ✅ CMDB LATAM (PagoNxt): {count} DB servers imported")
     return count
@@ -671,17 +714,21 @@ def run_cmdb_full_import(excel_path=None):
     wb = openpyxl.load_workbook(path, data_only=True, read_only=True)
     print(f"✅ Loaded {len(wb.sheetnames)} sheets")
 
-    init_db()
+    ensure_schema()
     conn = get_connection()
 
     # Clear previous CMDB Full data
-    conn.execute("DELETE FROM cmdb_full")
+    conn.execute("DELETE FROM cmdb_full_data")
+    bump_data_generation(conn)
     conn.commit()
 
     total = 0
     try:
         total += import_cmdb_full_getnet(wb, conn)
         total += import_cmdb_full_latam(wb, conn)
+        refresh_filter_values(conn, "cmdb_full")
+        bump_data_generation(conn)
+        conn.commit()
 
         print(f"\n{'='*50}")
         print(f"🎉 CMDB Full import complete! {total} DB servers imported.")
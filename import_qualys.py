@@ -3,7 +3,8 @@ ORAEX PSU Manager — Qualys Importer
 """
 import os
 import openpyxl
-from database import get_connection, init_db
+from database import get_connection, ensure_schema, bump_data_generation, DimensionEncoder
+from vulns import detection_columns, update_sla_state, rebuild_host_vuln_summary
 
 def import_qualys_scan(file_path, source_type):
     """
@@ -35,6 +36,9 @@ def import_qualys_scan(file_path, source_type):
         total_detections += count_det
         new_qids += count_qid
         
+        update_sla_state(conn)
+        rebuild_host_vuln_summary(conn)
+        bump_data_generation(conn)
         conn.commit()
         
         print(f"\\n{'='*50}")
@@ -78,8 +82,8 @@ def _upsert_vulnerability(cursor, data):
             str(data.get('category', ''))
         ))
 
-def _insert_detection(cursor, data):
-    """Insert na tabela de detecções por servidor."""
+def _insert_detection(cursor, data, encode):
+    """Insert na tabela de detecções por servidor (ambiente/SO/status codificados via encode)."""
     try:
         qid = int(data['qid']) if data['qid'] else 0
         if not qid or not data['asset_name']:
@@ -88,25 +92,28 @@ def _insert_detection(cursor, data):
         return 0
     
     cursor.execute("""
-        INSERT INTO qualys_detections (
-            qid, asset_name, asset_ip, environment, os, os_version, 
-            status, first_detected, last_detected, detection_age, 
-            results, overdue, source
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO qualys_detections_data (
+            qid, asset_name, asset_ip, environment_id, os_id, os_version,
+            status_id, first_detected, last_detected, detection_age, 
+            results, overdue, source,
+            first_detected_at, last_detected_at, age_days, squad
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
         qid,
         str(data.get('asset_name', '')),
         str(data.get('asset_ip', '')),
-        str(data.get('environment', '')),
-        str(data.get('os', '')),
+        encode("environment", str(data.get('environment', ''))),
+        encode("os", str(data.get('os', ''))),
         str(data.get('os_version', '')),
-        str(data.get('status', 'Active')),
+        encode("status", str(data.get('status', 'Active'))),
         str(data.get('first_detected', '')),
         str(data.get('last_detected', '')),
-        data.get('detection_age', 0),
+        data.get('detection_age') or 0,  # legacy column; age_days keeps the blank
         str(data.get('results', '')),
         str(data.get('overdue', '')),
-        data.get('source')
+        data.get('source'),
+        *detection_columns(data.get('first_detected'), data.get('last_detected'),
+                           data.get('detection_age'), data.get('title'))
     ))
     return 1
 
@@ -118,6 +125,7 @@ def _import_pagonxt(wb, cursor):
         return 0, 0
         
     ws = wb[sheet_name]
+    encode = DimensionEncoder(cursor.connection)
     count_det = 0
     count_qid = 0
     
@@ -134,7 +142,7 @@ def _import_pagonxt(wb, cursor):
             'asset_name': row[0],
             'title': row[1],
             'results': row[2],
-            'detection_age': row[3] if row[3] else 0,
+            'detection_age': row[3],
             'first_detected': row[4],
             'environment': row[6],
             'os': row[7],
@@ -153,7 +161,7 @@ def _import_pagonxt(wb, cursor):
         count_qid += 1  # Not exact unique count, but close enough for logs
         
         # Insert Detection
-        count_det += _insert_detection(cursor, data)
+        count_det += _insert_detection(cursor, data, encode)
         
     return count_det, count_qid
 
@@ -165,6 +173,7 @@ def _import_getnet(wb, cursor):
         return 0, 0
         
     ws = wb[sheet_name]
+    encode = DimensionEncoder(cursor.connection)
     count_det = 0
     count_qid = 0
     
@@ -182,7 +191,7 @@ def _import_getnet(wb, cursor):
             'asset_name': row[1],
             'title': row[2],
             'results': row[3],
-            'detection_age': row[4] if row[4] else 0,
+            'detection_age': row[4],
             'first_detected': row[5],
             'environment': row[8],
             'os': row[9],
@@ -197,7 +206,7 @@ def _import_getnet(wb, cursor):
         }
         
         _upsert_vulnerability(cursor, data)
-        count_det += _insert_detection(cursor, data)
+        count_det += _insert_detection(cursor, data, encode)
         
     # Retorna o total aproximado de novas vulns
     count_qid = cursor.execute("SELECT COUNT(*) FROM qualys_vulnerabilities").fetchone()[0]
@@ -205,7 +214,7 @@ def _import_getnet(wb, cursor):
     return count_det, count_qid
 
 if __name__ == "__main__":
-    init_db()
+    ensure_schema()
     # Test script locally with hardcoded paths
     pagonxt_path = r'd:\\antigravity\\oraex-psu\\scan-vulnerabilidades\\20260219 - SCAN FULL QUALYS - PAGONXT.xlsx'
     getnet_path = r'd:\\antigravity\\oraex-psu\\scan-vulnerabilidades\\20260219 - SCAN FULL QUALYS.xlsm'
@@ -0,0 +1,167 @@
+"""
+ORAEX PSU Manager — Request Metrics
+Per-endpoint latency histograms (p50/p95/p99), response sizes, status codes and
+DB time, exported in Prometheus text format. Responses to admins (see
+SERVER_TIMING) also carry a Server-Timing header with the DB/app time breakdown.
+"""
+import time
+import threading
+from collections import deque
+from flask import request, g
+from flask_login import current_user
+from database import reset_db_timing, get_db_timing
+from config import METRICS_RESERVOIR_SIZE, SERVER_TIMING
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+_lock = threading.Lock()
+_ENDPOINTS = {}  # {(endpoint, method): _EndpointStats}
+
+
+class _EndpointStats:
+    __slots__ = ("buckets", "count", "duration_sum", "recent", "size_sum",
+                 "db_sum", "db_queries", "statuses")
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.duration_sum = 0.0
+        self.recent = deque(maxlen=METRICS_RESERVOIR_SIZE)
+        self.size_sum = 0
+        self.db_sum = 0.0
+        self.db_queries = 0
+        self.statuses = {}
+
+    def observe(self, duration, size, status, db_queries, db_seconds):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.duration_sum += duration
+        self.recent.append(duration)
+        self.size_sum += size
+        self.db_sum += db_seconds
+        self.db_queries += db_queries
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+def _quantile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def _start_timer():
+    g._metrics_start = time.perf_counter()
+    reset_db_timing()
+
+
+def _wants_server_timing():
+    if SERVER_TIMING == "all":
+        return True
+    if SERVER_TIMING != "admin":
+        return False
+    return current_user.is_authenticated and getattr(current_user, "role", None) == "admin"
+
+
+def _record(response):
+    start = g.pop("_metrics_start", None)
+    if start is None:
+        return response
+    duration = time.perf_counter() - start
+    db_queries, db_seconds = get_db_timing()
+
+    if _wants_server_timing():
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={db_seconds * 1000:.1f};desc="{db_queries} queries", '
+            f'app;dur={(duration - db_seconds) * 1000:.1f}, total;dur={duration * 1000:.1f}'
+        )
+
+    size = response.calculate_content_length() or 0
+    key = (request.endpoint or "unmatched", request.method)
+    with _lock:
+        stats = _ENDPOINTS.get(key)
+        if stats is None:
+            stats = _ENDPOINTS[key] = _EndpointStats()
+        stats.observe(duration, size, response.status_code, db_queries, db_seconds)
+    return response
+
+
+def _labels(endpoint, method, **extra):
+    parts = [f'endpoint="{endpoint}"', f'method="{method}"']
+    parts += [f'{k}="{v}"' for k, v in extra.items()]
+    return "{" + ",".join(parts) + "}"
+
+
+def render_prometheus():
+    """Render all collected metrics in Prometheus text exposition format."""
+    with _lock:
+        snapshot = [(key, stats.count, stats.duration_sum, list(stats.buckets), sorted(stats.recent),
+                     stats.size_sum, stats.db_sum, stats.db_queries, dict(stats.statuses))
+                    for key, stats in sorted(_ENDPOINTS.items())]
+
+    lines = [
+        "# HELP oraex_http_request_duration_seconds Request latency per endpoint.",
+        "# TYPE oraex_http_request_duration_seconds histogram",
+    ]
+    for (endpoint, method), count, dur_sum, buckets, _recent, *_rest in snapshot:
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS, buckets):
+            cumulative += n
+            lines.append(f"oraex_http_request_duration_seconds_bucket{_labels(endpoint, method, le=bound)} {cumulative}")
+        lines.append(f'oraex_http_request_duration_seconds_bucket{_labels(endpoint, method, le="+Inf")} {count}')
+        lines.append(f"oraex_http_request_duration_seconds_sum{_labels(endpoint, method)} {dur_sum:.6f}")
+        lines.append(f"oraex_http_request_duration_seconds_count{_labels(endpoint, method)} {count}")
+
+    lines += [
+        f"# HELP oraex_http_request_duration_quantile_seconds Latency quantiles over the last {METRICS_RESERVOIR_SIZE} requests.",
+        "# TYPE oraex_http_request_duration_quantile_seconds gauge",
+    ]
+    for (endpoint, method), _count, _sum, _buckets, recent, *_rest in snapshot:
+        for q in QUANTILES:
+            lines.append(f"oraex_http_request_duration_quantile_seconds{_labels(endpoint, method, quantile=q)} {_quantile(recent, q):.6f}")
+
+    lines += [
+        "# HELP oraex_http_response_size_bytes_total Bytes sent in response bodies.",
+        "# TYPE oraex_http_response_size_bytes_total counter",
+    ]
+    for (endpoint, method), _c, _s, _b, _r, size_sum, *_rest in snapshot:
+        lines.append(f"oraex_http_response_size_bytes_total{_labels(endpoint, method)} {size_sum}")
+
+    lines += [
+        "# HELP oraex_http_db_seconds_total Time spent in SQLite while serving requests.",
+        "# TYPE oraex_http_db_seconds_total counter",
+    ]
+    for (endpoint, method), _c, _s, _b, _r, _size, db_sum, *_rest in snapshot:
+        lines.append(f"oraex_http_db_seconds_total{_labels(endpoint, method)} {db_sum:.6f}")
+
+    lines += [
+        "# HELP oraex_http_db_queries_total SQL statements executed while serving requests.",
+        "# TYPE oraex_http_db_queries_total counter",
+    ]
+    for (endpoint, method), _c, _s, _b, _r, _size, _db, db_queries, _st in snapshot:
+        lines.append(f"oraex_http_db_queries_total{_labels(endpoint, method)} {db_queries}")
+
+    lines += [
+        "# HELP oraex_http_responses_total Responses per status code.",
+        "# TYPE oraex_http_responses_total counter",
+    ]
+    for (endpoint, method), *_rest, statuses in snapshot:
+        for status, n in sorted(statuses.items()):
+            lines.append(f"oraex_http_responses_total{_labels(endpoint, method, status=status)} {n}")
+
+    return "\n".join(lines) + "\n"
+
+
+def init_metrics(app):
+    """
+    Register the timing hooks. Call before init_compression() so the recorded
+    response size is the compressed one (after_request hooks run in reverse order).
+    """
+    app.before_request(_start_timer)
+    app.after_request(_record)
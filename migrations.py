@@ -0,0 +1,481 @@
+"""
+ORAEX PSU Manager — Schema Migrations
+Versioned, ordered migrations on top of the baseline tables created by
+init_db(), which runs them at startup.
+
+- schema_version records every applied migration;
+- a lease row in schema_migration_lock makes sure only one instance migrates
+  (the others wait for it to finish);
+- large tables are backfilled in batches, committing and renewing the lease
+  between batches;
+- dry-run applies the pending migrations to a temporary copy of the database
+  and reports how long each one took.
+
+    python migrations.py            apply pending migrations
+    python migrations.py status     show applied / pending migrations
+    python migrations.py dry-run    time pending migrations on a copy
+"""
+import os
+import sys
+import time
+import socket
+import sqlite3
+import tempfile
+from config import DATABASE_PATH, MIGRATION_LOCK_LEASE, MIGRATION_LOCK_WAIT, MIGRATION_BATCH_SIZE
+from database import get_connection
+
+MIGRATIONS = []  # [(version, name, fn)], kept sorted by version
+
+
+def migration(version, name):
+    """Register fn(conn, ctx) as migration <version>. Versions are never reused or reordered."""
+    def register(fn):
+        if any(v == version for v, _, _ in MIGRATIONS):
+            raise ValueError(f"Migração {version} duplicada")
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+class MigrationLockTimeout(RuntimeError):
+    """Another instance held the migration lock for longer than MIGRATION_LOCK_WAIT."""
+
+
+# ── Bookkeeping ───────────────────────────────────────────
+
+def _ensure_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration_ms INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migration_lock (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    conn.commit()
+
+
+def current_version(conn):
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def pending_migrations(conn):
+    applied = {r[0] for r in conn.execute("SELECT version FROM schema_version")}
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+
+def target_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+# ── Lease lock ────────────────────────────────────────────
+
+def _owner_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{os.environ.get('K_REVISION', 'local')}"
+
+
+def _try_acquire(conn, owner):
+    """
+    Take (or renew) the lease if it is free, expired or already ours.
+    Returns True if held, False if another instance holds it, None if the
+    database stayed busy/locked past the busy timeout (try again later).
+    """
+    now = time.time()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+    except sqlite3.OperationalError as e:
+        if "locked" in str(e) or "busy" in str(e):
+            return None
+        raise
+    try:
+        row = conn.execute("SELECT owner, expires_at FROM schema_migration_lock WHERE id = 1").fetchone()
+        if row and row[0] != owner and row[1] > now:
+            conn.rollback()
+            return False
+        conn.execute("INSERT OR REPLACE INTO schema_migration_lock (id, owner, expires_at) VALUES (1, ?, ?)",
+                     (owner, now + MIGRATION_LOCK_LEASE))
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _release(conn, owner):
+    conn.execute("DELETE FROM schema_migration_lock WHERE id = 1 AND owner = ?", (owner,))
+    conn.commit()
+
+
+class MigrationContext:
+    """Passed to each migration: batched backfills that keep the lease alive."""
+
+    def __init__(self, conn, owner, batch_size=MIGRATION_BATCH_SIZE):
+        self.conn = conn
+        self.owner = owner
+        self.batch_size = batch_size
+        self.expires_at = time.time() + MIGRATION_LOCK_LEASE
+        self.vacuum = False  # set by migrations that free a lot of space; run after the lease is released
+
+    def heartbeat(self):
+        """Renew the lease (call between committed batches). A busy database is retried until the lease would lapse."""
+        while True:
+            acquired = _try_acquire(self.conn, self.owner)
+            if acquired:
+                self.expires_at = time.time() + MIGRATION_LOCK_LEASE
+                return
+            if acquired is False or time.time() > self.expires_at:
+                raise RuntimeError("Lock de migração perdido para outra instância")
+            time.sleep(1)
+
+    def backfill_sql(self, table, set_clause, where=None, params=()):
+        """
+        UPDATE table SET <set_clause> in rowid ranges of batch_size, committing
+        between batches. Returns the number of rows updated.
+        """
+        max_rowid = self.conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+        extra = f" AND ({where})" if where else ""
+        updated = 0
+        for start in range(0, max_rowid, self.batch_size):
+            cur = self.conn.execute(
+                f"UPDATE {table} SET {set_clause} WHERE rowid > ? AND rowid <= ?{extra}",
+                (start, start + self.batch_size, *params))
+            updated += cur.rowcount
+            self.conn.commit()
+            self.heartbeat()
+        return updated
+
+    def backfill_rows(self, table, columns, set_columns, compute):
+        """
+        Python-side backfill: read (rowid, *columns) in batches, call compute(row)
+        -> tuple of values for set_columns, and write them back. Returns rows updated.
+        """
+        select = ", ".join(columns)
+        assign = ", ".join(f"{c} = ?" for c in set_columns)
+        last, updated = 0, 0
+        while True:
+            rows = self.conn.execute(
+                f"SELECT rowid, {select} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last, self.batch_size)).fetchall()
+            if not rows:
+                return updated
+            self.conn.executemany(f"UPDATE {table} SET {assign} WHERE rowid = ?",
+                                  [(*compute(row), row[0]) for row in rows])
+            self.conn.commit()
+            self.heartbeat()
+            updated += len(rows)
+            last = rows[-1][0]
+
+
+# ── Runner ────────────────────────────────────────────────
+
+def run_migrations(db_path=None, verbose=True):
+    """
+    Apply pending migrations. If another instance holds the lock, wait for it
+    to finish (up to MIGRATION_LOCK_WAIT) instead of migrating concurrently.
+    Returns the list of (version, name, seconds) applied by this call.
+    """
+    conn = get_connection(db_path)
+    owner = _owner_id()
+    applied = []
+    try:
+        _ensure_tables(conn)
+        if not pending_migrations(conn):
+            return applied
+
+        deadline = time.time() + MIGRATION_LOCK_WAIT
+        while not _try_acquire(conn, owner):
+            if not pending_migrations(conn):
+                return applied  # the other instance finished the job
+            if time.time() > deadline:
+                raise MigrationLockTimeout("Timeout aguardando lock de migração")
+            time.sleep(2)
+
+        ctx = MigrationContext(conn, owner)
+        try:
+            for version, name, fn in pending_migrations(conn):
+                if verbose:
+                    print(f"🔧 Migração {version:03d} {name}...")
+                start = time.perf_counter()
+                fn(conn, ctx)
+                elapsed = time.perf_counter() - start
+                conn.execute("INSERT INTO schema_version (version, name, duration_ms) VALUES (?, ?, ?)",
+                             (version, name, int(elapsed * 1000)))
+                conn.commit()
+                ctx.heartbeat()
+                applied.append((version, name, elapsed))
+                if verbose:
+                    print(f"  ✅ {name} ({elapsed:.1f}s)")
+        finally:
+            _release(conn, owner)
+        if ctx.vacuum:
+            # Outside the lease: a long VACUUM must not outlive it and let a second instance in
+            if verbose:
+                print("🧹 VACUUM...")
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return applied
+
+
+def dry_run(db_path=None):
+    """Apply pending migrations to a temporary copy of the database. Returns [(version, name, seconds)]."""
+    source = get_connection(db_path)
+    _ensure_tables(source)
+    fd, copy_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        copy = get_connection(copy_path)
+        source.backup(copy)
+        copy.close()
+        return run_migrations(copy_path, verbose=False)
+    finally:
+        source.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(copy_path + suffix):
+                os.unlink(copy_path + suffix)
+
+
+# ══════════════════════════════════════════════════════════
+#  MIGRATIONS (append only — never edit one that has shipped)
+# ══════════════════════════════════════════════════════════
+
+@migration(1, "dictionary_encoding")
+def _m001_dictionary_encoding(conn, ctx):
+    """servers/gmuds/cmdb_full/qualys_detections → <table>_data + dim_* + decoding views."""
+    from database import migrate_dictionary_encoding
+    if migrate_dictionary_encoding(conn, ctx.batch_size, ctx.heartbeat):
+        ctx.vacuum = True  # give the space of the plain tables back (the DB file lives on a network volume)
+
+
+@migration(2, "filter_values_backfill")
+def _m002_filter_values_backfill(conn, ctx):
+    """Build filter_values for databases imported before the table existed."""
+    from database import refresh_filter_values, FILTER_COLUMNS
+    for table in FILTER_COLUMNS:
+        refresh_filter_values(conn, table)
+    conn.commit()
+
+
+@migration(3, "data_generation")
+def _m003_data_generation(conn, ctx):
+    """Single-row stamp bumped by every import and GMUD/user write (see check_data_generation)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS data_generation (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO data_generation (id, generation) VALUES (1, 0)")
+    conn.commit()
+
+
+@migration(4, "gmud_typed_dates")
+def _m004_gmud_typed_dates(conn, ctx):
+    """Normalized start_at/end_at + date_parse_error on gmuds_data, indexed for date ranges."""
+    from database import normalize_gmud_dates, create_dimension_view
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(gmuds_data)")}
+    for name, decl in (("start_at", "TEXT"), ("end_at", "TEXT"),
+                       ("date_parse_error", "INTEGER NOT NULL DEFAULT 0")):
+        if name not in columns:
+            conn.execute(f"ALTER TABLE gmuds_data ADD COLUMN {name} {decl}")
+    create_dimension_view(conn, "gmuds")
+    conn.commit()
+    ctx.backfill_rows("gmuds_data", ["start_date", "end_date"],
+                      ["start_at", "end_at", "date_parse_error"],
+                      lambda row: normalize_gmud_dates(row[1], row[2]))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_gmuds_client_start ON gmuds_data(client_id, start_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_gmuds_start ON gmuds_data(start_at)")
+    conn.commit()
+
+
+@migration(5, "psu_compliance")
+def _m005_psu_compliance(conn, ctx):
+    """psu_targets + numeric (major, ru, revision) and compliance tier on the PSU tables."""
+    from database import create_dimension_view
+    from psu import PSU_TABLES, backfill_psu_columns, update_psu_compliance
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS psu_targets (
+            major INTEGER PRIMARY KEY,
+            target_ru INTEGER NOT NULL,
+            min_ru INTEGER NOT NULL,
+            label TEXT
+        )
+    """)
+    # 19.28+ atualizado, 19.26–19.27 desatualizado (as badges used before)
+    conn.execute("INSERT OR IGNORE INTO psu_targets (major, target_ru, min_ru, label) VALUES (19, 28, 26, '19.28')")
+    for table, (data_table, _version) in PSU_TABLES.items():
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({data_table})")}
+        for name, decl in (("psu_major", "INTEGER"), ("psu_ru", "INTEGER"),
+                           ("psu_revision", "INTEGER"), ("psu_tier", "TEXT")):
+            if name not in columns:
+                conn.execute(f"ALTER TABLE {data_table} ADD COLUMN {name} {decl}")
+        if data_table != table:
+            create_dimension_view(conn, table)
+    conn.commit()
+    for table in PSU_TABLES:
+        backfill_psu_columns(ctx, table)
+        data_table = PSU_TABLES[table][0]
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_psu_tier ON {data_table}(psu_tier)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_psu_sort "
+                     f"ON {data_table}(psu_major, psu_ru, psu_revision)")
+    update_psu_compliance(conn)
+    conn.commit()
+
+
+
+@migration(6, "gmud_cube")
+def _m006_gmud_cube(conn, ctx):
+    """Pre-aggregated GMUD counts per (year, month, client, db_type, environment, status, assigned_to)."""
+    from database import rebuild_gmud_cube
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS gmud_cube (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            client_id INTEGER NOT NULL,
+            db_type_id INTEGER NOT NULL,
+            environment_id INTEGER NOT NULL,
+            status_id INTEGER NOT NULL,
+            assigned_to_id INTEGER NOT NULL,
+            gmud_count INTEGER NOT NULL,
+            PRIMARY KEY (year, month, client_id, db_type_id, environment_id, status_id, assigned_to_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_gmud_cube_client ON gmud_cube(client_id, year, month)")
+    rebuild_gmud_cube(conn)
+    conn.commit()
+
+
+@migration(7, "qualys_aging_sla")
+def _m007_qualys_aging_sla(conn, ctx):
+    """qualys_sla_policy + typed dates, age, squad and SLA state on qualys_detections_data."""
+    from database import create_dimension_view
+    from vulns import backfill_detection_columns, update_sla_state
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS qualys_sla_policy (
+            severity INTEGER PRIMARY KEY,
+            sla_days INTEGER NOT NULL,
+            due_soon_days INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.executemany("INSERT OR IGNORE INTO qualys_sla_policy (severity, sla_days, due_soon_days) VALUES (?, ?, ?)",
+                     [(5, 15, 5), (4, 30, 7), (3, 90, 15), (2, 180, 30), (1, 365, 30)])
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(qualys_detections_data)")}
+    for name, decl in (("first_detected_at", "TEXT"), ("last_detected_at", "TEXT"), ("age_days", "INTEGER"),
+                       ("squad", "TEXT"), ("sla_due", "TEXT"), ("sla_state", "TEXT")):
+        if name not in columns:
+            conn.execute(f"ALTER TABLE qualys_detections_data ADD COLUMN {name} {decl}")
+    create_dimension_view(conn, "qualys_detections")
+    conn.commit()
+    backfill_detection_columns(ctx)
+    update_sla_state(conn)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_qualys_det_sla "
+                 "ON qualys_detections_data(sla_state, squad, age_days, asset_name)")
+    conn.commit()
+
+
+@migration(8, "host_vuln_summary")
+def _m008_host_vuln_summary(conn, ctx):
+    """Per-host and per-host-and-squad rollups of Qualys detections, indexed for the top-N."""
+    from vulns import rebuild_host_vuln_summary
+    counts = """
+            sev1 INTEGER NOT NULL DEFAULT 0,
+            sev2 INTEGER NOT NULL DEFAULT 0,
+            sev3 INTEGER NOT NULL DEFAULT 0,
+            sev4 INTEGER NOT NULL DEFAULT 0,
+            sev5 INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            max_severity INTEGER,
+            overdue INTEGER NOT NULL DEFAULT 0,
+            oldest_open TEXT"""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS host_vuln_summary (
+            host_key TEXT PRIMARY KEY,
+            asset_name TEXT,
+            client TEXT,
+            db_type TEXT,
+            environment TEXT,
+            cmdb_status TEXT,{counts}
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS host_vuln_squads (
+            host_key TEXT NOT NULL,
+            squad TEXT NOT NULL,
+            client TEXT,
+            asset_name TEXT,{counts},
+            PRIMARY KEY (host_key, squad)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_host_vuln_summary_top "
+                 "ON host_vuln_summary(client, sev5 DESC, sev4 DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_host_vuln_squads_top "
+                 "ON host_vuln_squads(squad, client, sev5 DESC, sev4 DESC)")
+    rebuild_host_vuln_summary(conn)
+    conn.commit()
+
+
+@migration(9, "qualys_host_index")
+def _m009_qualys_host_index(conn, ctx):
+    """Covering index on lower(asset_name) for the case-insensitive host join of get_vuln_aging."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_qualys_det_host "
+                 "ON qualys_detections_data(lower(asset_name), squad, sla_state, age_days, asset_name)")
+    conn.commit()
+
+
+
+@migration(10, "qualys_age_from_dates")
+def _m010_qualys_age_from_dates(conn, ctx):
+    """Blank AGE cells were stored as 0 (age_days 0): derive last - first for those rows."""
+    ctx.backfill_sql(
+        "qualys_detections_data",
+        "age_days = MAX(CAST(julianday(last_detected_at) - julianday(first_detected_at) AS INTEGER), 0)",
+        "(detection_age IS NULL OR detection_age IN (0, '0')) "
+        "AND first_detected_at IS NOT NULL AND last_detected_at IS NOT NULL")
+
+
+if __name__ == "__main__":
+    from storage import restore
+    restore()
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if command == "status":
+        conn = get_connection()
+        _ensure_tables(conn)
+        applied = {r[0]: r for r in conn.execute("SELECT version, name, applied_at, duration_ms FROM schema_version")}
+        conn.close()
+        print(f"💾 {DATABASE_PATH}")
+        for version, name, _fn in MIGRATIONS:
+            if version in applied:
+                row = applied[version]
+                print(f"  ✅ {version:03d} {name:<28} {row[2]}  ({row[3]} ms)")
+            else:
+                print(f"  ⏳ {version:03d} {name:<28} pendente")
+    elif command == "dry-run":
+        size_mb = os.path.getsize(DATABASE_PATH) / 1024 / 1024 if os.path.exists(DATABASE_PATH) else 0
+        print(f"💾 {DATABASE_PATH} ({size_mb:.1f} MB)")
+        results = dry_run()
+        if not results:
+            print("✅ Nenhuma migração pendente")
+        for version, name, seconds in results:
+            print(f"  ⏱️  {version:03d} {name:<28} {seconds:8.2f}s (em cópia local)")
+        if results:
+            print(f"  Total estimado: {sum(r[2] for r in results):.1f}s (o volume de rede tende a ser mais lento)")
+    elif command == "migrate":
+        # Through init_db so a brand-new database gets the baseline tables first
+        from database import init_db
+        init_db()
+        conn = get_connection()
+        print(f"✅ Schema na versão {current_version(conn)}")
+        conn.close()
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,106 @@
+"""
+ORAEX PSU Manager — Password Hashing
+Password hashing/verification on a small dedicated executor with a concurrency cap,
+so a burst of logins cannot occupy every gunicorn request thread.
+
+    python passwords.py [target_ms]   benchmark hash costs on this machine
+"""
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from config import PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash")
+# Running + waiting jobs; beyond this, callers are refused at once instead of
+# holding a request thread while they wait
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+
+
+class PasswordBusyError(Exception):
+    """Too many password operations in flight; the caller should retry later."""
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise PasswordBusyError("Muitos logins simultâneos, tente novamente em instantes")
+    try:
+        future = _executor.submit(fn, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _f: _slots.release())
+    return future.result()
+
+
+def hash_password(password, method=None):
+    """Hash a password with the configured method (runs on the password executor)."""
+    return _run(generate_password_hash, password, method or PASSWORD_HASH_METHOD)
+
+
+def verify_password(pw_hash, password):
+    """Check a password against its stored hash (runs on the password executor)."""
+    return _run(check_password_hash, pw_hash, password)
+
+
+def normalize_method(method):
+    """
+    Werkzeug method string with its defaults filled in, as written into hashes:
+    'scrypt' → 'scrypt:32768:8:1', 'pbkdf2:sha256' → 'pbkdf2:sha256:1000000'.
+    """
+    name, *args = method.split(":")
+    if name == "scrypt":
+        defaults = ["32768", "8", "1"]
+    elif name == "pbkdf2":
+        defaults = ["sha256", str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return method
+    return ":".join([name] + args + defaults[len(args):])
+
+
+_TARGET_METHOD = normalize_method(PASSWORD_HASH_METHOD)
+
+
+def needs_rehash(pw_hash):
+    """True when the stored hash was made with a different method/cost than configured."""
+    return normalize_method(pw_hash.split("$", 1)[0]) != _TARGET_METHOD
+
+
+# ── Benchmark ─────────────────────────────────────────────
+
+BENCHMARK_METHODS = [
+    "scrypt:16384:8:1", "scrypt:32768:8:1", "scrypt:65536:8:1",
+    "pbkdf2:sha256:300000", "pbkdf2:sha256:600000", "pbkdf2:sha256:1000000",
+]
+
+
+def benchmark(target_ms=250, rounds=3):
+    """
+    Time each candidate method. Returns a list of (method, ms per hash), and the
+    strongest method of each family that stays under target_ms.
+    """
+    results = []
+    for method in BENCHMARK_METHODS:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            generate_password_hash("benchmark-password", method)
+        results.append((method, (time.perf_counter() - start) * 1000 / rounds))
+
+    best = {}
+    for method, ms in results:
+        if ms <= target_ms:
+            best[method.split(":", 1)[0]] = method
+    return results, best
+
+
+if __name__ == "__main__":
+    target = float(sys.argv[1]) if len(sys.argv) > 1 else 250
+    results, best = benchmark(target)
+    print(f"🔐 Custo de hash (alvo {target:.0f} ms, {PASSWORD_HASH_WORKERS} workers):")
+    for method, ms in results:
+        mark = "  ← atual" if method == _TARGET_METHOD else ""
+        rate = PASSWORD_HASH_WORKERS * 1000 / ms
+        print(f"   {method:<24} {ms:8.1f} ms   ~{rate:5.1f} logins/s{mark}")
+    for family, method in best.items():
+        print(f"✅ Sugestão {family}: PASSWORD_HASH_METHOD={method}")
@@ -0,0 +1,120 @@
+"""
+ORAEX PSU Manager — PSU Versions & Compliance
+Parses the free-text PSU / DB versions of servers, cmdb_full and
+pagonxt_databases into an integer (major, ru, revision) triple stored next to
+the text, and derives a compliance tier from the psu_targets table:
+
+    current    ru >= target_ru for that major
+    supported  min_ru <= ru < target_ru
+    critical   ru < min_ru, or a major older than every configured one
+    unknown    major/RU not recognised (e.g. '19c'), or a major newer than the targets
+    NULL       no version
+
+    19.29 / 19.30.0.0 / 19.23.0.0.0   → (19, ru, revision)
+    12.1.0.2.210420                   → (12, 1, 210420)   release, then bundle date
+"""
+import re
+from database import get_connection, bump_data_generation
+
+# table → (data table written by the importers, version column as SQL over that table)
+PSU_TABLES = {
+    "servers": ("servers_data", "(SELECT value FROM dim_psu_version WHERE id = psu_version_id)"),
+    "cmdb_full": ("cmdb_full_data", "db_version"),
+    "pagonxt_databases": ("pagonxt_databases", "psu_version"),
+}
+
+_VERSION = re.compile(r"(\d+)((?:\.\d+)*)")
+
+
+def parse_psu_version(text):
+    """Free-text version → (major, ru, revision); ru/revision None when absent; None if no version."""
+    match = _VERSION.search((text or "").strip())
+    if not match:
+        return None
+    major = int(match.group(1))
+    parts = [int(p) for p in match.group(2).split(".")[1:]]
+    if major >= 18:
+        # 19.RU.RUR.0.0
+        ru = parts[0] if parts else None
+        revision = parts[1] if len(parts) > 1 else (0 if parts else None)
+    else:
+        # 12.R.0.V.YYMMDD: release, then the bundle patch date
+        ru = parts[0] if parts else None
+        revision = parts[3] if len(parts) > 3 else (0 if parts else None)
+    return major, ru, revision
+
+
+def psu_columns(text):
+    """(psu_major, psu_ru, psu_revision) for an INSERT; Nones when there is no version."""
+    return parse_psu_version(text) or (None, None, None)
+
+
+def format_target(major, ru):
+    return f"{major}.{ru}"
+
+
+# Tier of a data-table row from its stored triple and psu_targets
+_TIER_SQL = """
+    CASE
+        WHEN psu_major IS NULL THEN NULL
+        WHEN psu_ru IS NULL THEN 'unknown'
+        ELSE COALESCE(
+            (SELECT CASE WHEN psu_ru >= t.target_ru THEN 'current'
+                         WHEN psu_ru >= t.min_ru THEN 'supported'
+                         ELSE 'critical' END
+             FROM psu_targets t WHERE t.major = psu_major),
+            CASE WHEN psu_major < (SELECT MAX(major) FROM psu_targets) THEN 'critical' ELSE 'unknown' END)
+    END
+"""
+
+
+def update_psu_compliance(conn, table=None):
+    """Recompute psu_tier for one table (or all) from the stored triples. Doesn't commit."""
+    for name in ([table] if table else PSU_TABLES):
+        data_table = PSU_TABLES[name][0]
+        conn.execute(f"UPDATE {data_table} SET psu_tier = {_TIER_SQL}")
+
+
+def backfill_psu_columns(ctx, table):
+    """Parse the version text of existing rows into the triple columns (in migration batches)."""
+    data_table, version_sql = PSU_TABLES[table]
+    ctx.backfill_rows(data_table, [version_sql], ["psu_major", "psu_ru", "psu_revision"],
+                      lambda row: psu_columns(row[1]))
+
+
+def get_psu_targets():
+    conn = get_connection()
+    try:
+        return [dict(r) for r in conn.execute(
+            "SELECT major, target_ru, min_ru, label FROM psu_targets ORDER BY major DESC")]
+    finally:
+        conn.close()
+
+
+def set_psu_targets(targets):
+    """
+    Replace the target table and recompute every tier. targets: [{major, target_ru,
+    min_ru, label?}]. Raises ValueError on invalid entries.
+    """
+    rows = []
+    for t in targets:
+        try:
+            major, target_ru = int(t["major"]), int(t["target_ru"])
+            min_ru = int(t.get("min_ru", target_ru))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Cada alvo precisa de major, target_ru e min_ru numéricos")
+        if min_ru > target_ru:
+            raise ValueError(f"min_ru maior que target_ru para a versão {major}")
+        rows.append((major, target_ru, min_ru, t.get("label") or format_target(major, target_ru)))
+    if not rows:
+        raise ValueError("Informe ao menos uma versão alvo")
+
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM psu_targets")
+        conn.executemany("INSERT INTO psu_targets (major, target_ru, min_ru, label) VALUES (?, ?, ?, ?)", rows)
+        update_psu_compliance(conn)
+        bump_data_generation(conn)
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,189 @@
+"""
+ORAEX PSU Manager — SQL Query Profiler
+Aggregates statement timings by normalized SQL text. Statements slower than
+SLOW_QUERY_MS get their EXPLAIN QUERY PLAN captured (full table scans and temp
+B-trees are flagged) and are written to a bounded slow-query log.
+
+Fed by database.TimedCursor; viewable at /api/admin/queries or from the CLI:
+
+    python query_profiler.py                 profile the main query functions
+    python query_profiler.py --explain SQL   show the plan of a single statement
+"""
+import re
+import sys
+import time
+import sqlite3
+import threading
+from collections import deque
+from config import SLOW_QUERY_MS, SLOW_QUERY_LOG_SIZE
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+_lock = threading.Lock()
+_STATS = {}  # {normalized_sql: dict}
+_SLOW_LOG = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_NORMALIZED = {}  # raw sql -> normalized (dynamic queries repeat the same few shapes)
+_threshold_ms = SLOW_QUERY_MS
+
+
+def normalize_sql(sql):
+    """Collapse literals, IN lists and whitespace so equivalent statements aggregate together."""
+    cached = _NORMALIZED.get(sql)
+    if cached is not None:
+        return cached
+    text = _STRING_LITERAL.sub("?", sql)
+    text = _NUMBER_LITERAL.sub("?", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+    text = _IN_LIST.sub("IN (?...)", text)
+    if len(_NORMALIZED) < 5000:
+        _NORMALIZED[sql] = text
+    return text
+
+
+def set_threshold(ms):
+    """Change the slow-query threshold at runtime (the CLI uses 0 to explain everything)."""
+    global _threshold_ms
+    _threshold_ms = ms
+
+
+def explain(conn, sql, params=()):
+    """
+    Run EXPLAIN QUERY PLAN on conn. Returns (plan_lines, flags) where flags lists
+    'full_scan:<table>' and 'temp_btree:<purpose>' findings.
+    """
+    # Plain sqlite3 cursor: the explain itself must not be profiled
+    rows = sqlite3.Connection.cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    depth = {0: 0}
+    lines, flags = [], []
+    for row in rows:
+        node_id, parent, detail = row[0], row[1], row[3]
+        depth[node_id] = depth.get(parent, 0) + 1
+        lines.append("  " * (depth[node_id] - 1) + detail)
+        target = detail.split()[-1]
+        if detail.startswith("SCAN") and "USING" not in detail and target != "ROW" and not target.startswith("("):
+            flags.append("full_scan:" + target)
+        if "USE TEMP B-TREE" in detail:
+            flags.append("temp_btree:" + detail.split("FOR", 1)[-1].strip().lower())
+    return lines, flags
+
+
+def record(conn, sql, params, elapsed, cumulative, new_query):
+    """
+    Account one timed step of a statement.
+
+    Args:
+        elapsed: seconds spent in this step (execute or fetch).
+        cumulative: seconds spent by the statement so far, execute + fetches.
+        new_query: True for the execute step, False for subsequent fetches.
+        params: statement parameters, or None when the plan can't be explained
+                (executemany/executescript).
+    """
+    key = normalize_sql(sql)
+    threshold = _threshold_ms / 1000
+    # A statement counts as slow once: on the step that takes it over the threshold
+    crossed = cumulative >= threshold and (new_query or cumulative - elapsed < threshold)
+
+    with _lock:
+        stats = _STATS.get(key)
+        if stats is None:
+            stats = _STATS[key] = {"sql": key, "calls": 0, "total": 0.0, "max": 0.0,
+                                   "slow": 0, "plan": None, "flags": []}
+        if new_query:
+            stats["calls"] += 1
+        stats["total"] += elapsed
+        stats["max"] = max(stats["max"], cumulative)
+        need_plan = crossed and stats["plan"] is None
+        if crossed:
+            stats["slow"] += 1
+
+    if not crossed:
+        return
+
+    if need_plan and params is not None and key.split(" ", 1)[0].upper() in _EXPLAINABLE:
+        try:
+            plan, flags = explain(conn, sql, params)
+        except sqlite3.Error as e:
+            plan, flags = [f"(EXPLAIN falhou: {e})"], []
+        with _lock:
+            stats["plan"], stats["flags"] = plan, flags
+
+    _SLOW_LOG.append({
+        "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "ms": round(cumulative * 1000, 1),
+        "sql": key,
+        "flags": stats["flags"],
+    })
+    if _threshold_ms > 0:
+        print(f"🐢 Query lenta ({cumulative * 1000:.0f} ms): {key[:160]}")
+
+
+def get_report(limit=50):
+    """Per-statement stats sorted by total time, plus the recent slow-query log."""
+    with _lock:
+        rows = sorted(_STATS.values(), key=lambda s: s["total"], reverse=True)[:limit]
+        queries = [{
+            "sql": s["sql"],
+            "calls": s["calls"],
+            "total_ms": round(s["total"] * 1000, 2),
+            "avg_ms": round(s["total"] * 1000 / s["calls"], 2) if s["calls"] else 0,
+            "max_ms": round(s["max"] * 1000, 2),
+            "slow_calls": s["slow"],
+            "plan": s["plan"],
+            "flags": list(s["flags"]),
+        } for s in rows]
+        slow = list(_SLOW_LOG)
+    return {"threshold_ms": _threshold_ms, "queries": queries, "slow_log": slow}
+
+
+def reset():
+    """Drop all collected stats and the slow-query log."""
+    with _lock:
+        _STATS.clear()
+        _SLOW_LOG.clear()
+
+
+def _profile_main_queries():
+    """Run the app's main query functions once with every statement explained."""
+    import database
+    set_threshold(0)
+    runs = [
+        ("get_dashboard_stats", lambda: database.get_dashboard_stats()),
+        ("get_servers", lambda: database.get_servers(search="a")),
+        ("get_gmuds", lambda: database.get_gmuds(search="a")),
+        ("get_cmdb_databases", lambda: database.get_cmdb_databases(search="a")),
+        ("get_filter_options", lambda: database.get_filter_options()),
+        ("get_pagonxt_databases", lambda: database.get_pagonxt_databases(search="a")),
+        ("get_cmdb_full", lambda: database.get_cmdb_full(search="a")),
+        ("get_cmdb_full_stats", lambda: database.get_cmdb_full_stats()),
+        ("get_cmdb_full_filters", lambda: database.get_cmdb_full_filters()),
+        ("search_hostnames", lambda: database.search_hostnames("a")),
+    ]
+    for name, fn in runs:
+        start = time.perf_counter()
+        fn()
+        print(f"⏱️  {name:<24} {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    # Use the module instance database.py reports to, not this __main__ copy
+    import query_profiler as profiler
+    from database import get_connection
+
+    if len(sys.argv) > 2 and sys.argv[1] == "--explain":
+        plan, flags = profiler.explain(get_connection(), sys.argv[2])
+        print("\n".join(plan))
+        for flag in flags:
+            print(f"⚠️  {flag}")
+        sys.exit(0)
+
+    profiler._profile_main_queries()
+    print()
+    for q in profiler.get_report(limit=100)["queries"]:
+        marks = "  ⚠️ " + ", ".join(q["flags"]) if q["flags"] else ""
+        print(f"{q['total_ms']:9.2f} ms  {q['calls']:4}x  {q['sql'][:140]}{marks}")
+        for line in q["plan"] or []:
+            print(f"{'':22}{line}")
@@ -0,0 +1,224 @@
+"""
+ORAEX PSU Manager — Report Widgets
+One function per dashboard / reports chart, returning exactly the series it
+draws (already filtered, sorted, sliced and with percentages), served by
+/api/reports/<widget>. Results are cached per (widget, client, params) and
+dropped whenever the data generation moves.
+"""
+import threading
+from database import get_connection, register_cache, query_gmud_cube
+
+MONTH_LABELS = ["", "Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+TEAM_TOP_MAX = 50
+
+# name → (function, {param: (converter, default)})
+WIDGETS = {}
+
+
+def widget(name, **params):
+    """
+    Register fn(conn, client, **params) as the /api/reports/<name> widget.
+    Each param is (converter, default); a converter raising ValueError falls
+    back to the default, so cache keys only ever hold valid values.
+    """
+    def register(fn):
+        WIDGETS[name] = (fn, params)
+        return fn
+    return register
+
+
+def _choice(*options):
+    def convert(value):
+        if value not in options:
+            raise ValueError(value)
+        return value
+    return convert
+
+
+def _top_n(value):
+    return max(1, min(int(value), TEAM_TOP_MAX))
+
+
+def _pct(part, total):
+    return round(part / total * 100) if total else 0
+
+
+def _client_sql(client, prefix="AND"):
+    return (f" {prefix} client = ?", [client]) if client else ("", [])
+
+
+def _total_servers(conn, client):
+    # servers is the GetNet inventory
+    if client == "PagoNxt":
+        return 0
+    return conn.execute("SELECT COALESCE(SUM(total_servers), 0) FROM servers").fetchone()[0]
+
+
+def _cmdb_full_counts(conn, client, column):
+    where, params = _client_sql(client)
+    return [dict(r) for r in conn.execute(f"""
+        SELECT {column}, COUNT(*) as cnt
+        FROM cmdb_full
+        WHERE {column} IS NOT NULL AND {column} != '' {where}
+        GROUP BY {column}
+        ORDER BY cnt DESC
+    """, params)]
+
+
+def _gmud_filter(client):
+    return {"client": client} if client else {}
+
+
+# ── Widgets ───────────────────────────────────────────────
+
+@widget("summary")
+def summary(conn, client):
+    """KPI cards of the dashboard and the stats row of the reports page."""
+    total_servers = _total_servers(conn, client)
+    tiers = {r[0]: r[1] for r in conn.execute("""
+        SELECT psu_tier, SUM(total_servers) FROM servers WHERE psu_tier IS NOT NULL GROUP BY psu_tier
+    """)}
+    current = tiers.get("current", 0)
+    pending = sum(n for tier, n in tiers.items() if tier != "current")
+    target = conn.execute("SELECT label FROM psu_targets ORDER BY major DESC LIMIT 1").fetchone()
+
+    gmud_status = query_gmud_cube(conn, ["status"], _gmud_filter(client))
+    cmdb_types = _cmdb_full_counts(conn, client, "db_type")
+    where, params = _client_sql(client, "WHERE")
+    return {
+        "total_servers": total_servers,
+        "with_standby": conn.execute("SELECT COUNT(*) FROM servers WHERE has_standby = 1").fetchone()[0],
+        "standalone": conn.execute("SELECT COUNT(*) FROM servers WHERE has_standby = 0").fetchone()[0],
+        "total_ggs": conn.execute("SELECT COUNT(*) FROM servers WHERE has_ggs = 1").fetchone()[0],
+        "psu_current": current,
+        "psu_current_pct": _pct(current, total_servers),
+        "psu_pending": pending,
+        "psu_pending_pct": _pct(pending, total_servers),
+        "psu_target": f"{target['label']}+" if target else None,
+        "total_gmuds": sum(r["cnt"] for r in gmud_status),
+        "gmuds_closed": sum(r["cnt"] for r in gmud_status if "ENCERRADA" in (r["status"] or "").upper()),
+        "total_cmdb": conn.execute("SELECT COUNT(*) FROM cmdb_databases").fetchone()[0],
+        "total_cmdb_full": conn.execute(f"SELECT COUNT(*) FROM cmdb_full{where}", params).fetchone()[0],
+        "cmdb_oracle": next((t["cnt"] for t in cmdb_types if t["db_type"] == "Oracle"), 0),
+        "cmdb_technologies": len(cmdb_types),
+    }
+
+
+@widget("psu-distribution", sort=(_choice("version", "count"), "version"))
+def psu_distribution(conn, client, sort):
+    """Servers per PSU version with tier and share of all servers (sort=version|count)."""
+    total = _total_servers(conn, client)
+    rows = [dict(r, pct=_pct(r["cnt"], total)) for r in conn.execute("""
+        SELECT psu_version AS version, psu_tier AS tier, SUM(total_servers) AS cnt
+        FROM servers
+        WHERE psu_version IS NOT NULL AND psu_version != ''
+        GROUP BY psu_version
+        ORDER BY MAX(psu_major), MAX(psu_ru), MAX(psu_revision), psu_version
+    """)]
+    if sort == "count":
+        rows.sort(key=lambda r: -r["cnt"])
+    return {"total": total, "rows": rows}
+
+
+@widget("servers-by-env")
+def servers_by_env(conn, client):
+    total = _total_servers(conn, client)
+    rows = conn.execute("""
+        SELECT environment, SUM(total_servers) AS cnt
+        FROM servers
+        WHERE environment IS NOT NULL AND environment != ''
+        GROUP BY environment
+        ORDER BY cnt DESC
+    """).fetchall()
+    return {"total": total, "rows": [dict(r, pct=_pct(r["cnt"], total)) for r in rows]}
+
+
+@widget("gmud-status")
+def gmud_status(conn, client):
+    rows = query_gmud_cube(conn, ["status"], _gmud_filter(client), order_by_count=True)
+    return {"rows": [r for r in rows if (r["status"] or "").strip()]}
+
+
+@widget("gmud-monthly")
+def gmud_monthly(conn, client):
+    rows = query_gmud_cube(conn, ["year", "month"], _gmud_filter(client))
+    return {
+        "labels": [f"{MONTH_LABELS[r['month'] or 0]}/{str(r['year'] or '')[-2:]}" for r in rows],
+        "values": [r["cnt"] for r in rows],
+    }
+
+
+@widget("team-top", n=(_top_n, 10))
+def team_top(conn, client, n):
+    """Top n GMUD assignees, with the bar width relative to the first one."""
+    rows = [r for r in query_gmud_cube(conn, ["assigned_to"], _gmud_filter(client), order_by_count=True)
+            if (r["assigned_to"] or "").strip()][:n]
+    top = rows[0]["cnt"] if rows else 0
+    return {"rows": [dict(r, pct=_pct(r["cnt"], top)) for r in rows]}
+
+
+@widget("cmdb-by-type")
+def cmdb_by_type(conn, client):
+    return {"rows": _cmdb_full_counts(conn, client, "db_type")}
+
+
+@widget("cmdb-by-status")
+def cmdb_by_status(conn, client):
+    return {"rows": _cmdb_full_counts(conn, client, "status")}
+
+
+@widget("cmdb-by-env")
+def cmdb_by_env(conn, client):
+    return {"rows": _cmdb_full_counts(conn, client, "environment")}
+
+
+@widget("last-import")
+def last_import(conn, client):
+    row = conn.execute("SELECT * FROM import_log ORDER BY imported_at DESC LIMIT 1").fetchone()
+    return {"last_import": dict(row) if row else None}
+
+
+# ── Cache (dropped whenever the data generation moves) ────
+
+_RESULTS = {}
+_RESULTS_MAX = 512  # client comes from the query string for unrestricted users
+_results_lock = threading.Lock()
+_results_generation = 0  # bumped on every clear; a result computed across a clear is not stored
+
+
+@register_cache
+def _clear_results():
+    global _results_generation
+    with _results_lock:
+        _results_generation += 1
+        _RESULTS.clear()
+
+
+def get_widget(name, client=None, args=None):
+    """
+    Shaped data of one widget for a client (None = all), cached per
+    (widget, client, params). Raises KeyError for an unknown widget.
+    """
+    fn, declared = WIDGETS[name]
+    args = args or {}
+    params = {}
+    for param, (convert, default) in declared.items():
+        try:
+            params[param] = convert(args.get(param, default))
+        except (TypeError, ValueError):
+            params[param] = default
+    key = (name, client, tuple(sorted(params.items())))
+    result = _RESULTS.get(key)
+    if result is None:
+        generation = _results_generation
+        conn = get_connection()
+        try:
+            result = fn(conn, client, **params)
+        finally:
+            conn.close()
+        with _results_lock:
+            if generation == _results_generation:
+                if len(_RESULTS) >= _RESULTS_MAX:
+                    _RESULTS.clear()
+                _RESULTS[key] = result
+    return result
@@ -24,7 +24,17 @@ const API = {
         return resp.json();
     },
 
+    // Several GET /api/* reads in one round trip (/api/batch); resolves to the bodies, in order
+    async batch(paths, parallel = false) {
+        const data = await API.post('/api/batch', { requests: paths, parallel });
+        return data.responses.map(r => {
+            if (r.status >= 400) throw new Error(`API error: ${r.status} (${r.path})`);
+            return r.body;
+        });
+    },
+
     dashboard: (client = 'Todos') => API.get('/api/dashboard?client=' + encodeURIComponent(client)),
+    report: (name, params = {}) => API.get(`/api/reports/${name}?` + new URLSearchParams(params)),
     servers: (params) => API.get('/api/servers?' + new URLSearchParams(params)),
     gmuds: (params) => API.get('/api/gmuds?' + new URLSearchParams(params)),
     cmdb: (params) => API.get('/api/cmdb?' + new URLSearchParams(params)),
@@ -125,16 +135,24 @@ function getEnvBadge(env) {
 }
 
 
-function getPsuBadge(version) {
+// psu_tier (computed server-side from psu_targets) → badge class
+const PSU_TIER_CLASS = { current: 'latest', supported: 'outdated', critical: 'critical', unknown: 'outdated' };
+
+function getPsuBadge(version, tier) {
     if (!version) return '—';
-    let cls = 'outdated';
-    // 19.30 and 19.29 are latest
-    if (version.includes('19.30') || version.includes('19.29') || version.includes('19.28')) cls = 'latest';
-    else if (version.includes('19.27') || version.includes('19.26')) cls = 'outdated';
-    else cls = 'critical';
+    const cls = PSU_TIER_CLASS[tier] || 'outdated';
     return `<span class="psu-badge ${cls}">${version}</span>`;
 }
 
+// Load report widgets in parallel: [[name, params, render], ...]; one failing widget doesn't block the others
+function loadReportWidgets(widgets, page) {
+    return Promise.all(widgets.map(([name, params, render]) =>
+        API.report(name, params).then(render).catch(e => {
+            console.error(`Widget ${name} error:`, e);
+            showToast(`Erro ao carregar ${page}: ` + e.message, 'error');
+        })));
+}
+
 
 function createPagination(data, onPageClick) {
     const { page, pages, total } = data;
@@ -240,7 +258,7 @@ async function triggerImport() {
 
 async function loadLastUpdate() {
     try {
-        const data = await API.dashboard();
+        const data = await API.report('last-import');
         const el = document.querySelector('#lastUpdate span');
         if (data.last_import) {
             el.textContent = 'Última importação: ' + formatDateTime(data.last_import.imported_at);
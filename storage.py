@@ -0,0 +1,231 @@
+"""
+ORAEX PSU Manager — Database Storage
+Local working copy of the SQLite database (DB_STORAGE_MODE=local).
+
+On Cloud Run DATABASE_PATH lives on a gcsfuse volume, where every page read,
+the WAL and the shm file go through FUSE to object storage. In local mode the
+database is restored into LOCAL_DATABASE_PATH at startup and every query runs
+there; consistent snapshots (SQLite online backup API) are copied back to the
+volume after writes, every DB_CHECKPOINT_INTERVAL seconds and at shutdown.
+
+<DATABASE_PATH>.generation records the generation of the last snapshot. An
+instance only overwrites the volume copy while it is still at the generation
+it restored or last wrote; if another instance checkpointed in between, a clean
+local copy is refreshed from the volume and a modified one is marked stale.
+A stale copy refuses further writes (writable() → 503 in app.py): they could
+never reach the volume.
+"""
+import os
+import json
+import time
+import atexit
+import socket
+import shutil
+import sqlite3
+import threading
+from config import (
+    DB_STORAGE_MODE, DURABLE_DATABASE_PATH, LOCAL_DATABASE_PATH,
+    DB_CHECKPOINT_INTERVAL, DB_CHECKPOINT_DELAY
+)
+
+MARKER_PATH = DURABLE_DATABASE_PATH + ".generation"
+
+_lock = threading.RLock()  # serializes restore / checkpoint / refresh
+_wakeup = threading.Event()
+_monitor = None  # connection used only for PRAGMA data_version
+_state = {
+    "restored": False,
+    "generation": 0,
+    "data_version": None,
+    "checkpoints": 0,
+    "last_checkpoint": None,
+    "last_duration_ms": None,
+    "stale": False,
+    "last_error": None,
+}
+
+
+def is_local():
+    return DB_STORAGE_MODE == "local"
+
+
+def _read_marker():
+    try:
+        with open(MARKER_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"generation": 0}
+
+
+def _write_marker(generation):
+    tmp = MARKER_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "generation": generation,
+            "checkpointed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "instance": socket.gethostname(),
+        }, f)
+    os.replace(tmp, MARKER_PATH)
+
+
+def _copy_database(src_path, dst_path, journal_mode=None):
+    """Online backup src → dst: a consistent copy even while src is being written."""
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(dst_path)
+    try:
+        src.backup(dst)
+        if journal_mode:
+            dst.execute(f"PRAGMA journal_mode={journal_mode}")
+    finally:
+        src.close()
+        dst.close()
+
+
+def _data_version():
+    """Changes whenever another connection commits to the local copy."""
+    return _monitor.execute("PRAGMA data_version").fetchone()[0]
+
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+# ── Restore / checkpoint ──────────────────────────────────
+
+def restore():
+    """Copy the volume database into the local working copy (once per process)."""
+    global _monitor
+    if not is_local():
+        return
+    with _lock:
+        if _state["restored"]:
+            return
+        os.makedirs(os.path.dirname(LOCAL_DATABASE_PATH) or ".", exist_ok=True)
+        for suffix in ("", "-wal", "-shm"):
+            _remove(LOCAL_DATABASE_PATH + suffix)
+
+        if os.path.exists(DURABLE_DATABASE_PATH):
+            start = time.perf_counter()
+            _copy_database(DURABLE_DATABASE_PATH, LOCAL_DATABASE_PATH, journal_mode="WAL")
+            size_mb = os.path.getsize(LOCAL_DATABASE_PATH) / 1024 / 1024
+            print(f"💾 Banco copiado do volume para {LOCAL_DATABASE_PATH} "
+                  f"({size_mb:.1f} MB, {time.perf_counter() - start:.1f}s)")
+
+        _monitor = sqlite3.connect(LOCAL_DATABASE_PATH, check_same_thread=False)
+        _state.update(restored=True, generation=_read_marker().get("generation", 0),
+                      data_version=_data_version())
+        threading.Thread(target=_checkpoint_loop, name="db-checkpoint", daemon=True).start()
+        atexit.register(checkpoint)
+
+
+def _refresh():
+    """The volume is newer and nothing changed locally: reload the local copy from it."""
+    marker = _read_marker()
+    _copy_database(DURABLE_DATABASE_PATH, LOCAL_DATABASE_PATH, journal_mode="WAL")
+    _state.update(generation=marker.get("generation", 0), data_version=_data_version(), stale=False)
+    print(f"🔄 Cópia local atualizada do volume (geração {_state['generation']})")
+
+
+def _behind_volume(remote):
+    """
+    Another instance wrote a newer generation: refresh a clean local copy, or
+    mark a modified one stale. Returns True when the copy is (now) stale.
+    Caller holds _lock.
+    """
+    if remote <= _state["generation"]:
+        return False
+    if _data_version() == _state["data_version"]:
+        _refresh()
+        return False
+    if not _state["stale"]:
+        _state["stale"] = True
+        print(f"⚠️  Cópia local divergiu: volume na geração {remote}, "
+              f"cópia local derivada da geração {_state['generation']} — escritas bloqueadas")
+    return True
+
+
+def writable():
+    """
+    False once the local copy is stale (checked before every write request).
+    Catches up with a newer volume generation first when nothing changed locally.
+    """
+    if not is_local() or not _state["restored"]:
+        return True
+    with _lock:
+        if not _state["stale"]:
+            _behind_volume(_read_marker().get("generation", 0))
+        return not _state["stale"]
+
+
+def checkpoint(force=False):
+    """
+    Write a snapshot of the local copy to the volume if it changed (or force).
+    Returns True when a new generation was written.
+    """
+    if not is_local() or not _state["restored"]:
+        return False
+    with _lock:
+        remote = _read_marker().get("generation", 0)
+        if _state["stale"] or remote > _state["generation"]:
+            _behind_volume(remote)
+            return False
+        version = _data_version()
+        if version == _state["data_version"] and not force:
+            return False
+
+        start = time.perf_counter()
+        snapshot = LOCAL_DATABASE_PATH + ".snapshot"
+        staging = DURABLE_DATABASE_PATH + ".tmp"
+        try:
+            _remove(snapshot)
+            _copy_database(LOCAL_DATABASE_PATH, snapshot, journal_mode="DELETE")
+            shutil.copyfile(snapshot, staging)
+            # WAL/shm left over from direct mode would be replayed onto the new file
+            _remove(DURABLE_DATABASE_PATH + "-wal")
+            _remove(DURABLE_DATABASE_PATH + "-shm")
+            os.replace(staging, DURABLE_DATABASE_PATH)
+            _write_marker(_state["generation"] + 1)
+        except OSError as e:
+            _state["last_error"] = str(e)
+            print(f"❌ Checkpoint do banco falhou: {e}")
+            return False
+        finally:
+            _remove(snapshot)
+
+        _state["generation"] += 1
+        _state.update(data_version=version, checkpoints=_state["checkpoints"] + 1,
+                      last_checkpoint=time.strftime("%Y-%m-%d %H:%M:%S"),
+                      last_duration_ms=round((time.perf_counter() - start) * 1000, 1),
+                      stale=False, last_error=None)
+        return True
+
+
+def checkpoint_soon():
+    """Ask for a checkpoint after the current burst of writes (DB_CHECKPOINT_DELAY)."""
+    if is_local():
+        _wakeup.set()
+
+
+def _checkpoint_loop():
+    while True:
+        if _wakeup.wait(DB_CHECKPOINT_INTERVAL):
+            time.sleep(DB_CHECKPOINT_DELAY)
+            _wakeup.clear()
+        try:
+            checkpoint()
+        except Exception as e:
+            _state["last_error"] = str(e)
+            print(f"❌ Checkpoint do banco falhou: {e}")
+
+
+def get_status():
+    """Storage mode, paths and checkpoint state (for /api/admin/storage)."""
+    status = {"mode": DB_STORAGE_MODE, "durable_path": DURABLE_DATABASE_PATH}
+    if is_local():
+        with _lock:
+            status.update({k: v for k, v in _state.items() if k != "data_version"})
+            status["local_path"] = LOCAL_DATABASE_PATH
+            status["volume_generation"] = _read_marker().get("generation", 0)
+            status["dirty"] = _state["restored"] and _data_version() != _state["data_version"]
+    return status
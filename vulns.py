@@ -0,0 +1,364 @@
+"""
+ORAEX PSU Manager — Vulnerability Aging & SLA
+The Qualys importer keeps first/last detection, age and overdue exactly as the
+workbook has them; this module adds typed columns next to them on
+qualys_detections_data:
+
+    first_detected_at / last_detected_at   'YYYY-MM-DD' (None if unparseable)
+    age_days                               Detection AGE, or last - first when missing
+    squad                                  owning squad, classified from the title
+    sla_due / sla_state                    from qualys_sla_policy by severity
+
+sla_state is measured at the last scan that saw the detection (last_detected_at):
+
+    overdue    last_detected_at > sla_due
+    due-soon   within due_soon_days of sla_due
+    ok         before that
+    NULL       fixed, no severity policy or no first detection date
+
+host_vuln_summary rolls detections up per host (lower-cased asset name) with
+the host's cmdb_full attributes, and host_vuln_squads per host and squad, so
+the stats top-N, the host drill-down and the server page read counts without
+touching raw detections. Both are rebuilt by the Qualys and CMDB Full importers.
+"""
+import re
+from database import get_connection, bump_data_generation, parse_gmud_datetime
+
+# (squad, title pattern), first match wins; anything else is "SO / Infra"
+SQUAD_RULES = (
+    ("DBA", re.compile(r"\b(oracle|sql server|mysql|postgresql|mongodb|mariadb|db2|sybase)\b")),
+    ("Middleware", re.compile(r"\b(weblogic|tomcat|apache|nginx|java|iis|jboss|php|nodejs)\b")),
+    ("Segurança / Crypto", re.compile(r"\b(ssh|ssl|tls|cipher|certificate|openssh|ssl/tls)\b")),
+    ("Patch Manager", re.compile(r"\b(windows update|kb[0-9]{6,}|kernel|centos|red hat|ubuntu|debian|suse)\b")),
+    ("Desenvolvimento", re.compile(r"\b(custom|application|code|script)\b")),
+)
+DEFAULT_SQUAD = "SO / Infra"
+
+# Age histogram: (upper bound in days, label); None = open-ended
+AGE_BUCKETS = ((30, "0-30"), (60, "31-60"), (90, "61-90"), (180, "91-180"), (365, "181-365"), (None, "365+"))
+SLA_STATES = ("ok", "due-soon", "overdue")
+
+_AGE = re.compile(r"-?\d+")
+
+
+def classify_squad(title):
+    title = str(title or "").lower()
+    for squad, pattern in SQUAD_RULES:
+        if pattern.search(title):
+            return squad
+    return DEFAULT_SQUAD
+
+
+def parse_detection_date(value):
+    """Workbook date (datetime or text) → 'YYYY-MM-DD'; None when empty or unparseable."""
+    try:
+        parsed = parse_gmud_datetime(None if value in (None, "None") else value)
+    except ValueError:
+        return None
+    return parsed.strftime("%Y-%m-%d") if parsed else None
+
+
+def detection_columns(first_detected, last_detected, detection_age, title):
+    """(first_detected_at, last_detected_at, age_days, squad) for an INSERT or a backfill."""
+    first, last = parse_detection_date(first_detected), parse_detection_date(last_detected)
+    match = _AGE.search(str(detection_age)) if detection_age not in (None, "") else None
+    if match:
+        age = max(int(match.group()), 0)
+    elif first and last:
+        age = max((parse_gmud_datetime(last) - parse_gmud_datetime(first)).days, 0)
+    else:
+        age = None
+    return first, last, age, classify_squad(title)
+
+
+def age_bucket_sql(column="age_days"):
+    """CASE expression mapping an age in days to its AGE_BUCKETS label."""
+    whens = " ".join(f"WHEN {column} <= {upper} THEN '{label}'" for upper, label in AGE_BUCKETS if upper is not None)
+    return f"CASE WHEN {column} IS NULL THEN NULL {whens} ELSE '{AGE_BUCKETS[-1][1]}' END"
+
+
+# Policy row of a data-table row, by the severity of its QID
+_POLICY_SQL = """
+    (SELECT {column} FROM qualys_sla_policy p
+     JOIN qualys_vulnerabilities v ON p.severity = CAST(v.severity AS INTEGER)
+     WHERE v.qid = qualys_detections_data.qid)
+"""
+
+_SLA_STATE_SQL = f"""
+    CASE
+        WHEN sla_due IS NULL THEN NULL
+        WHEN COALESCE(last_detected_at, date('now')) > sla_due THEN 'overdue'
+        WHEN COALESCE(last_detected_at, date('now'))
+             >= date(sla_due, '-' || {_POLICY_SQL.format(column="due_soon_days")} || ' days') THEN 'due-soon'
+        ELSE 'ok'
+    END
+"""
+
+
+def update_sla_state(conn):
+    """Recompute sla_due and sla_state of every detection from the policy table. Doesn't commit."""
+    conn.execute(f"""
+        UPDATE qualys_detections_data SET sla_due = CASE
+            WHEN first_detected_at IS NULL
+                 OR status_id IN (SELECT id FROM dim_status WHERE lower(value) = 'fixed') THEN NULL
+            ELSE date(first_detected_at, '+' || {_POLICY_SQL.format(column="sla_days")} || ' days')
+        END
+    """)
+    conn.execute(f"UPDATE qualys_detections_data SET sla_state = {_SLA_STATE_SQL}")
+
+
+def backfill_detection_columns(ctx):
+    """Parse the workbook text of existing detections into the typed columns (in migration batches)."""
+    def compute(row):
+        # Older imports stored a blank AGE cell as 0: with both dates, derive it instead
+        age = None if row[3] in (0, "0") and row[1] and row[2] else row[3]
+        return detection_columns(row[1], row[2], age, row[4])
+
+    ctx.backfill_rows(
+        "qualys_detections_data",
+        ["first_detected", "last_detected", "detection_age",
+         "(SELECT title FROM qualys_vulnerabilities v WHERE v.qid = qualys_detections_data.qid)"],
+        ["first_detected_at", "last_detected_at", "age_days", "squad"],
+        compute)
+
+
+def get_sla_policy():
+    conn = get_connection()
+    try:
+        return [dict(r) for r in conn.execute(
+            "SELECT severity, sla_days, due_soon_days FROM qualys_sla_policy ORDER BY severity DESC")]
+    finally:
+        conn.close()
+
+
+def set_sla_policy(policy):
+    """
+    Replace the SLA policy and recompute every sla_state. policy: [{severity,
+    sla_days, due_soon_days?}]. Raises ValueError on invalid entries.
+    """
+    rows = []
+    for p in policy:
+        try:
+            severity, sla_days = int(p["severity"]), int(p["sla_days"])
+            due_soon = int(p.get("due_soon_days", 0))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Cada severidade precisa de severity, sla_days e due_soon_days numéricos")
+        if not 1 <= severity <= 5 or sla_days < 0 or not 0 <= due_soon <= sla_days:
+            raise ValueError(f"Prazos inválidos para a severidade {severity}")
+        rows.append((severity, sla_days, due_soon))
+    if not rows:
+        raise ValueError("Informe ao menos uma severidade")
+
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM qualys_sla_policy")
+        conn.executemany("INSERT INTO qualys_sla_policy (severity, sla_days, due_soon_days) VALUES (?, ?, ?)", rows)
+        update_sla_state(conn)
+        bump_data_generation(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_vuln_aging(client=None, squad=None):
+    """
+    Age histograms (AGE_BUCKETS) and SLA states per squad and per client, for
+    detections on hosts in cmdb_full — the same scope as /api/vulnerabilities.
+    """
+    host_where, params = "", []
+    if client:
+        host_where, params = " AND client = ?", [client]
+    squad_where = ""
+    if squad:
+        squad_where = " AND d.squad = ?"
+        params.append(squad)
+
+    conn = get_connection()
+    try:
+        rows = conn.execute(f"""
+            WITH hosts AS (
+                SELECT lower(hostname) AS host, MAX(client) AS client
+                FROM cmdb_full
+                WHERE hostname IS NOT NULL AND hostname != ''{host_where}
+                GROUP BY lower(hostname)
+            )
+            SELECT d.squad, h.client, {age_bucket_sql("d.age_days")} AS bucket, d.sla_state, COUNT(*) AS cnt
+            FROM qualys_detections_data d
+            JOIN hosts h ON h.host = lower(d.asset_name)  -- idx_qualys_det_host
+            WHERE d.age_days IS NOT NULL{squad_where}
+            GROUP BY d.squad, h.client, bucket, d.sla_state
+        """, params).fetchall()
+    finally:
+        conn.close()
+
+    labels = [label for _upper, label in AGE_BUCKETS]
+    groups = {"squad": {}, "client": {}}
+    sla = dict.fromkeys(SLA_STATES, 0)
+    for row in rows:
+        for key, entries in groups.items():
+            name = row[key] or "N/A"
+            entry = entries.get(name)
+            if entry is None:
+                entry = entries[name] = {key: name, "total": 0, "buckets": dict.fromkeys(labels, 0),
+                                         **dict.fromkeys(SLA_STATES, 0)}
+            entry["total"] += row["cnt"]
+            entry["buckets"][row["bucket"]] += row["cnt"]
+            if row["sla_state"]:
+                entry[row["sla_state"]] += row["cnt"]
+        if row["sla_state"]:
+            sla[row["sla_state"]] += row["cnt"]
+
+    def ordered(entries):
+        result = sorted(entries.values(), key=lambda e: -e["total"])
+        for entry in result:
+            entry["buckets"] = [entry["buckets"][label] for label in labels]
+        return result
+
+    return {"buckets": labels, "sla": sla,
+            "by_squad": ordered(groups["squad"]), "by_client": ordered(groups["client"])}
+
+
+# ── Per-host rollup ───────────────────────────────────────
+
+SEVERITIES = (5, 4, 3, 2, 1)
+_SEV_COLUMNS = ", ".join(f"sev{n}" for n in range(1, 6))
+
+# One cmdb_full row per host (the last one, as the old per-request dicts did)
+_CMDB_HOSTS_SQL = """
+    SELECT lower(hostname) AS host_key, client, db_type, environment, status, MAX(id)
+    FROM cmdb_full
+    WHERE hostname IS NOT NULL AND hostname != ''
+    GROUP BY lower(hostname)
+"""
+
+
+def rebuild_host_vuln_summary(conn):
+    """
+    Refill host_vuln_squads (the squad mix: one row per host and squad) and
+    host_vuln_summary (one row per host) from qualys_detections and cmdb_full.
+    Hosts not in cmdb_full keep a NULL client. Doesn't commit.
+    """
+    sev_sums = ", ".join(f"SUM(sev = {n})" for n in range(1, 6))
+    conn.execute("DELETE FROM host_vuln_squads")
+    conn.execute("DELETE FROM host_vuln_summary")
+    conn.execute(f"""
+        INSERT INTO host_vuln_squads (
+            host_key, squad, client, asset_name, {_SEV_COLUMNS}, total, max_severity, overdue, oldest_open
+        )
+        WITH detections AS (
+            SELECT lower(d.asset_name) AS host_key, d.asset_name, COALESCE(d.squad, '{DEFAULT_SQUAD}') AS squad,
+                   CAST(v.severity AS INTEGER) AS sev, d.sla_state,
+                   CASE WHEN d.status_id IN (SELECT id FROM dim_status WHERE lower(value) = 'fixed')
+                        THEN NULL ELSE d.first_detected_at END AS open_since
+            FROM qualys_detections_data d
+            JOIN qualys_vulnerabilities v ON v.qid = d.qid
+            WHERE d.asset_name IS NOT NULL AND d.asset_name != ''
+        ),
+        hosts AS ({_CMDB_HOSTS_SQL})
+        SELECT d.host_key, d.squad, h.client, MAX(d.asset_name), {sev_sums}, COUNT(*),
+               MAX(d.sev), SUM(d.sla_state = 'overdue'), MIN(d.open_since)
+        FROM detections d
+        LEFT JOIN hosts h ON h.host_key = d.host_key
+        GROUP BY d.host_key, d.squad
+    """)
+    conn.execute(f"""
+        INSERT INTO host_vuln_summary (
+            host_key, asset_name, client, db_type, environment, cmdb_status,
+            {_SEV_COLUMNS}, total, max_severity, overdue, oldest_open
+        )
+        WITH hosts AS ({_CMDB_HOSTS_SQL})
+        SELECT q.host_key, MAX(q.asset_name), h.client, h.db_type, h.environment, h.status,
+               {", ".join(f"SUM(q.sev{n})" for n in range(1, 6))}, SUM(q.total),
+               MAX(q.max_severity), SUM(q.overdue), MIN(q.oldest_open)
+        FROM host_vuln_squads q
+        LEFT JOIN hosts h ON h.host_key = q.host_key
+        GROUP BY q.host_key
+    """)
+
+
+def _squad_mix(conn, host_keys):
+    """{host_key: {squad: [sev1, ..., sev5]}} for the given hosts."""
+    placeholders = ", ".join("?" * len(host_keys))
+    mix = {}
+    for row in conn.execute(f"SELECT host_key, squad, {_SEV_COLUMNS} FROM host_vuln_squads "
+                            f"WHERE host_key IN ({placeholders})", list(host_keys)):
+        mix.setdefault(row[0], {})[row[1]] = list(row[2:])
+    return mix
+
+
+def _top_squad(mix):
+    """Squad with the most severity 4/5 detections (then the most detections)."""
+    return max(mix.items(), key=lambda item: (item[1][3] + item[1][4], sum(item[1])), default=(None, None))[0]
+
+
+def get_vuln_stats(client=None, squad=None, top_n=10):
+    """
+    /api/vulnerabilities/stats from the rollup tables (hosts in cmdb_full only).
+    The top-N walks the (client, sev5, sev4) index of host_vuln_summary, or the
+    (squad, client, sev5, sev4) one of host_vuln_squads when a squad is given.
+    """
+    where, params = "client IS NOT NULL", []
+    if client:
+        where, params = "client = ?", [client]
+    if squad:
+        where += " AND squad = ?"
+        params.append(squad)
+    rollup = "host_vuln_squads" if squad else "host_vuln_summary"
+
+    conn = get_connection()
+    try:
+        squads = conn.execute(f"""
+            SELECT squad, {", ".join(f"SUM(sev{n}) AS sev{n}" for n in range(1, 6))}
+            FROM host_vuln_squads
+            WHERE {where}
+            GROUP BY squad
+        """, params).fetchall()
+        hosts = conn.execute(f"SELECT COUNT(*) FROM {rollup} WHERE {where}", params).fetchone()[0]
+        ranked = conn.execute(f"""
+            SELECT host_key, sev5, sev4 FROM {rollup}
+            WHERE {where} AND (sev5 > 0 OR sev4 > 0)
+            ORDER BY sev5 DESC, sev4 DESC
+            LIMIT ?
+        """, params + [top_n]).fetchall()
+        keys = [r["host_key"] for r in ranked]
+        details = {r["host_key"]: r for r in conn.execute(
+            f"SELECT host_key, asset_name, db_type, environment FROM host_vuln_summary "
+            f"WHERE host_key IN ({', '.join('?' * len(keys))})", keys)}
+        mix = _squad_mix(conn, keys) if not squad else {}
+    finally:
+        conn.close()
+
+    severity_counts = {n: sum(row[f"sev{n}"] for row in squads) for n in SEVERITIES}
+    top = []
+    for r in ranked:
+        host = details[r["host_key"]]
+        top.append({
+            "asset_name": host["asset_name"], "db_type": host["db_type"], "environment": host["environment"],
+            "squad": squad or _top_squad(mix.get(r["host_key"], {})),
+            "count": r["sev5"] + r["sev4"], "sev5": r["sev5"], "sev4": r["sev4"],
+        })
+    return {
+        "total_db_hosts_vulnerable": hosts,
+        "severity_breakdown": [{"severity": str(n), "count": c} for n, c in severity_counts.items() if c],
+        "squad_breakdown": sorted(({"squad": row["squad"], "count": sum(row[f"sev{n}"] for n in SEVERITIES)}
+                                   for row in squads), key=lambda x: x["count"], reverse=True),
+        "top_vulnerable_hosts": top,
+    }
+
+
+def get_host_vuln_summary(hostname):
+    """
+    Rollup of one host: severity counts, squad mix ({squad: [sev1, ..., sev5]}),
+    top squad and oldest open detection; None if the host has no detections.
+    """
+    conn = get_connection()
+    try:
+        row = conn.execute("SELECT * FROM host_vuln_summary WHERE host_key = lower(?)", (hostname,)).fetchone()
+        if not row:
+            return None
+        host = dict(row)
+        host["squad_mix"] = _squad_mix(conn, [host["host_key"]]).get(host["host_key"], {})
+    finally:
+        conn.close()
+    host["squad"] = _top_squad(host["squad_mix"])
+    return host
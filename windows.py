@@ -0,0 +1,375 @@
+"""
+ORAEX PSU Manager — Maintenance Window Engine
+Expands the recurring patch windows (application_day / week_month /
+start_time / end_time in servers, cmdb_databases, planning and cmdb_full) into
+concrete intervals for a month, adds the GMUDs scheduled in it, and indexes
+them in one interval tree per host group.
+
+A host group links hosts that must not be patched at the same time: a primary
+and its standby/contingency, and the GoldenGate (GGS) servers of the same
+system/product. Two intervals conflict when they overlap inside a group and
+belong to different hosts (or are two different GMUDs on the same host).
+"""
+import re
+import calendar
+import threading
+from datetime import datetime, timedelta
+from database import get_connection, parse_gmud_datetime, register_cache
+
+WEEKDAYS = {"seg": 0, "ter": 1, "qua": 2, "qui": 3, "sex": 4, "sab": 5, "sáb": 5, "dom": 6,
+            "mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+_NO_HOST = {"", "n/a", "na", "-", "none", "null"}
+_CLOCK = re.compile(r"^(\d{1,2})\s*(?:[:h]\s*(\d{2})?)?")
+_HOST_TOKEN = re.compile(r"[A-Za-z0-9_.\-]+")
+
+
+# ── Parsing ───────────────────────────────────────────────
+
+def parse_weekday(text):
+    """'Sábado', 'sexta-feira', 'Dom' → 0..6 (Monday = 0); None if not a weekday."""
+    key = (text or "").strip().lower()[:3]
+    return WEEKDAYS.get(key)
+
+
+def parse_week_of_month(text):
+    """'2ª semana' → 2, 'Última' → -1, empty → None (every week)."""
+    text = (text or "").strip().lower()
+    if not text:
+        return None
+    if text.startswith(("últ", "ult", "last")):
+        return -1
+    match = re.search(r"\d", text)
+    return int(match.group()) if match else None
+
+
+def parse_clock(text):
+    """'22:00', '22h', '22h30', '22:00:00' → minutes after midnight; None if unparseable."""
+    match = _CLOCK.match((text or "").strip().lower())
+    if not match:
+        return None
+    hours, minutes = int(match.group(1)), int(match.group(2) or 0)
+    if hours > 24 or minutes > 59:
+        return None
+    return hours * 60 + minutes
+
+
+def host_key(name):
+    """Canonical hostname: lower case, without annotations like ' (G)'."""
+    name = (name or "").strip().lower()
+    name = re.split(r"[\s(]", name, 1)[0]
+    return None if name in _NO_HOST else name
+
+
+def month_bounds(year, month):
+    """[first, last) datetimes of a month."""
+    first = datetime(year, month, 1)
+    return first, first + timedelta(days=calendar.monthrange(year, month)[1])
+
+
+def months_between(start, end):
+    """(year, month) of every month the interval [start, end) touches."""
+    months, year, month = [], start.year, start.month
+    last = end - timedelta(microseconds=1) if end > start else start
+    while (year, month) <= (last.year, last.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def expand_window(year, month, weekday, week, start_min, end_min):
+    """
+    Concrete (start, end) datetimes of a recurring window in a month: the
+    week-th occurrence of weekday (every occurrence when week is None, the last
+    one when week is -1). Windows ending at or before their start cross midnight.
+    """
+    days = [day for day in range(1, calendar.monthrange(year, month)[1] + 1)
+            if calendar.weekday(year, month, day) == weekday]
+    if week == -1:
+        days = days[-1:]
+    elif week is not None:
+        days = days[week - 1:week] if 0 < week <= len(days) else []
+    duration = end_min - start_min if end_min > start_min else end_min + 24 * 60 - start_min
+    intervals = []
+    for day in days:
+        start = datetime(year, month, day) + timedelta(minutes=start_min)
+        intervals.append((start, start + timedelta(minutes=duration)))
+    return intervals
+
+
+# ── Interval tree ─────────────────────────────────────────
+
+class IntervalTree:
+    """
+    Static interval tree over half-open [start, end) intervals: sorted by start
+    and laid out as an implicit balanced BST whose nodes carry the largest end
+    in their subtree, so overlapping() is O(log n + k).
+    """
+
+    def __init__(self, intervals):
+        self._items = sorted(intervals, key=lambda item: (item[0], item[1]))
+        self._max_end = [None] * len(self._items)
+        self._build(0, len(self._items))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        max_end = self._items[mid][1]
+        for child in (self._build(lo, mid), self._build(mid + 1, hi)):
+            if child is not None and child > max_end:
+                max_end = child
+        self._max_end[mid] = max_end
+        return max_end
+
+    def overlapping(self, start, end):
+        """Items (start, end, payload) overlapping [start, end)."""
+        found = []
+        self._query(0, len(self._items), start, end, found)
+        return found
+
+    def _query(self, lo, hi, start, end, found):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self._max_end[mid] <= start:
+            return  # everything in this subtree ends before the query starts
+        self._query(lo, mid, start, end, found)
+        item = self._items[mid]
+        if item[0] < end:
+            if item[1] > start:
+                found.append(item)
+            self._query(mid + 1, hi, start, end, found)
+
+
+# ── Engine ────────────────────────────────────────────────
+
+class _HostGroups:
+    """Union-find over hostnames (plus 'ggs:<product>' nodes)."""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, node):
+        self.parent.setdefault(node, node)
+        while self.parent[node] != node:
+            self.parent[node] = self.parent[self.parent[node]]
+            node = self.parent[node]
+        return node
+
+    def union(self, a, b):
+        self.parent[self.find(a)] = self.find(b)
+
+
+# (table, main host column, partner column, week column or None)
+_WINDOW_SOURCES = (
+    ("servers", "primary_hostname", "standby_hostname", None),
+    ("cmdb_databases", "name", "contingency_name", "week_month"),
+    ("planning", "hostname", "contingency_name", "week_month"),
+    ("cmdb_full", "hostname", "contingency", "week_month"),
+)
+
+
+def _fmt(dt):
+    return dt.strftime("%Y-%m-%d %H:%M")
+
+
+class WindowEngine:
+    """
+    Patch windows and GMUDs touching one month, indexed per host group
+    (including those that start the month before and run into it).
+    """
+
+    def __init__(self, year, month):
+        self.year, self.month = year, month
+        self.first, self.last = month_bounds(year, month)
+        self.previous = (year - 1, 12) if month == 1 else (year, month - 1)
+        self.groups = _HostGroups()
+        intervals = []
+        conn = get_connection()
+        try:
+            intervals += self._load_windows(conn)
+            self._link_ggs(conn)
+            intervals += self._load_gmuds(conn)
+        finally:
+            conn.close()
+
+        by_group = {}
+        for item in intervals:
+            by_group.setdefault(self.groups.find(item[2]["host"]), []).append(item)
+        self.trees = {group: IntervalTree(items) for group, items in by_group.items()}
+
+    def _load_windows(self, conn):
+        intervals = []
+        for table, main_col, partner_col, week_col in _WINDOW_SOURCES:
+            week_sql = week_col or "NULL"
+            rows = conn.execute(f"""
+                SELECT id, {main_col}, {partner_col}, application_day, {week_sql}, start_time, end_time
+                FROM {table}
+            """).fetchall()
+            for row_id, main, partner, day, week, start, end in rows:
+                host, partner = host_key(main), host_key(partner)
+                if not host:
+                    continue
+                self.groups.find(host)
+                if partner and partner != host:
+                    self.groups.union(host, partner)
+                weekday, start_min, end_min = parse_weekday(day), parse_clock(start), parse_clock(end)
+                if weekday is None or start_min is None or end_min is None:
+                    continue
+                week_no = parse_week_of_month(week)
+                spill = [i for i in expand_window(*self.previous, weekday, week_no, start_min, end_min)
+                         if i[1] > self.first]  # last night of the previous month running into this one
+                for begin, finish in spill + expand_window(self.year, self.month, weekday,
+                                                           week_no, start_min, end_min):
+                    intervals.append((begin, finish, {
+                        "kind": "window", "host": host, "source": table, "id": row_id,
+                        "label": f"{day} {start}-{end}" + (f" ({week})" if week else ""),
+                    }))
+        return intervals
+
+    def _link_ggs(self, conn):
+        rows = conn.execute("""
+            SELECT primary_hostname, system_product FROM servers
+            WHERE has_ggs = 1 AND system_product IS NOT NULL AND system_product != ''
+        """).fetchall()
+        for main, product in rows:
+            host = host_key(main)
+            if host:
+                self.groups.union(host, "ggs:" + product.strip().lower())
+
+    def hosts_in(self, text):
+        """Known hostnames mentioned in free text (GMUD titles, the hostnames field)."""
+        hosts = []
+        for token in _HOST_TOKEN.findall(text or ""):
+            key = token.lower()
+            if key in self.groups.parent and key not in hosts:
+                hosts.append(key)
+        return hosts
+
+    def _load_gmuds(self, conn):
+        first, last = (d.strftime("%Y-%m-%d %H:%M:%S") for d in (self.first, self.last))
+        rows = conn.execute("""
+            SELECT id, change_number, title, start_at, end_at FROM gmuds
+            WHERE start_at < ? AND (start_at >= ? OR end_at > ?)
+        """, (last, first, first)).fetchall()
+        intervals = []
+        for gmud_id, change, title, start_at, end_at in rows:
+            start = parse_gmud_datetime(start_at)
+            end = parse_gmud_datetime(end_at) if end_at else None
+            if not end or end <= start:
+                end = start + timedelta(minutes=1)
+            for host in self.hosts_in(title):
+                intervals.append((start, end, {
+                    "kind": "gmud", "host": host, "source": "gmuds", "id": gmud_id,
+                    "label": f"{change or 'N/A'} {title or ''}".strip(),
+                }))
+        return intervals
+
+    @staticmethod
+    def _is_conflict(a, b):
+        if a["host"] != b["host"]:
+            return True
+        return a["kind"] == b["kind"] == "gmud" and a["id"] != b["id"]
+
+    @staticmethod
+    def _describe(item, other):
+        start, end, info = item
+        o_start, o_end, o_info = other
+        return {
+            "a": dict(info, start=_fmt(start), end=_fmt(end)),
+            "b": dict(o_info, start=_fmt(o_start), end=_fmt(o_end)),
+            "overlap_start": _fmt(max(start, o_start)),
+            "overlap_end": _fmt(min(end, o_end)),
+        }
+
+    def conflicts_for(self, hosts, start, end, exclude_gmud=None):
+        """Conflicts of a (possibly not yet created) GMUD on hosts during [start, end)."""
+        probe = {"kind": "gmud", "id": exclude_gmud, "source": "gmuds"}
+        conflicts = []
+        for host in hosts:
+            host = host_key(host)
+            tree = self.trees.get(self.groups.find(host)) if host in self.groups.parent else None
+            if tree is None:
+                continue
+            for other in tree.overlapping(start, end):
+                info = other[2]
+                if info["kind"] == "gmud" and exclude_gmud is not None and info["id"] == exclude_gmud:
+                    continue
+                if self._is_conflict(dict(probe, host=host), info):
+                    conflicts.append(self._describe((start, end, dict(probe, host=host, label="GMUD")), other))
+        return conflicts
+
+    def all_conflicts(self):
+        """Every conflicting pair overlapping inside the month, each reported once."""
+        conflicts, seen = [], set()
+        for tree in self.trees.values():
+            for item in tree:
+                for other in tree.overlapping(item[0], item[1]):
+                    pair = (min(id(item), id(other)), max(id(item), id(other)))
+                    if other is item or pair in seen:
+                        continue
+                    seen.add(pair)
+                    if max(item[0], other[0]) >= self.last or min(item[1], other[1]) <= self.first:
+                        continue  # both spill over from the previous month and clash before this one
+                    if self._is_conflict(item[2], other[2]):
+                        conflicts.append(self._describe(item, other))
+        conflicts.sort(key=lambda c: c["overlap_start"])
+        return conflicts
+
+
+# ── Cache (dropped whenever the data generation moves) ────
+
+_ENGINES = {}
+_engines_lock = threading.Lock()
+_engines_generation = 0  # bumped on every clear; an engine built across a clear is not stored
+
+
+@register_cache
+def _clear_engines():
+    global _engines_generation
+    with _engines_lock:
+        _engines_generation += 1
+        _ENGINES.clear()
+
+
+def get_engine(year, month):
+    """WindowEngine for a month, built once per data generation."""
+    key = (year, month)
+    engine = _ENGINES.get(key)
+    if engine is None:
+        generation = _engines_generation
+        engine = WindowEngine(year, month)
+        with _engines_lock:
+            if generation == _engines_generation:
+                engine = _ENGINES.setdefault(key, engine)
+    return engine
+
+
+def check_gmud_conflicts(data, exclude_gmud=None):
+    """
+    Conflicts for GMUD form data (start_date, end_date, hostnames and/or title).
+    Raises ValueError for an invalid date, like create_gmud.
+    """
+    start = parse_gmud_datetime(data.get("start_date"))
+    if not start:
+        return []
+    end = parse_gmud_datetime(data.get("end_date")) or start + timedelta(minutes=1)
+    end = max(end, start + timedelta(minutes=1))
+    hosts = [h for h in re.split(r"[,;\s]+", data.get("hostnames") or "") if host_key(h)]
+    # A GMUD crossing a month boundary is checked against every month it touches
+    conflicts, seen = [], set()
+    for year, month in months_between(start, end):
+        engine = get_engine(year, month)
+        for conflict in engine.conflicts_for(hosts or engine.hosts_in(data.get("title")), start, end, exclude_gmud):
+            b = conflict["b"]
+            key = (conflict["a"]["host"], b["kind"], b["source"], b["id"], b["host"], b["start"])
+            if key not in seen:
+                seen.add(key)
+                conflicts.append(conflict)
+    return conflicts